@@ -0,0 +1,332 @@
+"""
+Modelo de documento ASS
+Parsea [Script Info], [V4+ Styles] y [Events] en una sola pasada a registros
+compactos con campos tipados e índices por nombre de estilo. Lo comparten la
+GUI (ASSParser) y process_effect.py, así cada archivo se parsea una vez.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ass_reader import ASSReader, SKIPPED_SECTIONS, iter_ass_file, section_header
+from ass_time import format_time, parse_time
+
+
+DEFAULT_EVENT_FORMAT = ('Layer', 'Start', 'End', 'Style', 'Name',
+                        'MarginL', 'MarginR', 'MarginV', 'Effect', 'Text')
+
+
+def _parse_color(value: str) -> int:
+    """&HAABBGGRR& -> entero"""
+    try:
+        return int(value.strip('&Hh'), 16)
+    except ValueError:
+        return 0
+
+
+def _to_int(value: str, default: int = 0) -> int:
+    try:
+        return int(float(value))
+    except ValueError:
+        return default
+
+
+def _to_float(value: str, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+class StyleRecord:
+    """Estilo con campos tipados; también se puede leer como el dict original"""
+
+    __slots__ = ('name', 'fontname', 'fontsize', 'primary_colour', 'secondary_colour',
+                 'outline_colour', 'back_colour', 'bold', 'italic', 'underline', 'strikeout',
+                 'scale_x', 'scale_y', 'spacing', 'angle', 'border_style', 'outline', 'shadow',
+                 'alignment', 'margin_l', 'margin_r', 'margin_v', 'encoding',
+                 '_index', '_values')
+
+    def __init__(self, index: Dict[str, int], values: Tuple[str, ...]):
+        self._index = index
+        self._values = values
+        get = self.get
+        self.name = get('Name', '')
+        self.fontname = get('Fontname', '')
+        self.fontsize = _to_float(get('Fontsize', '48'), 48.0)
+        self.primary_colour = _parse_color(get('PrimaryColour', '&H00FFFFFF'))
+        self.secondary_colour = _parse_color(get('SecondaryColour', '&H000000FF'))
+        self.outline_colour = _parse_color(get('OutlineColour', '&H00000000'))
+        self.back_colour = _parse_color(get('BackColour', '&H00000000'))
+        self.bold = get('Bold', '0') not in ('0', '')
+        self.italic = get('Italic', '0') not in ('0', '')
+        self.underline = get('Underline', '0') not in ('0', '')
+        self.strikeout = get('StrikeOut', '0') not in ('0', '')
+        self.scale_x = _to_float(get('ScaleX', '100'), 100.0)
+        self.scale_y = _to_float(get('ScaleY', '100'), 100.0)
+        self.spacing = _to_float(get('Spacing', '0'))
+        self.angle = _to_float(get('Angle', '0'))
+        self.border_style = _to_int(get('BorderStyle', '1'), 1)
+        self.outline = _to_float(get('Outline', '0'))
+        self.shadow = _to_float(get('Shadow', '0'))
+        self.alignment = _to_int(get('Alignment', '2'), 2)
+        self.margin_l = _to_int(get('MarginL', '0'))
+        self.margin_r = _to_int(get('MarginR', '0'))
+        self.margin_v = _to_int(get('MarginV', '0'))
+        self.encoding = _to_int(get('Encoding', '1'), 1)
+
+    # Interfaz de dict (Format -> valor en texto) para el código existente
+    def get(self, field: str, default=None):
+        i = self._index.get(field)
+        if i is None or i >= len(self._values):
+            return default
+        return self._values[i]
+
+    def __getitem__(self, field: str) -> str:
+        value = self.get(field)
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def __contains__(self, field: str) -> bool:
+        i = self._index.get(field)
+        return i is not None and i < len(self._values)
+
+    def items(self) -> List[Tuple[str, str]]:
+        return [(field, self._values[i]) for field, i in self._index.items() if i < len(self._values)]
+
+    def key(self) -> Tuple[str, ...]:
+        """Valores originales del estilo, para claves de caché"""
+        return self._values
+
+    def __getstate__(self):
+        return (self._index, self._values)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __repr__(self):
+        return f"StyleRecord({self.name!r})"
+
+
+class EventRecord:
+    """Línea de [Events]; el texto se guarda tal cual y se analiza al usarlo"""
+
+    __slots__ = ('comment', 'layer', 'start', 'end', 'start_ms', 'end_ms', 'style', 'name',
+                 'margin_l', 'margin_r', 'margin_v', 'effect', 'text')
+
+    # Claves del dict que devolvía process_effect.parse_dialogue
+    _LEGACY_KEYS = {'actor': 'name'}
+
+    def __init__(self, comment: bool, layer: int, start: str, end: str, style: str, name: str,
+                 margin_l: int, margin_r: int, margin_v: int, effect: str, text: str):
+        self.comment = comment
+        self.layer = layer
+        self.start = start
+        self.end = end
+        self.start_ms = parse_time(start)
+        self.end_ms = parse_time(end)
+        self.style = style
+        self.name = name
+        self.margin_l = margin_l
+        self.margin_r = margin_r
+        self.margin_v = margin_v
+        self.effect = effect
+        self.text = text
+
+    @classmethod
+    def from_line(cls, line: str, event_format: Tuple[str, ...] = DEFAULT_EVENT_FORMAT) -> Optional['EventRecord']:
+        """Parsear una línea Dialogue:/Comment:, o None si no es válida"""
+        kind, sep, rest = line.partition(':')
+        if not sep or kind not in ('Dialogue', 'Comment'):
+            return None
+
+        # Solo se quitan los espacios del comienzo: los del final son parte del Text
+        values = rest.lstrip().split(',', len(event_format) - 1)
+        if len(values) < len(event_format):
+            return None
+        fields = dict(zip(event_format, values))
+
+        try:
+            return cls(
+                kind == 'Comment',
+                int(fields.get('Layer', '0')),
+                fields.get('Start', '0:00:00.00').strip(),
+                fields.get('End', '0:00:00.00').strip(),
+                fields.get('Style', ''),
+                fields.get('Name', fields.get('Actor', '')),
+                int(fields.get('MarginL', '0')),
+                int(fields.get('MarginR', '0')),
+                int(fields.get('MarginV', '0')),
+                fields.get('Effect', ''),
+                fields.get('Text', '').rstrip('\r\n'),
+            )
+        except ValueError:
+            return None
+
+    @classmethod
+    def from_ms(cls, layer: int, start_ms: int, end_ms: int, style: str, name: str,
+                margin_l: int, margin_r: int, margin_v: int, effect: str, text: str) -> 'EventRecord':
+        """Diálogo con los tiempos en ms (se truncan a centésimas, como al escribirlos)"""
+        event = cls.__new__(cls)
+        event.comment = False
+        event.layer = layer
+        event.start = format_time(start_ms)
+        event.end = format_time(end_ms)
+        event.start_ms = max(0, int(start_ms)) // 10 * 10
+        event.end_ms = max(0, int(end_ms)) // 10 * 10
+        event.style = style
+        event.name = name
+        event.margin_l = margin_l
+        event.margin_r = margin_r
+        event.margin_v = margin_v
+        event.effect = effect
+        event.text = text
+        return event
+
+    def to_line(self) -> str:
+        kind = 'Comment' if self.comment else 'Dialogue'
+        return (
+            f"{kind}: {self.layer},{self.start},{self.end},{self.style},{self.name},"
+            f"{self.margin_l},{self.margin_r},{self.margin_v},{self.effect},{self.text}"
+        )
+
+    def key(self) -> tuple:
+        """Todo el contenido del evento, para claves de caché"""
+        return (self.comment, self.layer, self.start, self.end, self.style, self.name,
+                self.margin_l, self.margin_r, self.margin_v, self.effect, self.text)
+
+    def __getitem__(self, key: str):
+        return getattr(self, self._LEGACY_KEYS.get(key, key))
+
+    def __getstate__(self):
+        return self.key()
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __repr__(self):
+        return f"EventRecord({self.to_line()!r})"
+
+
+def raw_event_style(line: str, style_field: int) -> Optional[str]:
+    """Campo Style de una línea Dialogue:/Comment: sin partirla (None si faltan campos)
+
+    Busca solo las comas anteriores al estilo: sirve para descartar líneas de
+    otros estilos antes de parsearlas.
+    """
+    pos = line.find(':')
+    for _ in range(style_field):
+        pos = line.find(',', pos + 1)
+        if pos < 0:
+            return None
+    end = line.find(',', pos + 1)
+    if end < 0:
+        return None
+    style = line[pos + 1:end]
+    return style.lstrip() if style_field == 0 else style
+
+
+class ASSDocument:
+    """Script Info, estilos y eventos de un archivo ASS"""
+
+    def __init__(self):
+        self.script_info: Dict[str, str] = {}
+        self.styles: Dict[str, StyleRecord] = {}
+        self.events: List[EventRecord] = []
+        self.events_by_style: Dict[str, List[EventRecord]] = {}
+        # Secciones sin modelar (p.ej. [Aegisub Project Garbage]): nombre -> {clave: valor}
+        self.sections: Dict[str, Dict[str, str]] = {}
+        self.event_format: Tuple[str, ...] = DEFAULT_EVENT_FORMAT
+        self._style_index: Dict[str, int] = {}
+
+    @classmethod
+    def load(cls, ass_file: str) -> 'ASSDocument':
+        document = cls()
+        for _ in document.feed(iter_ass_file(ass_file)):
+            pass
+        return document
+
+    @classmethod
+    def load_header(cls, ass_file: str) -> 'ASSDocument':
+        """Solo Script Info, estilos y demás secciones: [Events] no se decodifica"""
+        document = cls()
+        reader = ASSReader(ass_file, SKIPPED_SECTIONS + ('[events]',))
+        for _ in document.feed(reader.iter_lines()):
+            pass
+        return document
+
+    def feed(self, lines: Iterable[str], keep_events: bool = True, style: str = '') -> Iterator[EventRecord]:
+        """Parsear líneas en una pasada, devolviendo cada evento al encontrarlo
+
+        Los estilos quedan disponibles antes del primer evento, así un consumidor
+        en streaming puede usarlos; con keep_events=False los eventos no se
+        guardan en el documento. Con `style` solo se parsean los eventos de ese
+        estilo: el resto se descarta mirando el campo crudo.
+        """
+        section = ''
+        style_field = self.event_format.index('Style')
+        for line in lines:
+            if line.startswith('Dialogue:') or line.startswith('Comment:'):
+                if style and raw_event_style(line, style_field) != style:
+                    continue
+                event = EventRecord.from_line(line, self.event_format)
+                if event is None:
+                    continue
+                if keep_events:
+                    self.add_event(event)
+                yield event
+                continue
+
+            line = line.strip()
+            if not line or line.startswith(';'):
+                continue
+
+            if line.startswith('['):
+                name = section_header(line)
+                if name is not None:
+                    section = name
+                    continue
+
+            key, sep, value = line.partition(':')
+            if not sep:
+                continue
+            value = value.strip()
+
+            if section == '[script info]':
+                self.script_info[key] = value
+            elif section.startswith('[v4'):
+                if key == 'Format':
+                    self._style_index = {f.strip(): i for i, f in enumerate(value.split(','))}
+                elif key == 'Style':
+                    values = tuple(v.strip() for v in value.split(','))
+                    if self._style_index and len(values) >= 3:
+                        record = StyleRecord(self._style_index, values)
+                        if record.name:
+                            self.styles[record.name] = record
+            elif section == '[events]':
+                if key == 'Format':
+                    self.event_format = tuple(f.strip() for f in value.split(','))
+                    if 'Style' in self.event_format:
+                        style_field = self.event_format.index('Style')
+            else:
+                self.sections.setdefault(section, {})[key] = value
+
+    def add_event(self, event: EventRecord) -> None:
+        self.events.append(event)
+        self.events_by_style.setdefault(event.style, []).append(event)
+
+    def get_style(self, name: str) -> Optional[StyleRecord]:
+        return self.styles.get(name)
+
+    def style_names(self) -> List[str]:
+        return list(self.styles)
+
+    def dialogues(self, style: str = '') -> List[EventRecord]:
+        """Eventos Dialogue (no comentarios), opcionalmente de un solo estilo"""
+        events = self.events_by_style.get(style, []) if style else self.events
+        return [event for event in events if not event.comment]
+
+    @property
+    def play_res(self) -> Tuple[int, int]:
+        return (_to_int(self.script_info.get('PlayResX', '0')),
+                _to_int(self.script_info.get('PlayResY', '0')))
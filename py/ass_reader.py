@@ -0,0 +1,161 @@
+"""
+Lector de archivos ASS con mmap
+Ubica las cabeceras de sección buscando bytes en el archivo mapeado y solo
+decodifica las secciones que interesan; [Fonts] y [Graphics] (que en scripts
+con fuentes embebidas ocupan la mayor parte del archivo) no se decodifican.
+La codificación se detecta una sola vez (BOM o UTF-8 con respaldo latin-1).
+"""
+
+import re
+import mmap
+import sys
+import codecs
+from typing import Iterator, List, Optional, Tuple
+
+
+# Secciones que se saltan sin decodificar
+SKIPPED_SECTIONS = ('[fonts]', '[graphics]')
+
+# Bytes decodificados por bloque al recorrer una sección
+_BLOCK_SIZE = 1 << 20
+
+KNOWN_SECTIONS = frozenset((
+    '[script info]', '[v4 styles]', '[v4+ styles]', '[v4++ styles]', '[events]',
+    '[fonts]', '[graphics]', '[aegisub project garbage]', '[aegisub extradata]',
+))
+
+# Otras secciones: letras, dígitos, espacios y '+', con al menos una minúscula o
+# un espacio. El uuencode de [Fonts]/[Graphics] usa los caracteres 33-96
+# (incluidos '[' y ']'), que no tienen minúsculas ni espacios.
+_SECTION_PATTERN = re.compile(r'\[[A-Za-z0-9+ ]*[a-z ][A-Za-z0-9+ ]*\]')
+
+
+def section_header(line: str) -> Optional[str]:
+    """Nombre en minúsculas si la línea es una cabecera de sección, si no None"""
+    line = line.strip()
+    name = line.lower()
+    if name in KNOWN_SECTIONS or _SECTION_PATTERN.fullmatch(line):
+        return name
+    return None
+
+
+def detect_encoding(head: bytes) -> Tuple[str, int]:
+    """(codificación, largo del BOM) a partir de los primeros bytes"""
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8', len(codecs.BOM_UTF8)
+    if head.startswith(codecs.BOM_UTF16_LE):
+        return 'utf-16-le', len(codecs.BOM_UTF16_LE)
+    if head.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16-be', len(codecs.BOM_UTF16_BE)
+    return 'utf-8', 0
+
+
+def find_sections(data, start: int = 0) -> List[Tuple[str, int, int]]:
+    """(nombre en minúsculas, inicio, fin) de cada sección
+
+    Se buscan líneas que empiezan con '[' y se descartan las que no son una
+    cabecera (section_header): en los datos uuencode '[' es un carácter más.
+    """
+    headers = []
+    pos = start if data[start:start + 1] == b'[' else data.find(b'\n[', start)
+    while pos != -1:
+        if data[pos:pos + 1] == b'\n':
+            pos += 1
+        line_end = data.find(b'\n', pos)
+        if line_end == -1:
+            line_end = len(data)
+        name = section_header(bytes(data[pos:line_end]).decode('latin-1'))
+        if name is not None:
+            headers.append((name, pos))
+        pos = data.find(b'\n[', line_end)
+
+    sections = []
+    for i, (name, pos) in enumerate(headers):
+        end = headers[i + 1][1] if i + 1 < len(headers) else len(data)
+        sections.append((name, pos, end))
+    return sections
+
+
+class ASSReader:
+    """Lee las secciones útiles de un ASS mapeado en memoria"""
+
+    def __init__(self, path: str, skip_sections: Tuple[str, ...] = SKIPPED_SECTIONS):
+        self.path = path
+        self.skip_sections = skip_sections
+        self.encoding: Optional[str] = None
+
+    def iter_lines(self) -> Iterator[str]:
+        with open(self.path, 'rb') as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Archivo vacío
+                return
+            try:
+                yield from self._iter_mapped(data)
+            finally:
+                data.close()
+
+    def _iter_mapped(self, data) -> Iterator[str]:
+        encoding, bom = detect_encoding(data[:4])
+        self.encoding = encoding
+
+        if encoding.startswith('utf-16'):
+            # Los separadores no son bytes sueltos: decodificar todo una vez
+            yield from _split_lines(data[bom:].decode(encoding, 'replace'))
+            return
+
+        for name, start, end in find_sections(data, bom):
+            if name in self.skip_sections:
+                continue
+            yield from self._iter_span(data, start, end)
+
+    def _iter_span(self, data, start: int, end: int) -> Iterator[str]:
+        """Decodificar una sección por bloques cortados en fin de línea"""
+        pos = start
+        while pos < end:
+            block_end = min(pos + _BLOCK_SIZE, end)
+            if block_end < end:
+                newline = data.rfind(b'\n', pos, block_end)
+                if newline == -1:
+                    # Línea más larga que el bloque: extender hasta su final
+                    newline = data.find(b'\n', block_end, end)
+                block_end = newline + 1 if newline != -1 else end
+            raw = data[pos:block_end]
+            try:
+                text = raw.decode(self.encoding)
+            except UnicodeDecodeError:
+                # Sin BOM y no es UTF-8: el resto del archivo se lee como latin-1
+                self.encoding = 'latin-1'
+                text = raw.decode(self.encoding)
+            yield from _split_lines(text)
+            pos = block_end
+
+
+def _split_lines(text: str) -> List[str]:
+    """Separar solo por fin de línea (splitlines también corta en U+2028 y otros)"""
+    lines = text.split('\n')
+    if lines and not lines[-1]:
+        lines.pop()
+    return [line[:-1] if line.endswith('\r') else line for line in lines]
+
+
+def _iter_stream(stream) -> Iterator[str]:
+    """Lectura línea a línea para entradas que no se pueden mapear (stdin)"""
+    first = True
+    for raw in stream:
+        try:
+            line = raw.decode('utf-8')
+        except UnicodeDecodeError:
+            line = raw.decode('latin-1')
+        if first:
+            line = line.lstrip('\ufeff')
+            first = False
+        yield line
+
+
+def iter_ass_file(ass_file: str) -> Iterator[str]:
+    """Recorrer las líneas útiles del ASS ('-' = stdin)"""
+    if ass_file == '-':
+        return _iter_stream(sys.stdin.buffer)
+    return ASSReader(ass_file).iter_lines()
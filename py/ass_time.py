@@ -0,0 +1,54 @@
+"""
+Tiempos ASS (0:00:00.00)
+Parseo sin regex para la forma habitual y formateo cuantizado a centésimas
+con los dígitos precalculados; los tiempos formateados se memorizan porque en un karaoke
+se repiten mucho (inicio/fin de línea, inicio de cada sílaba en las 3 capas).
+Lo usan ass_document, karaoke_processor, process_effect y effects.
+"""
+
+import re
+from functools import lru_cache
+
+
+# "00".."99" precalculados para minutos, segundos y centésimas
+_TWO_DIGITS = tuple(f"{i:02d}" for i in range(100))
+
+# Forma general de un tiempo (con cualquier cantidad de cifras y texto al final)
+_TIME_RE = re.compile(r'(\d+):(\d+):(\d+)\.(\d+)')
+
+# Tiempos formateados distintos que se recuerdan
+FORMAT_CACHE_SIZE = 8192
+
+
+def parse_time(time_str: str) -> int:
+    """0:00:00.00 -> ms (0 si no es un tiempo válido)
+
+    Las cifras después del punto son centésimas, como las lee Aegisub:
+    "0:00:01.5" son 1050 ms. Lo que no tiene la forma h:mm:ss.cc pasa por
+    la regex de antes, que acepta texto después del tiempo.
+    """
+    h, _, rest = time_str.partition(':')
+    m, _, rest = rest.partition(':')
+    sec, dot, cs = rest.partition('.')
+    if dot and h.isdecimal() and m.isdecimal() and sec.isdecimal() and cs.isdecimal():
+        return (int(h) * 3600 + int(m) * 60 + int(sec)) * 1000 + int(cs) * 10
+    match = _TIME_RE.match(time_str)
+    if match:
+        h, m, sec, cs = map(int, match.groups())
+        return (h * 3600 + m * 60 + sec) * 1000 + cs * 10
+    return 0
+
+
+def format_time(ms: float) -> str:
+    """ms -> 0:00:00.00 (se trunca a centésimas; negativos = 0)"""
+    if ms < 0:
+        return _format_cs(0)
+    return _format_cs(int(ms) // 10)
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _format_cs(cs: int) -> str:
+    seconds, cs = divmod(cs, 100)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{_TWO_DIGITS[minutes]}:{_TWO_DIGITS[seconds]}.{_TWO_DIGITS[cs]}"
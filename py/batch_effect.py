@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Procesamiento por lotes: muchos ASS y estilos en una sola invocación
+Cada script se parsea una vez y se generan todos sus estilos seguidos; los
+scripts se reparten entre procesos. Configuraciones, plantillas y anchos de
+fuente se comparten dentro de cada proceso para todo el lote.
+
+    python3 batch_effect.py lote.json --workers 4 --summary resumen.json
+    python3 batch_effect.py --scripts 'episodios/*.ass' \\
+        --style Romaji=romaji.txt --style Kanji=kanji.txt --output-dir fx
+
+Manifiesto (las rutas relativas son relativas al manifiesto):
+
+    {
+      "scripts": ["episodios/*.ass"],
+      "styles": {
+        "Romaji": "romaji.txt",
+        "Kanji": {"config_file": "kanji.txt", "generator": "multi_layer", "seed": 1}
+      },
+      "output_dir": "fx",
+      "output": "{stem}.{style}.txt"
+    }
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ass_document import ASSDocument
+from process_effect import read_config, iter_generated_lines, write_lines
+from effects import MultiLayerEffectGenerator, effect_config_from_dict
+from frame_timing import resolve_fps
+from fx_cache import FxCache
+from font_metrics import save_default_metrics
+from style_layout import with_play_res
+
+
+DEFAULT_OUTPUT = "{stem}.{style}.fx.txt"
+
+
+@dataclass
+class StyleJob:
+    """Un estilo a generar con su configuración"""
+    style: str
+    config: Dict[str, str]
+    generator: str = 'lead_in'       # lead_in o multi_layer
+    seed: Optional[int] = None
+
+
+@dataclass
+class JobResult:
+    """Resultado de un estilo de un script (para el resumen)"""
+    ass_file: str
+    style: str
+    output_file: str
+    lines: int = 0
+    seconds: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    error: str = ''
+
+
+@dataclass
+class BatchOptions:
+    output_dir: str = '.'
+    output: str = DEFAULT_OUTPUT
+    cache_dir: Optional[str] = None
+    optimize: bool = False
+
+
+def output_path(ass_file: str, style: str, options: BatchOptions) -> str:
+    stem = os.path.splitext(os.path.basename(ass_file))[0]
+    return os.path.join(options.output_dir, options.output.format(stem=stem, style=style))
+
+
+def expand_scripts(patterns: List[str], base_dir: str = '') -> List[str]:
+    """Rutas de los scripts (acepta globs), sin repetir y en orden"""
+    scripts = []
+    for pattern in patterns:
+        pattern = os.path.join(base_dir, pattern)
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if path not in scripts:
+                scripts.append(path)
+    return scripts
+
+
+# Configuraciones ya leídas: un archivo compartido por varios estilos se lee una vez
+_configs: Dict[str, Dict[str, str]] = {}
+
+
+def load_style_config(config_file: str) -> Dict[str, str]:
+    config = _configs.get(config_file)
+    if config is None:
+        config = _configs[config_file] = read_config(config_file)
+        if not config:
+            raise ValueError(f"No se pudo leer la configuracion {config_file}")
+    return config
+
+
+def style_job(style: str, entry, base_dir: str = '', overrides: Optional[Dict[str, str]] = None) -> StyleJob:
+    """StyleJob de una entrada del manifiesto: ruta del config u objeto con config_file"""
+    if isinstance(entry, str):
+        entry = {'config_file': entry}
+    config = dict(load_style_config(os.path.join(base_dir, entry['config_file'])))
+    config['SELECTED_STYLE'] = style
+    config.update(overrides or {})
+    return StyleJob(style, config, entry.get('generator', 'lead_in'), entry.get('seed'))
+
+
+def load_manifest(path: str, overrides: Optional[Dict[str, str]] = None) -> Tuple[List[str], List[StyleJob], BatchOptions]:
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    scripts = expand_scripts(manifest.get('scripts', []), base_dir)
+    jobs = [style_job(style, entry, base_dir, overrides) for style, entry in manifest.get('styles', {}).items()]
+    options = BatchOptions(
+        output_dir=os.path.join(base_dir, manifest.get('output_dir', '.')),
+        output=manifest.get('output', DEFAULT_OUTPUT),
+    )
+    return scripts, jobs, options
+
+
+# Generadores multi-capa por configuración, reutilizados entre scripts del mismo proceso
+_generators: Dict[str, MultiLayerEffectGenerator] = {}
+
+
+def _generate(document: ASSDocument, job: StyleJob, cache: Optional[FxCache]) -> Iterator[str]:
+    config = with_play_res(job.config, document)
+    if str(config.get('FPS', '')).strip().lower() == 'auto':
+        fps = resolve_fps('auto', document)
+        config = dict(config, FPS=repr(fps) if fps else '')
+    dialogues = document.dialogues(job.style)
+
+    if job.generator == 'multi_layer':
+        effect_config = effect_config_from_dict(config)
+        key = repr(effect_config)
+        generator = _generators.get(key)
+        if generator is None:
+            generator = _generators[key] = MultiLayerEffectGenerator(effect_config)
+        generator.cache = cache
+        generator.processor.styles = document.styles
+        return generator.generate_lines(dialogues, job.style, job.seed)
+    return iter_generated_lines(dialogues, config, document.styles, cache)
+
+
+def process_script(task: Tuple[str, List[StyleJob], BatchOptions]) -> List[JobResult]:
+    """Todos los estilos de un script (se ejecuta en un proceso del pool)"""
+    ass_file, jobs, options = task
+    results = [JobResult(ass_file, job.style, output_path(ass_file, job.style, options)) for job in jobs]
+    try:
+        document = ASSDocument.load(ass_file)
+    except OSError as e:
+        for result in results:
+            result.error = str(e)
+        return results
+
+    cache = FxCache(options.cache_dir) if options.cache_dir else None
+    try:
+        for job, result in zip(jobs, results):
+            t0 = time.perf_counter()
+            hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+            try:
+                generated = _generate(document, job, cache)
+                if options.optimize:
+                    from tag_optimizer import TagOptimizer
+                    generated = TagOptimizer(document.styles).optimize_lines(generated)
+                result.lines = write_lines(result.output_file, generated)
+            except (OSError, ValueError) as e:
+                result.error = str(e)
+            result.seconds = round(time.perf_counter() - t0, 4)
+            if cache:
+                result.cache_hits = cache.hits - hits
+                result.cache_misses = cache.misses - misses
+    finally:
+        # Los procesos del pool terminan sin atexit: los glifos medidos se guardan por script
+        save_default_metrics()
+    return results
+
+
+def run_batch(scripts: List[str], jobs: List[StyleJob], options: BatchOptions,
+              workers: int = 1) -> Iterator[JobResult]:
+    """Procesar los scripts (en paralelo con workers > 1); los resultados salen en orden"""
+    os.makedirs(options.output_dir, exist_ok=True)
+    tasks = [(ass_file, jobs, options) for ass_file in scripts]
+    if workers == 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield from process_script(task)
+        return
+    with ProcessPoolExecutor(max_workers=workers or None) as executor:
+        for results in executor.map(process_script, tasks):
+            yield from results
+
+
+def print_summary(results: List[JobResult], elapsed: float, out=sys.stdout) -> None:
+    for r in results:
+        status = f"ERROR: {r.error}" if r.error else f"{r.lines:>8} líneas  {r.seconds:8.3f} s"
+        print(f"{os.path.basename(r.ass_file):<32} {r.style:<14} {status}", file=out)
+    total = sum(r.lines for r in results)
+    failed = sum(1 for r in results if r.error)
+    print(f"{len(results)} trabajos, {total} líneas en {elapsed:.2f} s"
+          + (f", {failed} con errores" if failed else ''), file=out)
+
+
+def parse_style_arg(value: str) -> Tuple[str, str]:
+    style, sep, config_file = value.partition('=')
+    if not sep or not style or not config_file:
+        raise argparse.ArgumentTypeError(f"Se esperaba ESTILO=CONFIG: {value}")
+    return style, config_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera efectos para muchos scripts y estilos en una invocación")
+    parser.add_argument('manifest', nargs='?', help="Manifiesto JSON con scripts, estilos y salidas")
+    parser.add_argument('--scripts', nargs='+', default=[], metavar='ASS',
+        help="Scripts a procesar (acepta globs), además de los del manifiesto")
+    parser.add_argument('--style', action='append', type=parse_style_arg, default=[], metavar='ESTILO=CONFIG',
+        help="Estilo y su archivo de configuración (se puede repetir)")
+    parser.add_argument('--generator', choices=('lead_in', 'multi_layer'), default='lead_in',
+        help="Generador para los estilos de --style")
+    parser.add_argument('--output-dir', default=None, help="Directorio de salida")
+    parser.add_argument('--output', default=None,
+        help=f"Nombre de cada salida, con {{stem}} y {{style}} (por defecto {DEFAULT_OUTPUT})")
+    parser.add_argument('--workers', type=int, default=1,
+        help="Scripts procesados a la vez (0 = uno por núcleo)")
+    parser.add_argument('--cache-dir', default=None,
+        help="Reutilizar las líneas ya generadas guardadas en este directorio")
+    parser.add_argument('--no-font-metrics', action='store_true',
+        help="Estimar anchos en lugar de leer las fuentes instaladas")
+    parser.add_argument('--fps', default=None, metavar='FPS',
+        help="Ajustar tiempos a los cuadros del video (número, o 'auto' = el de cada proyecto)")
+    parser.add_argument('--optimize', action='store_true',
+        help="Quitar tags redundantes de las líneas generadas")
+    parser.add_argument('--summary', default=None, help="Guardar el resumen en este archivo JSON")
+    args = parser.parse_args()
+
+    overrides = {}
+    if args.no_font_metrics:
+        overrides['FONT_METRICS'] = '0'
+    if args.fps is not None:
+        overrides['FPS'] = args.fps
+
+    try:
+        if args.manifest:
+            scripts, jobs, options = load_manifest(args.manifest, overrides)
+        else:
+            scripts, jobs, options = [], [], BatchOptions()
+        scripts += [path for path in expand_scripts(args.scripts) if path not in scripts]
+        jobs += [style_job(style, {'config_file': config_file, 'generator': args.generator}, overrides=overrides)
+                 for style, config_file in args.style]
+    except (OSError, ValueError) as e:
+        print(f"Error leyendo el lote: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if not scripts or not jobs:
+        parser.error("no hay scripts o estilos para procesar")
+    if args.output_dir is not None:
+        options.output_dir = args.output_dir
+    if args.output is not None:
+        options.output = args.output
+    options.cache_dir = args.cache_dir
+    options.optimize = args.optimize
+
+    t0 = time.perf_counter()
+    results = list(run_batch(scripts, jobs, options, args.workers))
+    elapsed = time.perf_counter() - t0
+    if options.cache_dir:
+        FxCache(options.cache_dir).evict()
+
+    print_summary(results, elapsed)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump({'seconds': round(elapsed, 3), 'jobs': [asdict(r) for r in results]},
+                      f, indent=2, ensure_ascii=False)
+
+    if any(r.error for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
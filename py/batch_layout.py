@@ -0,0 +1,403 @@
+"""
+Layout de sílabas por lotes
+Recorre los textos de varias líneas una sola vez y deja arreglos planos con
+códigos de caracter, avances, rangos de cada sílaba y tiempos; las posiciones
+(x de cada sílaba, centro de cada caracter) y los vectores de entrada se
+calculan de una vez, con NumPy si está instalado.
+
+El layout de cada línea depende solo de su texto y de las métricas del
+estilo (los tiempos son relativos al inicio de la línea), así que se guarda
+en una caché acotada: los coros repetidos se copian en lugar de recalcularse.
+"""
+
+import os
+import math
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from font_metrics import TextMeasurer
+from instrumentation import instruments
+from override_tokens import karaoke_segments
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: mismo resultado en Python puro
+    np = None
+
+
+# PYFX_NUMPY=0 fuerza el camino en Python puro
+USE_NUMPY = np is not None and os.environ.get('PYFX_NUMPY', '1') != '0'
+
+# Por debajo de este tamaño NumPy no compensa el costo de armar los arreglos
+NUMPY_MIN_ITEMS = 256
+
+# Líneas distintas que recuerda la caché de layout compartida
+LAYOUT_CACHE_SIZE = 4096
+
+
+class CharWidths:
+    """Avance de cada caracter con la fuente de un estilo, medido una sola vez"""
+
+    __slots__ = ('estimate', 'measurer', '_advances')
+
+    def __init__(self, estimate: Callable[[str], float], measurer: Optional[TextMeasurer] = None):
+        # estimate: ancho aproximado para caracteres sin glifo (o sin fuente)
+        self.estimate = estimate
+        self.measurer = measurer
+        # caracter -> (avance, tiene glifo)
+        self._advances: Dict[str, Tuple[float, bool]] = {}
+
+    def _lookup(self, char: str) -> Tuple[float, bool]:
+        entry = self._advances.get(char)
+        if entry is None:
+            width = self.measurer.char_width(char) if self.measurer else None
+            if width is None:
+                entry = (self.estimate(char), False)
+            else:
+                entry = (width, True)
+            self._advances[char] = entry
+        return entry
+
+    def advance(self, char: str) -> float:
+        return self._lookup(char)[0]
+
+    def measure(self, text: str, advances: List[float], kerns: List[float]) -> None:
+        """Agregar avance y kerning (con el caracter anterior) de cada caracter
+
+        Mismo criterio que TextMeasurer.text_width: solo se aplica kerning
+        entre dos caracteres con glifo en la fuente.
+        """
+        lookup = self._lookup
+        measurer = self.measurer
+        previous = None
+        for char in text:
+            width, glyph = lookup(char)
+            advances.append(width)
+            kerns.append(measurer.kerning(previous, char) if glyph and previous is not None else 0.0)
+            previous = char if glyph else None
+
+
+class ScriptLayout:
+    """Sílabas y caracteres de varias líneas en arreglos planos
+
+    Las sílabas de la línea n son line_offsets[n]:line_offsets[n + 1] y los
+    caracteres de la sílaba j son char_offsets[j]:char_offsets[j + 1]. Los
+    tiempos son en ms desde el inicio de cada línea.
+    """
+
+    __slots__ = ('line_offsets', 'syl_text', 'syl_markup', 'syl_index', 'syl_char_index', 'syl_duration',
+                 'syl_start', 'syl_end', 'syl_width', 'syl_x',
+                 'char_offsets', 'char_codes', 'char_advance', 'char_kern', 'char_center')
+
+    def __init__(self):
+        self.line_offsets: List[int] = [0]
+        self.syl_text: List[str] = []
+        self.syl_markup: List[str] = []       # texto con los tags que tenía dentro
+        self.syl_index: List[int] = []        # índice del {\k} dentro de la línea
+        self.syl_char_index: List[int] = []   # primer caracter dentro de la línea
+        self.syl_duration: List[int] = []     # centésimas de segundo
+        self.syl_start: List[int] = []
+        self.syl_end: List[int] = []
+        self.syl_width: List[float] = []
+        self.syl_x: List[float] = []          # centro de la sílaba
+        self.char_offsets: List[int] = [0]
+        self.char_codes: List[int] = []
+        self.char_advance: List[float] = []
+        self.char_kern: List[float] = []
+        self.char_center: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self.line_offsets) - 1
+
+    def syllable_range(self, line: int) -> range:
+        return range(self.line_offsets[line], self.line_offsets[line + 1])
+
+    def line(self, n: int) -> 'ScriptLayout':
+        """Layout de la línea n sola (con sus propios offsets desde 0)"""
+        line = ScriptLayout()
+        first, last = self.line_offsets[n], self.line_offsets[n + 1]
+        char_first, char_last = self.char_offsets[first], self.char_offsets[last]
+        line.line_offsets = [0, last - first]
+        for name in _SYLLABLE_COLUMNS:
+            setattr(line, name, getattr(self, name)[first:last])
+        line.char_offsets = [offset - char_first for offset in self.char_offsets[first:last + 1]]
+        for name in _CHAR_COLUMNS:
+            setattr(line, name, getattr(self, name)[char_first:char_last])
+        return line
+
+    def append(self, other: 'ScriptLayout') -> None:
+        """Agregar al final las líneas de otro layout"""
+        syl_base = len(self.syl_text)
+        char_base = self.char_offsets[-1]
+        self.line_offsets.extend(syl_base + offset for offset in other.line_offsets[1:])
+        for name in _SYLLABLE_COLUMNS:
+            getattr(self, name).extend(getattr(other, name))
+        self.char_offsets.extend(char_base + offset for offset in other.char_offsets[1:])
+        for name in _CHAR_COLUMNS:
+            getattr(self, name).extend(getattr(other, name))
+
+
+_SYLLABLE_COLUMNS = ('syl_text', 'syl_markup', 'syl_index', 'syl_char_index', 'syl_duration',
+                     'syl_start', 'syl_end', 'syl_width', 'syl_x')
+_CHAR_COLUMNS = ('char_codes', 'char_advance', 'char_kern', 'char_center')
+
+
+class LayoutCache:
+    """Layout de cada línea ya calculada, por (texto, métricas, margen), con expulsión LRU
+
+    Las métricas son el objeto CharWidths del estilo (se comparan por
+    identidad): quien arma los layouts debe reutilizar uno por estilo.
+    """
+
+    def __init__(self, max_entries: int = LAYOUT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple, ScriptLayout]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple) -> Optional[ScriptLayout]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Tuple, entry: ScriptLayout) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+# Caché compartida por todos los generadores del proceso
+layout_cache = LayoutCache()
+
+
+def layout_lines(texts: Sequence[str], widths: Sequence[CharWidths], margin_left: float = 10,
+                 skip_blank: bool = False, cache: Optional[LayoutCache] = layout_cache) -> ScriptLayout:
+    """Layout de todas las líneas (`widths[n]` mide el texto de la línea n)
+
+    skip_blank descarta también las sílabas de solo espacios (no solo las vacías).
+    Las x empiezan en margin_left; style_layout.place_lines lleva cada línea
+    al lugar que le da su estilo.
+    Con `cache` (por defecto la compartida) las líneas ya vistas con las mismas
+    métricas se copian; cache=None calcula todo.
+    """
+    if cache is None:
+        return _layout_lines(texts, widths, margin_left, skip_blank)
+
+    keys = [(text, char_widths, margin_left, skip_blank) for text, char_widths in zip(texts, widths)]
+    entries = [cache.get(key) for key in keys]
+    # Líneas a calcular, sin repetir las que aparecen varias veces en el lote
+    pending: Dict[Tuple, int] = {}
+    for n, entry in enumerate(entries):
+        if entry is None and keys[n] not in pending:
+            pending[keys[n]] = n
+    cache.misses += len(pending)
+    cache.hits += len(keys) - len(pending)
+    if instruments.enabled:
+        instruments.count('layout_cache_hits', len(keys) - len(pending))
+    if not pending:
+        return _join_lines(entries)
+
+    computed = _layout_lines([texts[n] for n in pending.values()], [widths[n] for n in pending.values()],
+                             margin_left, skip_blank)
+    if len(pending) == len(keys):
+        for i, key in enumerate(keys):
+            cache.put(key, computed.line(i))
+        return computed
+    fresh = {}
+    for i, key in enumerate(pending):
+        fresh[key] = computed.line(i)
+        cache.put(key, fresh[key])
+    return _join_lines([entry if entry is not None else fresh[key] for key, entry in zip(keys, entries)])
+
+
+def _join_lines(lines: Sequence[ScriptLayout]) -> ScriptLayout:
+    layout = ScriptLayout()
+    for line in lines:
+        layout.append(line)
+    return layout
+
+
+def _layout_lines(texts: Sequence[str], widths: Sequence[CharWidths], margin_left: float,
+                  skip_blank: bool) -> ScriptLayout:
+    layout = ScriptLayout()
+    syl_text = layout.syl_text
+    syl_markup = layout.syl_markup
+    syl_index = layout.syl_index
+    syl_char_index = layout.syl_char_index
+    syl_duration = layout.syl_duration
+    char_offsets = layout.char_offsets
+    advances = layout.char_advance
+    kerns = layout.char_kern
+
+    for text, char_widths in zip(texts, widths):
+        char_index = 0
+        for segment in karaoke_segments(text):
+            syllable = segment.text
+            if not (syllable.strip() if skip_blank else syllable):
+                continue
+            syl_text.append(syllable)
+            syl_markup.append(segment.markup)
+            syl_index.append(segment.index)
+            syl_char_index.append(char_index)
+            syl_duration.append(segment.duration)
+            char_widths.measure(syllable, advances, kerns)
+            char_offsets.append(len(advances))
+            char_index += len(syllable)
+        layout.line_offsets.append(len(syl_text))
+
+    layout.char_codes = [ord(char) for syllable in syl_text for char in syllable]
+
+    if USE_NUMPY and len(advances) >= NUMPY_MIN_ITEMS:
+        _positions_numpy(layout, margin_left)
+    else:
+        _positions_python(layout, margin_left)
+    return layout
+
+
+def _positions_python(layout: ScriptLayout, margin_left: float) -> None:
+    offsets = layout.char_offsets
+    advances = layout.char_advance
+    kerns = layout.char_kern
+    durations = layout.syl_duration
+    char_center = layout.char_center
+
+    for n in range(len(layout)):
+        current_time = 0
+        current_x = margin_left
+        for j in layout.syllable_range(n):
+            chars = range(offsets[j], offsets[j + 1])
+            width = 0.0
+            for m in chars:
+                width += kerns[m]
+                width += advances[m]
+            x = current_x + width / 2
+            duration_ms = durations[j] * 10
+            layout.syl_start.append(current_time)
+            layout.syl_end.append(current_time + duration_ms)
+            layout.syl_width.append(width)
+            layout.syl_x.append(x)
+
+            # Centro de cada caracter, avanzando desde el borde izquierdo de la
+            # sílaba con el mismo kerning que se sumó al ancho
+            char_x = x - width / 2
+            for m in chars:
+                char_x += kerns[m]
+                char_center.append(char_x + advances[m] / 2)
+                char_x += advances[m]
+
+            current_time += duration_ms
+            current_x += width
+
+
+def _exclusive_cumsum(values, groups):
+    """Suma acumulada (sin el elemento actual) reiniciada al comienzo de cada grupo
+
+    Solo para enteros: con floats el redondeo no es el del bucle de Python
+    (ver _running_sums).
+    """
+    total = np.cumsum(values)
+    before = np.concatenate(([0], total))
+    group_of = np.repeat(np.arange(len(groups) - 1), np.diff(groups))
+    return before[:-1] - before[np.asarray(groups[:-1])][group_of]
+
+
+def _running_sums(values, groups, initial):
+    """Sumas parciales de cada grupo values[groups[g]:groups[g + 1]], empezando en initial[g]
+
+    Devuelve la suma antes de cada elemento y el total de cada grupo. Se
+    avanza una posición por vez en todos los grupos que la tienen (los
+    grupos se ordenan por largo, así los activos son un prefijo): cada grupo
+    suma sus elementos en orden, igual que _positions_python, y el resultado
+    es idéntico bit a bit. Restar offsets a un np.cumsum global no lo sería.
+    Memoria O(elementos + grupos) aunque un grupo sea muy largo.
+    """
+    groups = np.asarray(groups, dtype=np.int64)
+    lengths = np.diff(groups)
+    order = np.argsort(-lengths, kind='stable')
+    starts = groups[:-1][order]
+    running = np.broadcast_to(np.asarray(initial, dtype=np.float64), lengths.shape)[order]
+    # Grupos con más de k elementos, para cada posición k
+    active = np.searchsorted(-lengths[order], -np.arange(int(lengths.max(initial=0))), side='left')
+
+    values = np.asarray(values, dtype=np.float64)
+    before = np.empty(len(values))
+    for k, count in enumerate(active.tolist()):
+        index = starts[:count] + k
+        before[index] = running[:count]
+        running[:count] += values[index]
+
+    totals = np.empty(len(lengths))
+    totals[order] = running
+    return before, totals
+
+
+def _positions_numpy(layout: ScriptLayout, margin_left: float) -> None:
+    advances = np.asarray(layout.char_advance, dtype=np.float64)
+    kerns = np.asarray(layout.char_kern, dtype=np.float64)
+    char_offsets = np.asarray(layout.char_offsets, dtype=np.int64)
+    line_offsets = layout.line_offsets
+
+    # Ancho de cada sílaba: kerning y avance de cada caracter, en ese orden
+    steps = np.empty(2 * len(advances))
+    steps[0::2] = kerns
+    steps[1::2] = advances
+    width = _running_sums(steps, 2 * char_offsets, 0.0)[1]
+    duration_ms = np.asarray(layout.syl_duration, dtype=np.int64) * 10
+
+    start = _exclusive_cumsum(duration_ms, line_offsets)
+    left = _running_sums(width, line_offsets, float(margin_left))[0]
+    x = left + width / 2
+
+    # Borde izquierdo de cada caracter: el mismo recorrido kerning + avance
+    # desde el borde de la sílaba, tomado después de sumar su kerning
+    char_left = _running_sums(steps, 2 * char_offsets, x - width / 2)[0][1::2]
+
+    layout.syl_start = start.tolist()
+    layout.syl_end = (start + duration_ms).tolist()
+    layout.syl_width = width.tolist()
+    layout.syl_x = x.tolist()
+    layout.char_center = (char_left + advances / 2).tolist()
+
+
+def line_widths(layout: ScriptLayout) -> List[float]:
+    """Ancho de cada línea (suma de sus sílabas)"""
+    widths = layout.syl_width
+    offsets = layout.line_offsets
+    return [sum(widths[offsets[n]:offsets[n + 1]]) for n in range(len(layout))]
+
+
+def shift_lines(layout: ScriptLayout, offsets: Sequence[float]) -> None:
+    """Sumar offsets[n] a las x (sílabas y caracteres) de la línea n"""
+    line_offsets = layout.line_offsets
+    char_offsets = layout.char_offsets
+    syl_x = layout.syl_x
+    char_center = layout.char_center
+    for n, dx in enumerate(offsets):
+        if not dx:
+            continue
+        first, last = line_offsets[n], line_offsets[n + 1]
+        syl_x[first:last] = [x + dx for x in syl_x[first:last]]
+        first, last = char_offsets[first], char_offsets[last]
+        char_center[first:last] = [x + dx for x in char_center[first:last]]
+
+
+def entry_offsets(angles: Sequence[float], distance: float) -> Tuple[List[float], List[float]]:
+    """Desplazamientos (dx, dy) a `distance` píxeles en cada ángulo"""
+    if USE_NUMPY and len(angles) >= NUMPY_MIN_ITEMS:
+        a = np.asarray(angles, dtype=np.float64)
+        return (distance * np.cos(a)).tolist(), (distance * np.sin(a)).tolist()
+    cos, sin = math.cos, math.sin
+    return [distance * cos(a) for a in angles], [distance * sin(a) for a in angles]
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memoria de las sílabas de un corpus completo: objetos Syllable
+con __dict__ (como antes) y objetos con __slots__ (KaraokeLine actual). Mide
+la memoria retenida con tracemalloc.
+
+    python3 benchmarks/bench_memory.py --lines 20000 --syllables 12
+"""
+
+import os
+import sys
+import gc
+import time
+import argparse
+import tracemalloc
+from dataclasses import fields, make_dataclass
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import synthetic_events
+from karaoke_processor import KaraokeProcessor, Syllable
+
+
+# Mismos campos que Syllable, sin __slots__: la representación anterior
+DictSyllable = make_dataclass('DictSyllable', [(f.name, f.type) for f in fields(Syllable)])
+
+
+def dict_syllables(processor: KaraokeProcessor, events) -> List:
+    lines = []
+    for event in events:
+        processor.select_style(event.style)
+        lines.append([
+            DictSyllable(s.text, s.duration, s.start_time, s.end_time, s.x, s.y, s.index, s.char_index)
+            for s in processor.extract_syllables(event.text, event)
+        ])
+    return lines
+
+
+def slotted_lines(processor: KaraokeProcessor, events) -> List:
+    return [processor.parse_event(event) for event in events]
+
+
+def measure(build: Callable) -> Tuple[float, int]:
+    """Segundos de build() y bytes retenidos por su resultado
+
+    tracemalloc hace más lenta la ejecución: el tiempo se mide en otra corrida.
+    """
+    t0 = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - t0
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del result
+    return elapsed, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria por sílaba de cada representación")
+    parser.add_argument('--lines', type=int, default=20000, help="Líneas de diálogo")
+    parser.add_argument('--syllables', type=int, default=12, help="Sílabas por línea")
+    parser.add_argument('--chars', type=int, default=2, help="Caracteres por sílaba")
+    args = parser.parse_args()
+
+    events = synthetic_events(args.lines, args.syllables, args.chars)
+    processor = KaraokeProcessor(use_font_metrics=False)
+    syllables = sum(len(line.syllables) for line in slotted_lines(processor, events))
+
+    print(f"{args.lines} líneas, {syllables} sílabas")
+    for name, build in (
+        ('Syllable con __dict__', lambda: dict_syllables(processor, events)),
+        ('KaraokeLine (__slots__)', lambda: slotted_lines(processor, events)),
+    ):
+        elapsed, retained = measure(build)
+        print(f"{name:<24} {retained / 1024:>10,.0f} KiB  {retained / syllables:7.1f} B/sílaba  {elapsed:7.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de los caminos críticos sobre un corpus sintético: parseo del ASS,
+parseo de karaoke, las 3 capas y process_effect.main de punta a punta.
+Reporta tiempo, throughput, pico de memoria y líneas generadas; con --json
+guarda el resultado para comparar versiones (--compare).
+
+    python3 benchmarks/bench_suite.py --lines 2000 --cjk 0.3 --json actual.json
+    python3 benchmarks/bench_suite.py --compare actual.json
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from contextlib import redirect_stdout
+from typing import Callable, Dict, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import CorpusSpec, dialogue_lines, write_script
+from ass_parser import ASSParser
+from karaoke_processor import KaraokeProcessor
+from effects import MultiLayerEffectGenerator
+import process_effect
+
+
+def run_timed(func: Callable[[], Tuple[int, int]], repeat: int) -> Dict:
+    """Mejor tiempo de `repeat` corridas y pico de memoria de una corrida extra
+
+    func devuelve (operaciones, líneas generadas); parse_dialogue_line
+    cuenta sílabas en lugar de líneas.
+    """
+    best = None
+    ops = output = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        ops, output = func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+
+    # tracemalloc hace más lenta la ejecución: se mide aparte
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'seconds': round(best, 6),
+        'ops': ops,
+        'ops_per_sec': round(ops / best, 1) if best else None,
+        'output_lines': output,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def bench_ass_parser(path: str) -> Callable[[], Tuple[int, int]]:
+    def run():
+        parser = ASSParser(path)
+        return len(parser.document.events), 0
+    return run
+
+
+def bench_parse_dialogue_line(lines, styles, font_metrics: bool) -> Callable[[], Tuple[int, int]]:
+    def run():
+        processor = KaraokeProcessor(styles=styles, use_font_metrics=font_metrics)
+        syllables = 0
+        for line in lines:
+            karaoke_line = processor.parse_dialogue_line(line)
+            syllables += len(karaoke_line.syllables)
+        return len(lines), syllables
+    return run
+
+
+def bench_generate_all_layers(lines, styles, font_metrics: bool) -> Callable[[], Tuple[int, int]]:
+    processor = KaraokeProcessor(styles=styles, use_font_metrics=font_metrics)
+    karaoke_lines = [processor.parse_dialogue_line(line) for line in lines]
+
+    def run():
+        generator = MultiLayerEffectGenerator(styles=styles)
+        generator.processor.use_font_metrics = font_metrics
+        generator.rng.seed(1)
+        output = 0
+        for karaoke_line in karaoke_lines:
+            output += len(generator.generate_all_layers(karaoke_line))
+        return len(karaoke_lines), output
+    return run
+
+
+def bench_process_effect_main(path: str, workdir: str, font_metrics: bool) -> Callable[[], Tuple[int, int]]:
+    config_file = os.path.join(workdir, 'config.txt')
+    output_file = os.path.join(workdir, 'fx.txt')
+    with open(config_file, 'w') as f:
+        f.write("EFFECT_TYPE:lead_in\nENTRY_DURATION:300\nFADEOUT_DURATION:300\n")
+    argv = ['process_effect.py', path, config_file, output_file]
+    if not font_metrics:
+        argv.append('--no-font-metrics')
+    events = sum(1 for _ in process_effect.iter_dialogue_events(path))
+
+    def run():
+        saved = sys.argv
+        sys.argv = argv
+        try:
+            with redirect_stdout(io.StringIO()):
+                process_effect.main()
+        finally:
+            sys.argv = saved
+        with open(output_file, encoding='utf-8') as f:
+            output = sum(1 for _ in f)
+        return events, output
+    return run
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_suite(spec: CorpusSpec, repeat: int, font_metrics: bool) -> Dict:
+    lines = dialogue_lines(spec)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='pyfx-bench-') as workdir:
+        path = write_script(os.path.join(workdir, 'corpus.ass'), spec)
+        styles = ASSParser(path).document.styles
+        benches = {
+            'ass_parser': bench_ass_parser(path),
+            'parse_dialogue_line': bench_parse_dialogue_line(lines, styles, font_metrics),
+            'generate_all_layers': bench_generate_all_layers(lines, styles, font_metrics),
+            'process_effect_main': bench_process_effect_main(path, workdir, font_metrics),
+        }
+        for name, func in benches.items():
+            results[name] = run_timed(func, repeat)
+            print_result(name, results[name])
+
+    return {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'font_metrics': font_metrics,
+        'corpus': spec.as_dict(),
+        'results': results,
+    }
+
+
+def print_result(name: str, result: Dict) -> None:
+    print(f"{name:<22} {result['ops']:>8} ops  {result['seconds']:9.4f} s  "
+          f"{result['ops_per_sec']:>12,.0f} ops/s  {result['peak_kib']:>10,.0f} KiB  "
+          f"{result['output_lines']:>9} líneas")
+
+
+def compare(current: Dict, baseline: Dict) -> None:
+    """Cambio de throughput y memoria respecto de una corrida anterior"""
+    print(f"\nComparación con {baseline.get('revision') or 'la referencia'}:")
+    for name, result in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base or not base.get('ops_per_sec'):
+            print(f"{name:<22} (sin referencia)")
+            continue
+        speed = result['ops_per_sec'] / base['ops_per_sec']
+        memory = result['peak_kib'] / base['peak_kib'] if base.get('peak_kib') else float('nan')
+        print(f"{name:<22} throughput x{speed:5.2f}   memoria x{memory:5.2f}")
+    if current['corpus'] != baseline.get('corpus'):
+        print("Atención: el corpus de la referencia es distinto")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de generación sobre un corpus sintético")
+    parser.add_argument('--lines', type=int, default=2000, help="Líneas de diálogo")
+    parser.add_argument('--syllables', type=int, default=12, help="Sílabas por línea")
+    parser.add_argument('--chars', type=int, default=2, help="Caracteres por sílaba")
+    parser.add_argument('--cjk', type=float, default=0.0, help="Proporción de sílabas CJK (0..1)")
+    parser.add_argument('--seed', type=int, default=1, help="Semilla del corpus")
+    parser.add_argument('--repeat', type=int, default=3, help="Corridas por benchmark (se toma la mejor)")
+    parser.add_argument('--font-metrics', action='store_true',
+        help="Medir con las fuentes instaladas (por defecto se estima, para comparar entre máquinas)")
+    parser.add_argument('--json', help="Guardar el resultado en este archivo JSON")
+    parser.add_argument('--compare', help="JSON de una corrida anterior para comparar")
+    args = parser.parse_args()
+
+    spec = CorpusSpec(args.lines, args.syllables, args.chars, args.cjk, args.seed)
+    report = run_suite(spec, args.repeat, args.font_metrics)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Benchmark de generación de tags: líneas fx por segundo de las 3 capas
+(MultiLayerEffectGenerator) y del lead-in simple (process_effect).
+
+    python3 benchmarks/bench_templates.py --lines 2000 --syllables 12
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ass_document import EventRecord
+from effects import MultiLayerEffectGenerator
+from process_effect import process_dialogue_lines
+
+
+def synthetic_events(lines: int, syllables: int):
+    events = []
+    for i in range(lines):
+        text = ''.join(f"{{\\k{20 + (j * 7) % 30}}}ka{'i ' if j % 3 == 2 else 'n'}" for j in range(syllables))
+        start = i * 5000
+        end = start + syllables * 400
+        line = (f"Dialogue: 1,0:{start // 60000:02d}:{start // 1000 % 60:02d}.{start // 10 % 100:02d},"
+                f"0:{end // 60000:02d}:{end // 1000 % 60:02d}.{end // 10 % 100:02d},Romaji,,0,0,0,,{text}")
+        events.append(EventRecord.from_line(line))
+    return events
+
+
+def measure(label: str, func, repeat: int) -> None:
+    best = None
+    count = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        count = func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<14} {count:>9} líneas  {best:8.3f} s  {count / best:>12,.0f} líneas/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lines', type=int, default=2000)
+    parser.add_argument('--syllables', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    events = synthetic_events(args.lines, args.syllables)
+    generator = MultiLayerEffectGenerator()
+    config = {'FONT_METRICS': '0'}
+
+    measure("multi_layer", lambda: sum(1 for _ in generator.generate_lines(events, seed=1)), args.repeat)
+    measure("lead_in", lambda: len(process_dialogue_lines(events, config, {})), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark del parseo de karaoke: la expresión regular anterior contra el
+tokenizador de override_tokens, sin caché (primera vez que se ve cada texto)
+y con caché (el mismo texto otra vez), sobre líneas largas.
+
+    python3 benchmarks/bench_tokenizer.py --lines 500 --syllables 200 --inline 0.2
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+from typing import Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from override_tokens import karaoke_segments, tokenize, _override_block
+
+
+# Patrón que usaban extract_syllables y batch_layout (no reconoce \ko ni varios \k por bloque)
+LEGACY_PATTERN = re.compile(r'\{[^}]*\\[kK]f?(\d+)[^}]*\}([^{]*)')
+
+
+def long_lines(lines: int, syllables: int, inline: float, seed: int = 1) -> List[str]:
+    """Líneas de karaoke; `inline` es la proporción de sílabas con un tag dentro"""
+    rng = random.Random(seed)
+    texts = []
+    for n in range(lines):
+        parts = []
+        for j in range(syllables):
+            kind = rng.choice(('k', 'k', 'k', 'kf', 'K'))
+            syllable = rng.choice(('ka', 'shi', 'to', 'n', 'ra ', 'mi'))
+            if rng.random() < inline:
+                syllable = syllable[0] + '{\\i1}' + syllable[1:]
+            parts.append(f"{{\\{kind}{10 + (n + j) % 40}}}{syllable}")
+        texts.append(''.join(parts))
+    return texts
+
+
+def legacy_parse(texts: List[str]) -> int:
+    return sum(1 for text in texts for _ in LEGACY_PATTERN.finditer(text))
+
+
+def tokenizer_parse(texts: List[str]) -> int:
+    return sum(len(karaoke_segments(text)) for text in texts)
+
+
+def cold_parse(texts: List[str]) -> int:
+    karaoke_segments.cache_clear()
+    tokenize.cache_clear()
+    _override_block.cache_clear()
+    return tokenizer_parse(texts)
+
+
+def measure(label: str, func: Callable[[], int], repeat: int, syllables: int) -> None:
+    best = None
+    count = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        count = func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<28} {best * 1000:9.2f} ms  {syllables / best:12,.0f} sílabas/s  ({count} sílabas)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regex de karaoke vs tokenizador")
+    parser.add_argument('--lines', type=int, default=500, help="Líneas distintas")
+    parser.add_argument('--syllables', type=int, default=200, help="Sílabas por línea")
+    parser.add_argument('--inline', type=float, default=0.2,
+        help="Proporción de sílabas con un tag dentro (la regex pierde su texto)")
+    parser.add_argument('--repeat', type=int, default=5, help="Repeticiones (se toma la mejor)")
+    args = parser.parse_args()
+
+    texts = long_lines(args.lines, args.syllables, args.inline)
+    total = args.lines * args.syllables
+    print(f"{args.lines} líneas de {args.syllables} sílabas, {sum(map(len, texts)) // args.lines} caracteres por línea")
+
+    measure("regex anterior", lambda: legacy_parse(texts), args.repeat, total)
+    measure("tokenizador sin caché", lambda: cold_parse(texts), args.repeat, total)
+    cold_parse(texts)
+    measure("tokenizador con caché", lambda: tokenizer_parse(texts), args.repeat, total)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Servidor persistente de Py Effector FX
+Mantiene en memoria estilos parseados, configuraciones y generadores para que
+la macro de Aegisub no pague el arranque de Python en cada ejecución.
+
+Protocolo: una petición JSON por línea, una respuesta JSON por línea.
+
+    {"cmd": "ping"}                          -> {"ok": true, "version": N}
+    {"cmd": "styles", "ass_file": "..."}
+    {"cmd": "gui", "ass_file": "..."}        -> {"ok": true, "pid": N}
+    {"cmd": "process", "ass_file": "...", "config_file": "...", "output_file": "...",
+     "generator": "multi_layer", "workers": 4, "seed": 1, "cache_dir": "...",
+     "optimize": true, "fps": "auto", "format": "binary",
+     "manifest_file": "...", "keep_ids_file": "..."}   (manifest_file: no con multi_layer)
+    {"cmd": "shutdown"}
+
+Si la petición incluye "close": true el servidor cierra la conexión después de
+responder (útil para clientes como `nc -U`).
+
+"version" es PROTOCOL_VERSION: la macro lo compara con el suyo y reinicia un
+servidor que quedó corriendo de una versión anterior. Una petición que trae
+"version" distinta de la del servidor se rechaza.
+
+El socket por defecto está en $XDG_RUNTIME_DIR (o en un directorio 0700 del
+usuario dentro de /tmp) y solo lo puede abrir su dueño.
+
+La GUI corre en un proceso aparte (Tk no queda cargado en el servidor y las
+demás peticiones se siguen atendiendo); la respuesta trae su pid y la macro
+espera a que termine.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import socketserver
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from ass_document import ASSDocument
+from process_effect import (read_config, process_dialogue_lines, write_lines, iter_generated_blocks,
+                            iter_delta_lines, read_keep_ids, write_manifest, clear_style_widths)
+from effects import MultiLayerEffectGenerator, effect_config_from_dict, layer2_report
+from fx_cache import FxCache
+from frame_timing import resolve_fps
+from font_metrics import refresh_default_metrics
+from tag_optimizer import TagOptimizer
+from batch_layout import layout_cache
+from style_layout import with_play_res
+from parallel import iter_generated_lines_parallel, generate_multi_layer_parallel
+
+
+def default_socket_path() -> str:
+    """Socket en $XDG_RUNTIME_DIR; sin él, en un directorio propio del usuario"""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if not runtime_dir:
+        user = os.environ.get('USER') or str(os.getuid())
+        runtime_dir = os.path.join(tempfile.gettempdir(), f"pyfx-{user}")
+    return os.path.join(runtime_dir, "pyfx.sock")
+
+
+DEFAULT_SOCKET = default_socket_path()
+
+# Documentos parseados que se mantienen en memoria (los menos usados se descartan)
+MAX_DOCUMENTS = 16
+
+# Cada cuántos segundos se vuelven a recorrer los directorios de fuentes
+FONT_REFRESH_INTERVAL = 30.0
+
+# Se incrementa con cada cambio del protocolo o de lo que genera el servidor
+PROTOCOL_VERSION = 2
+
+GUI_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gui_script.py')
+
+
+def _file_stamp(path: str) -> Tuple[float, int]:
+    st = os.stat(path)
+    return (st.st_mtime, st.st_size)
+
+
+class EffectorServer:
+    """Estado caliente compartido entre peticiones"""
+
+    def __init__(self):
+        # ruta -> (stamp, documento), en orden de uso
+        self._documents: 'OrderedDict[str, Tuple[Tuple[float, int], ASSDocument]]' = OrderedDict()
+        # ruta -> (stamp, config)
+        self._configs: Dict[str, Tuple[Tuple[float, int], dict]] = {}
+        # config congelada -> generador multi-capa
+        self._generators: Dict[Tuple, MultiLayerEffectGenerator] = {}
+        # directorio -> caché incremental de líneas fx
+        self._caches: Dict[str, FxCache] = {}
+        self._fonts_checked = time.monotonic()
+        self.running = True
+
+    def load_document(self, ass_file: str) -> ASSDocument:
+        """Parsear el ASS solo si cambió desde la última petición"""
+        stamp = _file_stamp(ass_file)
+        cached = self._documents.get(ass_file)
+        if cached and cached[0] == stamp:
+            self._documents.move_to_end(ass_file)
+            return cached[1]
+
+        document = ASSDocument.load(ass_file)
+        self._documents[ass_file] = (stamp, document)
+        self._documents.move_to_end(ass_file)
+        while len(self._documents) > MAX_DOCUMENTS:
+            self._documents.popitem(last=False)
+        return document
+
+    def load_config(self, request: dict) -> dict:
+        if 'config' in request:
+            return dict(request['config'])
+
+        config_file = request['config_file']
+        stamp = _file_stamp(config_file)
+        cached = self._configs.get(config_file)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+        config = read_config(config_file)
+        self._configs[config_file] = (stamp, config)
+        return config
+
+    def get_generator(self, config: dict) -> MultiLayerEffectGenerator:
+        key = tuple(sorted(config.items()))
+        generator = self._generators.get(key)
+        if generator is None:
+            generator = MultiLayerEffectGenerator(effect_config_from_dict(config))
+            self._generators[key] = generator
+        return generator
+
+    def refresh_fonts(self, force: bool = False) -> bool:
+        """Tomar fuentes instaladas o borradas desde el arranque; True si cambiaron
+
+        Con cambios se descartan los anchos, generadores y layouts que usaban
+        los medidores anteriores.
+        """
+        now = time.monotonic()
+        if not force and now - self._fonts_checked < FONT_REFRESH_INTERVAL:
+            return False
+        self._fonts_checked = now
+        if not refresh_default_metrics():
+            return False
+        clear_style_widths()
+        self._generators.clear()
+        layout_cache.clear()
+        return True
+
+    def get_cache(self, cache_dir: Optional[str]) -> Optional[FxCache]:
+        if not cache_dir:
+            return None
+        cache = self._caches.get(cache_dir)
+        if cache is None:
+            cache = self._caches[cache_dir] = FxCache(cache_dir)
+        return cache
+
+    def handle(self, request: dict) -> dict:
+        """Atender una petición y devolver la respuesta"""
+        cmd = request.get('cmd')
+
+        version = request.get('version')
+        if version not in (None, '') and str(version) != str(PROTOCOL_VERSION):
+            return {'ok': False, 'version': PROTOCOL_VERSION,
+                    'error': f"Versión del protocolo distinta: {version} (servidor {PROTOCOL_VERSION})"}
+
+        if cmd == 'ping':
+            return {'ok': True, 'version': PROTOCOL_VERSION}
+
+        if cmd == 'shutdown':
+            self.running = False
+            return {'ok': True}
+
+        if cmd == 'styles':
+            document = self.load_document(request['ass_file'])
+            return {'ok': True, 'styles': document.style_names()}
+
+        if cmd == 'gui':
+            return self._run_gui(request.get('ass_file'))
+
+        if cmd == 'process':
+            return self._process(request)
+
+        return {'ok': False, 'error': f"Comando desconocido: {cmd}"}
+
+    def _process(self, request: dict) -> dict:
+        self.refresh_fonts()
+        config = self.load_config(request)
+        if not config:
+            return {'ok': False, 'error': "No se pudo leer la configuracion"}
+
+        document = self.load_document(request['ass_file'])
+        styles = document.styles
+        if 'fps' in request:
+            config = dict(config, FPS=str(request['fps']))
+        if str(config.get('FPS', '')).strip().lower() == 'auto':
+            # FPS del video del proyecto; sin él se genera en ms
+            fps = resolve_fps('auto', document)
+            config = dict(config, FPS=repr(fps) if fps else '')
+        # Ubicación de las líneas según la resolución del script
+        config = with_play_res(config, document)
+        # El índice por estilo evita recorrer las líneas de otros estilos
+        dialogue_lines = document.dialogues(config.get('SELECTED_STYLE', ''))
+
+        workers = int(request.get('workers', 1))
+        # Por JSON puede llegar como texto: seed_line la usaría como cadena
+        seed = request.get('seed')
+        seed = int(seed) if seed not in (None, '') else None
+        cache = self.get_cache(request.get('cache_dir'))
+        cache_before = (cache.hits, cache.misses) if cache else (0, 0)
+
+        # Salida binaria del lead-in serie sin optimizar: se genera como registros
+        output_file = request.get('output_file')
+        records = (request.get('format') == 'binary' and bool(output_file) and workers <= 1
+                   and not request.get('optimize') and request.get('generator') != 'multi_layer')
+        manifest = []
+        manifest_file = request.get('manifest_file')
+        if manifest_file and request.get('generator') == 'multi_layer':
+            # Las capas de multi_layer no se agrupan en bloques con id
+            return {'ok': False, 'error': "manifest_file no se admite con generator multi_layer"}
+        if manifest_file:
+            # Protocolo delta: solo los bloques que la macro no tiene
+            blocks = iter_generated_blocks(dialogue_lines, config, styles, cache, records)
+            generated = list(iter_delta_lines(blocks, read_keep_ids(request.get('keep_ids_file')), manifest))
+        elif request.get('generator') == 'multi_layer':
+            style = config.get('SELECTED_STYLE', '')
+            if workers > 1:
+                generated = list(generate_multi_layer_parallel(
+                    dialogue_lines, effect_config_from_dict(config), style, seed, workers,
+                    cache=cache, styles=styles))
+            else:
+                generator = self.get_generator(config)
+                generator.cache = cache
+                generator.processor.styles = styles
+                generated = list(generator.generate_lines(dialogue_lines, style, seed))
+        elif workers > 1:
+            generated = list(iter_generated_lines_parallel(
+                dialogue_lines, config, styles, workers, cache=cache))
+        else:
+            generated = process_dialogue_lines(dialogue_lines, config, styles, cache, records)
+
+        response = {'ok': True, 'count': len(generated), 'layout_cache': layout_cache.stats()}
+        if cache:
+            # Incluye los lotes de los procesos del pool (parallel suma sus contadores)
+            response['cache'] = {'hits': cache.hits - cache_before[0], 'misses': cache.misses - cache_before[1]}
+        if request.get('generator') == 'multi_layer':
+            chars, events = layer2_report(generated)
+            response['layer2_events'] = events
+            response['layer2_events_saved'] = chars - events
+        if request.get('optimize'):
+            optimizer = TagOptimizer(styles)
+            generated = list(optimizer.optimize_lines(generated))
+            stats = optimizer.stats
+            response['bytes_saved'] = stats.bytes_before - stats.bytes_after
+            response['tags_saved'] = stats.tags_before - stats.tags_after
+
+        if manifest_file:
+            write_manifest(manifest_file, manifest)
+            response['blocks'] = len(manifest)
+        if output_file:
+            write_lines(output_file, generated, binary=request.get('format') == 'binary')
+        else:
+            response['lines'] = generated
+        return response
+
+    def _run_gui(self, ass_file: Optional[str]) -> dict:
+        """Lanzar la GUI en otro proceso sin esperarla"""
+        args = [sys.executable, GUI_SCRIPT]
+        if ass_file:
+            args.append(ass_file)
+        process = subprocess.Popen(args, stdin=subprocess.DEVNULL)
+        # Recoger el proceso al terminar: sin esto quedaría zombie y la macro,
+        # que espera con `kill -0`, no vería que se cerró
+        threading.Thread(target=process.wait, daemon=True).start()
+        return {'ok': True, 'pid': process.pid}
+
+
+def handle_json_line(server: EffectorServer, raw: str) -> Tuple[str, bool]:
+    """Procesar una línea del protocolo; devuelve (respuesta, cerrar)"""
+    try:
+        request = json.loads(raw)
+    except ValueError as e:
+        return json.dumps({'ok': False, 'error': f"JSON inválido: {e}"}), False
+    if not isinstance(request, dict):
+        return json.dumps({'ok': False, 'error': "La petición tiene que ser un objeto JSON"}), False
+
+    try:
+        response = server.handle(request)
+    except Exception as e:
+        response = {'ok': False, 'error': str(e)}
+
+    return json.dumps(response, ensure_ascii=False), bool(request.get('close'))
+
+
+def serve_stdio(server: EffectorServer) -> None:
+    """Atender peticiones por stdin/stdout"""
+    for raw in sys.stdin:
+        if not raw.strip():
+            continue
+        response, _ = handle_json_line(server, raw)
+        sys.stdout.write(response + '\n')
+        sys.stdout.flush()
+        if not server.running:
+            break
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server.effector
+        for raw in self.rfile:
+            raw = raw.decode('utf-8')
+            if not raw.strip():
+                continue
+            response, close = handle_json_line(server, raw)
+            self.wfile.write((response + '\n').encode('utf-8'))
+            self.wfile.flush()
+            if close or not server.running:
+                break
+
+
+def serve_unix(server: EffectorServer, socket_path: str = DEFAULT_SOCKET) -> None:
+    """Atender peticiones por un socket Unix (una conexión a la vez)"""
+    directory = os.path.dirname(socket_path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, mode=0o700)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    # El socket se crea ya sin permisos para otros usuarios
+    umask = os.umask(0o177)
+    try:
+        srv = socketserver.UnixStreamServer(socket_path, _RequestHandler)
+    finally:
+        os.umask(umask)
+    with srv:
+        os.chmod(socket_path, 0o600)
+        srv.effector = server
+        inode = os.stat(socket_path).st_ino
+        try:
+            while server.running:
+                srv.handle_request()
+        finally:
+            # Si otro servidor ya tomó la ruta, su socket no se borra
+            try:
+                if os.stat(socket_path).st_ino == inode:
+                    os.remove(socket_path)
+            except FileNotFoundError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor persistente de Py Effector FX")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help="Ruta del socket Unix")
+    parser.add_argument('--stdio', action='store_true', help="Usar stdin/stdout en lugar del socket")
+    args = parser.parse_args()
+
+    server = EffectorServer()
+    if args.stdio:
+        serve_stdio(server)
+    else:
+        serve_unix(server, args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,25 @@ Generador de efectos multi-capa para karaoke ASS
 import re
 import random
 import math
-from typing import List, Dict, Tuple, Optional
-from dataclasses import dataclass
-from karaoke_processor import KaraokeLine, Syllable, KaraokeProcessor
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator, Sequence, Union
+from dataclasses import dataclass, replace
+from ass_document import EventRecord, StyleRecord
+from ass_time import format_time
+from karaoke_processor import KaraokeLine, KaraokeProcessor
+from fx_cache import FxCache, hash_parts, config_hash
+from tag_templates import LayerTemplates
+from batch_layout import ScriptLayout, entry_offsets, layout_lines
+from fx_random import stream_key, entry_draws
+from frame_timing import FrameTiming, frame_timing, resolve_fps
+from style_layout import parse_play_res
+from instrumentation import instruments
+
+
+# Líneas por lote de layout en generate_lines
+LAYOUT_BATCH = 128
+
+# Distancia (px) desde la que entra cada caracter en la capa 2
+ENTRY_DISTANCE = 50
 
 
 @dataclass
@@ -34,6 +50,20 @@ class EffectConfig:
     # Tipo de entrada
     entry_type: str = "random_rotate"  # random_rotate, fly_in, scale_in
     
+    # Eventos de la capa 2 por sílaba: char (uno por caracter), group (hasta
+    # entry_max_events grupos de caracteres contiguos), syllable (uno por sílaba)
+    entry_mode: str = "char"
+    entry_max_events: int = 3
+    
+    # Semilla de la aleatoriedad por posición (fx_random); None = RNG sin semilla
+    seed: Optional[int] = None
+    
+    # FPS del video: tiempos y duraciones de tags ajustados a cuadros; None = en ms
+    fps: Optional[float] = None
+    
+    # PlayResX/PlayResY del script (ubicación de las líneas); (0, 0) = posición fija anterior
+    play_res: Tuple[int, int] = (0, 0)
+    
     # Highlight
     highlight_scale_x: int = 135
     highlight_scale_y: int = 150
@@ -42,12 +72,66 @@ class EffectConfig:
     highlight_perspective_x: int = -30
 
 
+def effect_config_from_dict(config: Dict, document=None) -> EffectConfig:
+    """Construir un EffectConfig desde las claves del archivo de configuración de la GUI
+
+    FPS:auto toma el FPS de [Aegisub Project Garbage] de `document`; sin
+    PLAY_RES se usa la resolución de `document`.
+    """
+    defaults = EffectConfig()
+    return EffectConfig(
+        primary_color=config.get('PRIMARY_COLOR', defaults.primary_color),
+        border_color=config.get('BORDER_COLOR', defaults.border_color),
+        shadow_color=config.get('SHADOW_COLOR', defaults.shadow_color),
+        border_size=float(config.get('BORDER_SIZE', defaults.border_size)),
+        shadow_size=float(config.get('SHADOW_SIZE', defaults.shadow_size)),
+        blur=float(config.get('BLUR', defaults.blur)),
+        entry_duration=int(config.get('ENTRY_DURATION', defaults.entry_duration)),
+        highlight_duration=int(config.get('HIGHLIGHT_DURATION', defaults.highlight_duration)),
+        fade_out_duration=int(config.get('FADEOUT_DURATION', defaults.fade_out_duration)),
+        entry_mode=config.get('ENTRY_MODE', defaults.entry_mode),
+        entry_max_events=int(config.get('ENTRY_MAX_EVENTS', defaults.entry_max_events)),
+        seed=int(config['SEED']) if str(config.get('SEED', '')).strip() else defaults.seed,
+        fps=resolve_fps(config.get('FPS'), document),
+        play_res=(document.play_res if document is not None and 'PLAY_RES' not in config
+                  else parse_play_res(config.get('PLAY_RES'))),
+    )
+
+
+def layer2_report(lines: Iterable[str]) -> Tuple[int, int]:
+    """(eventos de la capa 2 en modo char, eventos generados) de una salida multi-capa
+
+    Los caracteres visibles se cuentan en el texto de la capa 3 (una línea por sílaba).
+    """
+    chars = events = 0
+    for line in lines:
+        if line.startswith('Dialogue: 2,'):
+            events += 1
+        elif line.startswith('Dialogue: 3,'):
+            text = line[line.rfind('}') + 1:]
+            chars += sum(1 for char in text if char.strip())
+    return chars, events
+
+
 class MultiLayerEffectGenerator:
     """Generador de efectos de 3 capas para karaoke"""
     
-    def __init__(self, config: EffectConfig = None):
+    def __init__(self, config: EffectConfig = None, cache: Optional[FxCache] = None,
+                 styles: Optional[Dict[str, StyleRecord]] = None):
         self.config = config or EffectConfig()
-        self.processor = KaraokeProcessor()
+        self.processor = KaraokeProcessor(styles=styles, play_res=self.config.play_res)
+        # RNG propio para poder re-sembrarlo por línea (ver seed_line)
+        self.rng = random.Random()
+        # Caché incremental opcional de las capas generadas por línea
+        self.cache = cache
+        self._config_key = config_hash(self.config)
+        # Fragmentos de tags invariantes, compilados una vez por configuración
+        self._templates: Optional[LayerTemplates] = None
+        self._templates_config: Optional[EffectConfig] = None
+    
+    def seed_line(self, seed: int, line_index: int) -> None:
+        """Re-sembrar el RNG para una línea; la salida no depende del orden de proceso"""
+        self.rng.seed(seed * 1000003 + line_index)
     
     def hex_to_ass(self, hex_color: str) -> str:
         """Convertir HEX a formato ASS (&HBBGGRR&)"""
@@ -55,139 +139,281 @@ class MultiLayerEffectGenerator:
         r, g, b = hex_color[0:2], hex_color[2:4], hex_color[4:6]
         return f"&H00{b}{g}{r}&"
     
+    @property
+    def templates(self) -> LayerTemplates:
+        """Plantillas compiladas para la configuración actual (se recompilan si cambia)"""
+        if self._templates_config != self.config:
+            self._templates = LayerTemplates(self.config, self.timing)
+            self._templates_config = replace(self.config)
+        return self._templates
+    
+    @property
+    def timing(self) -> Optional[FrameTiming]:
+        """Ajuste a cuadros si config.fps está definido"""
+        return frame_timing(self.config.fps) if self.config.fps else None
+    
+    def frame_times(self, timing: FrameTiming, start_ms: int,
+                    line_end_ms: int) -> Tuple[str, str, str, str, bool, bool, bool]:
+        """Tiempos de las capas de una sílaba ajustados a cuadros
+        
+        (inicio de la entrada, inicio, fin del highlight, fin de la línea) y si
+        las capas 1, 2 y 3 duran al menos un cuadro; las que no, no se ven.
+        """
+        start = timing.frame(start_ms)
+        entry = max(0, start - timing.frames(self.config.entry_duration))
+        highlight = start + timing.frames(self.config.highlight_duration)
+        end = timing.frame(line_end_ms)
+        at = timing.format_frame
+        return (at(entry), at(start), at(highlight), at(end),
+                highlight < end, entry < start, start < highlight)
+    
     def get_base_tags(self) -> str:
         """Tags base de colores"""
-        return (
-            f"\\blur{self.config.blur}"
-            f"\\bord{self.config.border_size}"
-            f"\\shad{self.config.shadow_size}"
-            f"\\3c{self.hex_to_ass(self.config.border_color)}"
-            f"\\c{self.hex_to_ass(self.config.primary_color)}"
-        )
+        return self.templates.base_tags
     
-    def get_random_entry_position(self, x: float, y: float, distance: int = 50) -> Tuple[float, float]:
-        """Generar posición aleatoria de entrada"""
-        angle = random.uniform(0, 2 * math.pi)
-        dx = distance * math.cos(angle)
-        dy = distance * math.sin(angle)
-        return (x + dx, y + dy)
+    def entry_cap(self) -> int:
+        """Máximo de eventos de la capa 2 por sílaba según entry_mode (0 = sin límite)"""
+        mode = self.config.entry_mode
+        if mode == 'syllable':
+            return 1
+        if mode == 'group':
+            return max(1, self.config.entry_max_events)
+        return 0
     
-    def generate_layer1_main(self, syl: Syllable, line: KaraokeLine, line_end_ms: int) -> str:
-        """
-        Layer 1: Texto final (aparece después del highlight, permanece hasta el final)
+    def entry_groups(self, text: str, centers: Sequence[float],
+                     advances: Sequence[float]) -> List[Tuple[str, float]]:
+        """(texto, centro x) de cada evento de la capa 2 de una sílaba
+        
+        Sin límite hay un evento por caracter visible (los espacios no se
+        animan); con límite los caracteres visibles se reparten en grupos
+        contiguos de tamaño parejo, cada uno con un solo movimiento.
         """
-        # Tiempo: desde que termina el highlight hasta el final de la línea
-        start_ms = int(syl.start_time + self.config.highlight_duration)
+        visible = [i for i, char in enumerate(text) if char.strip()]
+        cap = self.entry_cap()
+        if not cap or cap >= len(visible):
+            return [(text[i], centers[i]) for i in visible]
         
-        start_time = self.processor.format_time(start_ms)
-        end_time = line.end_time
+        groups = []
+        size, extra = divmod(len(visible), cap)
+        start = 0
+        for g in range(cap):
+            count = size + (1 if g < extra else 0)
+            first, last = visible[start], visible[start + count - 1]
+            left = centers[first] - advances[first] / 2
+            right = centers[last] + advances[last] / 2
+            groups.append((text[first:last + 1], (left + right) / 2))
+            start += count
+        return groups
+    
+    def generate_all_layers(self, karaoke_line: KaraokeLine, index: int = 0) -> List[str]:
+        """Generar todas las capas para una línea de karaoke
         
-        tags = (
-            f"{{\\an5\\pos({syl.x:.0f},{syl.y:.0f})"
-            f"\\fad(0,{self.config.fade_out_duration})"
-            f"{self.get_base_tags()}}}"
+        La línea se vuelve a ubicar desde su texto con el mismo layout que
+        generate_lines, así las posiciones de cada caracter son las mismas.
+        `index` es el índice de la línea en el script (ver generate_lines).
+        """
+        event = EventRecord(
+            False, karaoke_line.layer, karaoke_line.start_time, karaoke_line.end_time,
+            karaoke_line.style, karaoke_line.name, karaoke_line.margin_l, karaoke_line.margin_r,
+            karaoke_line.margin_v, karaoke_line.effect, karaoke_line.text
         )
-        
-        return (
-            f"Dialogue: 1,{start_time},{end_time},{line.style},,0,0,0,fx,"
-            f"{tags}{syl.text}"
+        # La línea ya se contó al parsearla: no se pasa por processor.layout_lines
+        processor = self.processor
+        processor.play_res = self.config.play_res
+        with instruments.stage('layout'):
+            processor.select_style(event.style)
+            layout = layout_lines([event.text], [processor.char_widths], 0, skip_blank=True)
+            line_y = processor.place_lines(layout, [event])
+        with instruments.stage('format'):
+            layers = self._layers_from_layout(layout, line_y, [event], [index], [()])[0]
+        if instruments.enabled:
+            instruments.count('lines_generated', len(layers))
+        return layers
+    
+    def _line_cache_key(self, event: EventRecord, seed_key: Tuple = ()) -> str:
+        style = self.processor.styles.get(event.style)
+        measurer = self.processor.measurer if style else None
+        font = (measurer.face.path, measurer.face.mtime) if measurer else None
+        return hash_parts(
+            'multi_layer', self._config_key, self.processor.fontsize, self.processor.line_y,
+            self.processor.play_res,
+            style.key() if style else None, font, seed_key, event.key()
         )
     
-    def generate_layer2_entry(self, syl: Syllable, line: KaraokeLine) -> List[str]:
-        """
-        Layer 2: Animación de entrada (cada caracter vuela hacia su posición)
-        """
-        lines = []
+    def _line_cache(self, seed: Optional[int] = None) -> Optional[FxCache]:
+        """Caché a usar según la semilla
         
-        # Tiempo: desde antes del inicio de la sílaba
-        entry_start = max(0, syl.start_time - self.config.entry_duration)
+        Sin `seed` ni config.seed las capas salen del RNG sin semilla: no se
+        guardan ni se leen de la caché (otra ejecución daría otras posiciones).
+        """
+        if seed is None and self.config.seed is None:
+            return None
+        return self.cache
+    
+    def process_line(self, dialogue_line: str, index: int = 0) -> List[str]:
+        """Procesar una línea de diálogo (la número `index` del script) y generar efectos"""
+        event = EventRecord.from_line(dialogue_line)
+        if event is None or event.comment:
+            return []
+        return list(self.generate_lines([event], start_index=index))
+    
+    def generate_lines(self, dialogue_lines: Iterable[Union[str, EventRecord]], style: str = '',
+                       seed: Optional[int] = None, start_index: int = 0) -> Iterator[str]:
+        """Generar las capas de varias líneas de diálogo (opcionalmente de un solo estilo)
         
-        # Calcular posición de cada caracter
-        char_x = syl.x - self.processor.estimate_text_width(syl.text) / 2
+        Con `seed`, cada línea usa un RNG derivado de su índice, así el
+        resultado es el mismo sin importar cómo se repartan las líneas. Si
+        config.seed está definido se usa en cambio la aleatoriedad por
+        posición de fx_random y `seed` no se tiene en cuenta. El índice de
+        cada línea es su posición en `dialogue_lines` más `start_index`.
+        Las líneas se procesan en lotes de LAYOUT_BATCH con un solo layout.
+        """
+        self.processor.play_res = self.config.play_res
+        cache = self._line_cache(seed)
+        batch = []
+        for index, event in enumerate(dialogue_lines, start_index):
+            if not isinstance(event, EventRecord):
+                event = EventRecord.from_line(event)
+            if event is None or event.comment:
+                continue
+            if style and event.style != style:
+                continue
+            # El índice entra en la clave de la caché: con config.seed también es
+            # parte del flujo de cada sílaba (dos líneas iguales no se animan igual)
+            if self.config.seed is not None:
+                seed_key = (index,)
+            elif seed is not None:
+                seed_key = (seed, index)
+            else:
+                seed_key = ()
+            batch.append((event, index, seed_key))
+            if len(batch) >= LAYOUT_BATCH:
+                yield from self._generate_batch(batch, cache)
+                batch = []
+        if batch:
+            yield from self._generate_batch(batch, cache)
+    
+    def _generate_batch(self, batch: List[Tuple[EventRecord, int, Tuple]], cache: Optional[FxCache]) -> Iterator[str]:
+        """Capas de un lote de líneas; solo se hace el layout de las que no están en caché"""
+        results: List[Optional[List[str]]] = [None] * len(batch)
+        keys: List[Optional[str]] = [None] * len(batch)
+        if cache is not None:
+            with instruments.stage('cache'):
+                for n, (event, _, seed_key) in enumerate(batch):
+                    self.processor.select_style(event.style)
+                    keys[n] = self._line_cache_key(event, seed_key)
+                    results[n] = cache.get(keys[n])
+        pending = [n for n, layers in enumerate(results) if layers is None]
         
-        for char in syl.text:
-            if char.strip():  # Ignorar espacios
-                char_width = self.processor.estimate_char_width(char)
-                char_center_x = char_x + char_width / 2
-                
-                # Posición de entrada aleatoria
-                entry_x, entry_y = self.get_random_entry_position(char_center_x, syl.y)
-                
-                # Rotación aleatoria
-                start_rotation = random.randint(-360, 360)
-                
-                start_time = self.processor.format_time(int(entry_start))
-                end_time = self.processor.format_time(int(syl.start_time))
-                
-                tags = (
-                    f"{{{self.get_base_tags()}"
-                    f"\\an5\\move({entry_x:.0f},{entry_y:.0f},{char_center_x:.0f},{syl.y:.0f},0,{self.config.entry_duration})"
-                    f"\\fad({self.config.entry_duration},0)"
-                    f"\\frz{start_rotation}"
-                    f"\\t(0,{self.config.entry_duration},\\frz0)}}"
-                )
-                
-                lines.append(
-                    f"Dialogue: 2,{start_time},{end_time},{line.style},,0,0,0,fx,"
-                    f"{tags}{char}"
+        if pending:
+            events = [batch[n][0] for n in pending]
+            layout, line_y = self.processor.layout_lines(events)
+            with instruments.stage('format'):
+                generated = self._layers_from_layout(
+                    layout, line_y, events, [batch[n][1] for n in pending], [batch[n][2] for n in pending]
                 )
-            
-            char_x += self.processor.estimate_char_width(char)
+            if cache is not None:
+                with instruments.stage('cache'):
+                    for n, layers in zip(pending, generated):
+                        if layers:
+                            cache.put(keys[n], layers)
+            for n, layers in zip(pending, generated):
+                results[n] = layers
         
-        return lines
+        if instruments.enabled:
+            instruments.count('lines_generated', sum(len(layers) for layers in results))
+        for layers in results:
+            yield from layers
     
-    def generate_layer3_highlight(self, syl: Syllable, line: KaraokeLine) -> str:
-        """
-        Layer 3: Efecto de highlight durante el karaoke
-        """
-        start_time = self.processor.format_time(int(syl.start_time))
-        end_time = self.processor.format_time(int(syl.start_time + self.config.highlight_duration))
-        
-        half_dur = self.config.highlight_duration // 2
+    def _layers_from_layout(self, layout: ScriptLayout, line_y: List[float], events: List[EventRecord],
+                            indices: List[int], seed_keys: List[Tuple]) -> List[List[str]]:
+        """Las 3 capas de cada línea a partir del layout en lote (también lo usan generate_all_layers y process_line)
         
-        tags = (
-            f"{{\\an5\\move({syl.x:.0f},{syl.y - 10:.0f},{syl.x:.0f},{syl.y:.0f})"
-            f"\\fscx{self.config.highlight_scale_x}\\fscy{self.config.highlight_scale_y}"
-            f"\\bord3\\blur4"
-            f"\\3c{self.hex_to_ass(self.config.highlight_border_color)}"
-            f"\\xshad0\\yshad-4"
-            f"\\4c{self.hex_to_ass(self.config.highlight_shadow_color)}"
-            f"\\t(0,{half_dur},\\frz{self.config.highlight_rotation}"
-            f"\\fry{self.config.highlight_perspective_y}\\frx{self.config.highlight_perspective_x})"
-            f"\\t({half_dur},{self.config.highlight_duration},\\c{self.hex_to_ass(self.config.primary_color)})"
-            f"\\t(100,{self.config.highlight_duration},\\fscx100\\fscy100\\fry0\\frz0\\frx0)}}"
-        )
-        
-        return (
-            f"Dialogue: 3,{start_time},{end_time},{line.style},,0,0,0,fx,"
-            f"{tags}{syl.text}"
-        )
-    
-    def generate_all_layers(self, karaoke_line: KaraokeLine) -> List[str]:
-        """Generar todas las capas para una línea de karaoke"""
-        result_lines = []
+        `indices` es el índice de cada línea (para config.seed) y `seed_keys`
+        los argumentos de seed_line de cada una ((), sin re-sembrar).
+        """
+        config = self.config
+        templates = self.templates
+        syl_text = layout.syl_text
+        # Capas 1 y 3 con los override tags en línea de la sílaba; la capa 2 va por caracteres
+        syl_markup = layout.syl_markup
+        syl_start = layout.syl_start
+        syl_x = layout.syl_x
+        char_offsets = layout.char_offsets
+        char_center = layout.char_center
         
-        line_end_ms = self.processor.parse_time(karaoke_line.end_time)
+        char_advance = layout.char_advance
         
-        for syl in karaoke_line.syllables:
-            # Layer 1: Main
-            result_lines.append(self.generate_layer1_main(syl, karaoke_line, line_end_ms))
-            
-            # Layer 2: Entry (múltiples líneas, una por caracter)
-            result_lines.extend(self.generate_layer2_entry(syl, karaoke_line))
-            
-            # Layer 3: Highlight
-            result_lines.append(self.generate_layer3_highlight(syl, karaoke_line))
+        # Eventos de la capa 2 de cada sílaba
+        groups: List[List[Tuple[str, float]]] = []
+        for j in range(len(syl_text)):
+            first, last = char_offsets[j], char_offsets[j + 1]
+            groups.append(self.entry_groups(syl_text[j], char_center[first:last], char_advance[first:last]))
         
-        return result_lines
-    
-    def process_line(self, dialogue_line: str) -> List[str]:
-        """Procesar una línea de diálogo y generar efectos"""
-        karaoke_line = self.processor.parse_dialogue_line(dialogue_line)
-        if karaoke_line and karaoke_line.syllables:
-            return self.generate_all_layers(karaoke_line)
-        return []
+        if config.seed is not None:
+            # Un flujo por sílaba derivado de su posición, generado en lote
+            keys = [
+                stream_key(config.seed, indices[n], event.start_ms, event.style, layout.syl_index[j])
+                for n, event in enumerate(events) for j in layout.syllable_range(n)
+            ]
+            angles, rotations = entry_draws(keys, [len(g) for g in groups])
+        else:
+            # Sorteos del RNG: ángulo y rotación por evento, en orden
+            uniform, randint = self.rng.uniform, self.rng.randint
+            angles = []
+            rotations = []
+            for n, seed_key in enumerate(seed_keys):
+                if seed_key:
+                    self.seed_line(*seed_key)
+                for j in layout.syllable_range(n):
+                    for _ in groups[j]:
+                        angles.append(uniform(0, 2 * math.pi))
+                        rotations.append(randint(-360, 360))
+        dx, dy = entry_offsets(angles, ENTRY_DISTANCE)
+        if instruments.enabled:
+            instruments.count('layer2_chars', sum(1 for text in syl_text for char in text if char.strip()))
+            instruments.count('layer2_events', len(angles))
         
+        timing = self.timing
+        show_main = show_entry = show_highlight = True
+        results = []
+        k = 0
+        for n, event in enumerate(events):
+            lines = []
+            style = event.style
+            line_end = event.end
+            y = line_y[n]
+            for j in layout.syllable_range(n):
+                text = syl_markup[j]
+                x = syl_x[j]
+                start = syl_start[j]
+                if timing is None:
+                    start_time = format_time(start)
+                    highlight_end = format_time(start + config.highlight_duration)
+                    entry_start = format_time(start - config.entry_duration)
+                else:
+                    (entry_start, start_time, highlight_end, line_end,
+                     show_main, show_entry, show_highlight) = self.frame_times(timing, start, event.end_ms)
+                
+                # Layer 1: Main
+                if show_main:
+                    lines.append(templates.layer1(highlight_end, line_end, style, x, y, text))
+                
+                # Layer 2: Entry (una línea por caracter visible o por grupo)
+                for chars, center in groups[j]:
+                    if show_entry:
+                        lines.append(templates.layer2(
+                            entry_start, start_time, style,
+                            center + dx[k], y + dy[k], center, y, rotations[k], chars
+                        ))
+                    k += 1
+                
+                # Layer 3: Highlight
+                if show_highlight:
+                    lines.append(templates.layer3(start_time, highlight_end, style, x, y - 10, y, text))
+            results.append(lines)
+        return results
+    
 # Mantener compatibilidad con efectos simples anteriores
 class KaraokeEffects:
     """Generador de efectos simples (compatibilidad)"""
@@ -0,0 +1,537 @@
+"""
+Métricas reales de fuentes TrueType/OpenType
+Lee avances de glifos (hmtx), mapa de caracteres (cmap) y kerning (kern)
+directamente de los archivos de fuente, sin dependencias externas, y
+guarda los avances ya consultados en memoria y en disco.
+
+El tamaño se escala como libass: `Fontsize` corresponde a la altura
+usWinAscent + usWinDescent (o ascender - descender de hhea).
+"""
+
+import os
+import sys
+import json
+import struct
+import atexit
+import hashlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fx_cache import DEFAULT_CACHE_DIR
+from ass_document import StyleRecord
+
+
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc', '.otc')
+
+if sys.platform == 'darwin':
+    FONT_DIRS = ['/System/Library/Fonts', '/Library/Fonts', '~/Library/Fonts']
+elif sys.platform == 'win32':
+    FONT_DIRS = [os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts'),
+                 '~/AppData/Local/Microsoft/Windows/Fonts']
+else:
+    FONT_DIRS = ['/usr/share/fonts', '/usr/local/share/fonts', '~/.fonts', '~/.local/share/fonts']
+
+# Directorios extra separados por os.pathsep
+FONT_DIRS += [d for d in os.environ.get('PYFX_FONT_DIRS', '').split(os.pathsep) if d]
+
+METRICS_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'fonts')
+
+
+class FontFile:
+    """Una fuente dentro de un archivo .ttf/.otf (o de una colección .ttc)"""
+
+    def __init__(self, path: str, offset: int = 0):
+        self.path = path
+        self.offset = offset
+        with open(path, 'rb') as f:
+            self._tables = self._read_directory(f, offset)
+            head = self._read_table(f, 'head')
+            self.units_per_em = struct.unpack_from('>H', head, 18)[0]
+            self.mac_style = struct.unpack_from('>H', head, 44)[0]
+            self.families, self.subfamily = self._parse_names(self._read_table(f, 'name'))
+
+        self._cmap: Optional[Dict[int, int]] = None
+        self._advances: Optional[List[int]] = None
+        self._kerning: Optional[Dict[Tuple[int, int], int]] = None
+        self._height: Optional[int] = None
+
+    @staticmethod
+    def collection_offsets(path: str) -> List[int]:
+        """Offsets de cada fuente del archivo (uno solo si no es colección)"""
+        with open(path, 'rb') as f:
+            header = f.read(12)
+            if header[:4] != b'ttcf':
+                return [0]
+            num_fonts = struct.unpack_from('>I', header, 8)[0]
+            return list(struct.unpack(f'>{num_fonts}I', f.read(4 * num_fonts)))
+
+    @staticmethod
+    def _read_directory(f, offset: int) -> Dict[str, Tuple[int, int]]:
+        f.seek(offset)
+        num_tables = struct.unpack('>4xH6x', f.read(12))[0]
+        tables = {}
+        for _ in range(num_tables):
+            tag, _, table_offset, length = struct.unpack('>4sIII', f.read(16))
+            tables[tag.decode('latin-1')] = (table_offset, length)
+        return tables
+
+    def _read_table(self, f, tag: str) -> bytes:
+        if tag not in self._tables:
+            return b''
+        table_offset, length = self._tables[tag]
+        f.seek(table_offset)
+        return f.read(length)
+
+    def _load_table(self, tag: str) -> bytes:
+        with open(self.path, 'rb') as f:
+            return self._read_table(f, tag)
+
+    @staticmethod
+    def _parse_names(data: bytes) -> Tuple[List[str], str]:
+        families = []
+        subfamily = ''
+        if not data:
+            return families, subfamily
+
+        count, string_offset = struct.unpack_from('>2xHH', data, 0)
+        for i in range(count):
+            platform, encoding, _, name_id, length, offset = struct.unpack_from('>6H', data, 6 + 12 * i)
+            if name_id not in (1, 2, 4, 16):
+                continue
+            raw = data[string_offset + offset:string_offset + offset + length]
+            if platform in (0, 3):
+                name = raw.decode('utf-16-be', 'replace')
+            elif platform == 1 and encoding == 0:
+                name = raw.decode('mac-roman', 'replace')
+            else:
+                continue
+
+            if name_id == 2:
+                subfamily = subfamily or name
+            elif name not in families:
+                families.append(name)
+        return families, subfamily
+
+    @property
+    def bold(self) -> bool:
+        return bool(self.mac_style & 1)
+
+    @property
+    def italic(self) -> bool:
+        return bool(self.mac_style & 2)
+
+    @property
+    def height(self) -> int:
+        """Altura en unidades que libass hace coincidir con el Fontsize"""
+        if self._height is None:
+            os2 = self._load_table('OS/2')
+            height = 0
+            if len(os2) >= 78:
+                win_ascent, win_descent = struct.unpack_from('>HH', os2, 74)
+                height = win_ascent + win_descent
+            if not height:
+                hhea = self._load_table('hhea')
+                ascender, descender = struct.unpack_from('>hh', hhea, 4)
+                height = ascender - descender
+            self._height = height or self.units_per_em
+        return self._height
+
+    @property
+    def cmap(self) -> Dict[int, int]:
+        if self._cmap is None:
+            self._cmap = self._parse_cmap(self._load_table('cmap'))
+        return self._cmap
+
+    @staticmethod
+    def _parse_cmap(data: bytes) -> Dict[int, int]:
+        num_tables = struct.unpack_from('>H', data, 2)[0]
+        subtables = {}
+        for i in range(num_tables):
+            platform, encoding, offset = struct.unpack_from('>HHI', data, 4 + 8 * i)
+            fmt = struct.unpack_from('>H', data, offset)[0]
+            subtables.setdefault((platform, encoding, fmt), offset)
+
+        # Preferir Unicode completo (formato 12) sobre BMP (formato 4)
+        for key in ((3, 10, 12), (0, 4, 12), (0, 6, 12), (3, 1, 4), (0, 3, 4), (0, 1, 4), (0, 0, 4)):
+            if key in subtables:
+                offset = subtables[key]
+                if key[2] == 12:
+                    return FontFile._parse_cmap12(data, offset)
+                return FontFile._parse_cmap4(data, offset)
+        return {}
+
+    @staticmethod
+    def _parse_cmap4(data: bytes, offset: int) -> Dict[int, int]:
+        seg_count = struct.unpack_from('>H', data, offset + 6)[0] // 2
+        ends_at = offset + 14
+        starts_at = ends_at + 2 * seg_count + 2
+        deltas_at = starts_at + 2 * seg_count
+        ranges_at = deltas_at + 2 * seg_count
+
+        ends = struct.unpack_from(f'>{seg_count}H', data, ends_at)
+        starts = struct.unpack_from(f'>{seg_count}H', data, starts_at)
+        deltas = struct.unpack_from(f'>{seg_count}h', data, deltas_at)
+        ranges = struct.unpack_from(f'>{seg_count}H', data, ranges_at)
+
+        cmap = {}
+        for seg in range(seg_count):
+            start, end, delta, range_offset = starts[seg], ends[seg], deltas[seg], ranges[seg]
+            if start == 0xFFFF:
+                continue
+            for code in range(start, end + 1):
+                if range_offset == 0:
+                    glyph = (code + delta) & 0xFFFF
+                else:
+                    glyph_at = ranges_at + 2 * seg + range_offset + 2 * (code - start)
+                    glyph = struct.unpack_from('>H', data, glyph_at)[0]
+                    if glyph:
+                        glyph = (glyph + delta) & 0xFFFF
+                if glyph:
+                    cmap[code] = glyph
+        return cmap
+
+    @staticmethod
+    def _parse_cmap12(data: bytes, offset: int) -> Dict[int, int]:
+        num_groups = struct.unpack_from('>I', data, offset + 12)[0]
+        cmap = {}
+        for i in range(num_groups):
+            start, end, glyph = struct.unpack_from('>III', data, offset + 16 + 12 * i)
+            for code in range(start, end + 1):
+                cmap[code] = glyph + code - start
+        return cmap
+
+    @property
+    def advances(self) -> List[int]:
+        if self._advances is None:
+            hhea = self._load_table('hhea')
+            num_metrics = struct.unpack_from('>H', hhea, 34)[0]
+            hmtx = self._load_table('hmtx')
+            # Cada registro es (advanceWidth, lsb); solo interesa el avance
+            self._advances = list(struct.unpack_from(f'>{num_metrics * 2}H', hmtx)[::2])
+        return self._advances
+
+    def glyph_advance(self, glyph: int) -> int:
+        advances = self.advances
+        if glyph < len(advances):
+            return advances[glyph]
+        return advances[-1] if advances else 0
+
+    @property
+    def kerning(self) -> Dict[Tuple[int, int], int]:
+        """Pares de kerning horizontal de la tabla 'kern' (formato 0)"""
+        if self._kerning is None:
+            self._kerning = self._parse_kern(self._load_table('kern'))
+        return self._kerning
+
+    @staticmethod
+    def _parse_kern(data: bytes) -> Dict[Tuple[int, int], int]:
+        pairs = {}
+        if len(data) < 4:
+            return pairs
+
+        version, num_tables = struct.unpack_from('>HH', data, 0)
+        if version != 0:
+            # Tabla 'kern' de Apple (versión 1): no soportada
+            return pairs
+
+        offset = 4
+        for _ in range(num_tables):
+            _, length, coverage = struct.unpack_from('>HHH', data, offset)
+            fmt = coverage >> 8
+            horizontal = coverage & 0x1
+            minimum_or_cross = coverage & 0x6
+            if fmt == 0 and horizontal and not minimum_or_cross:
+                num_pairs = struct.unpack_from('>H', data, offset + 6)[0]
+                for i in range(num_pairs):
+                    left, right, value = struct.unpack_from('>HHh', data, offset + 14 + 6 * i)
+                    pairs[(left, right)] = value
+            offset += length
+        return pairs
+
+
+class FontIndex:
+    """Índice familia -> archivo de fuente, guardado en disco por mtime"""
+
+    def __init__(self, cache_file: str, font_dirs: List[str] = None):
+        self.cache_file = cache_file
+        self.font_dirs = [os.path.expanduser(d) for d in (font_dirs or FONT_DIRS)]
+        # ruta -> [mtime, [[offset, familias, bold, italic], ...]]
+        self._files: Dict[str, list] = {}
+        self._by_family: Optional[Dict[str, List[Tuple[str, int, bool, bool]]]] = None
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                self._files = json.load(f)
+        except (OSError, ValueError):
+            self._files = {}
+        self._update()
+
+    def refresh(self) -> bool:
+        """Volver a recorrer los directorios de fuentes; True si algo cambió
+
+        Para procesos de larga vida (el servidor): los archivos ya indexados
+        solo se vuelven a leer si cambió su mtime.
+        """
+        if self._by_family is None:
+            self._load()
+            return False
+        return self._update()
+
+    def _update(self) -> bool:
+        changed = False
+        seen = set()
+        for font_dir in self.font_dirs:
+            for root, _, files in os.walk(font_dir):
+                for name in files:
+                    if not name.lower().endswith(FONT_EXTENSIONS):
+                        continue
+                    path = os.path.join(root, name)
+                    seen.add(path)
+                    try:
+                        mtime = os.path.getmtime(path)
+                    except OSError:
+                        continue
+                    cached = self._files.get(path)
+                    if cached and cached[0] == mtime:
+                        continue
+                    self._files[path] = [mtime, self._scan(path)]
+                    changed = True
+
+        for path in list(self._files):
+            if path not in seen:
+                del self._files[path]
+                changed = True
+
+        if changed:
+            _write_json(self.cache_file, self._files)
+
+        if changed or self._by_family is None:
+            self._by_family = {}
+            for path, (_, faces) in self._files.items():
+                for offset, families, bold, italic in faces:
+                    for family in families:
+                        self._by_family.setdefault(family.lower(), []).append((path, offset, bold, italic))
+        return changed
+
+    @staticmethod
+    def _scan(path: str) -> list:
+        faces = []
+        try:
+            for offset in FontFile.collection_offsets(path):
+                font = FontFile(path, offset)
+                faces.append([offset, font.families, font.bold, font.italic])
+        except (OSError, struct.error, KeyError, ValueError):
+            pass
+        return faces
+
+    def find(self, family: str, bold: bool = False, italic: bool = False) -> Optional[Tuple[str, int]]:
+        """(ruta, offset) de la cara que mejor coincide con la familia pedida"""
+        if self._by_family is None:
+            self._load()
+        faces = self._by_family.get(family.lower())
+        if not faces:
+            return None
+        best = min(faces, key=lambda face: (face[2] != bold) + (face[3] != italic))
+        return best[0], best[1]
+
+
+class TextMeasurer:
+    """Mide texto con una fuente, tamaño, ScaleX y Spacing fijos"""
+
+    def __init__(self, face: 'CachedFace', size: float, scale_x: float = 100, spacing: float = 0):
+        self.face = face
+        self.spacing = spacing
+        self.scale = size / face.height * scale_x / 100
+        # caracter -> ancho en píxeles (incluye spacing)
+        self._widths: Dict[str, float] = {}
+
+    def char_width(self, char: str) -> Optional[float]:
+        """Ancho del caracter, o None si la fuente no tiene ese glifo"""
+        width = self._widths.get(char)
+        if width is None:
+            glyph = self.face.glyph(char)
+            if glyph is None:
+                return None
+            width = self._widths[char] = glyph[1] * self.scale + self.spacing
+        return width
+
+    def kerning(self, left: str, right: str) -> float:
+        kern = self.face.kerning(left, right)
+        return kern * self.scale if kern else 0.0
+    
+    def text_width(self, text: str, fallback: Callable[[str], float]) -> float:
+        """Ancho del texto con kerning; `fallback` mide los caracteres sin glifo"""
+        total = 0.0
+        previous = None
+        for char in text:
+            width = self.char_width(char)
+            if width is None:
+                # Sin glifo no hay kerning ni con el anterior ni con el siguiente
+                total += fallback(char)
+                previous = None
+                continue
+            if previous is not None:
+                total += self.kerning(previous, char)
+            total += width
+            previous = char
+        return total
+
+
+class CachedFace:
+    """Glifos de una fuente ya consultados; el archivo solo se abre si falta alguno"""
+
+    def __init__(self, path: str, offset: int, data: dict):
+        self.path = path
+        self.offset = offset
+        self._font: Optional[FontFile] = None
+        self.mtime = data.get('mtime')
+        self.height = data.get('height') or self.font.height
+        # caracter -> [glifo, avance en unidades] ([0, 0] si no existe)
+        self.glyphs: Dict[str, List[int]] = data.get('glyphs', {})
+        # par de caracteres -> kerning en unidades
+        self.kern_pairs: Dict[str, int] = data.get('kern', {})
+        self.dirty = 'height' not in data
+
+    @property
+    def font(self) -> FontFile:
+        if self._font is None:
+            self._font = FontFile(self.path, self.offset)
+        return self._font
+
+    def glyph(self, char: str) -> Optional[List[int]]:
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            gid = self.font.cmap.get(ord(char), 0)
+            glyph = self.glyphs[char] = [gid, self.font.glyph_advance(gid) if gid else 0]
+            self.dirty = True
+        return glyph if glyph[0] else None
+
+    def kerning(self, left: str, right: str) -> int:
+        pair = left + right
+        kern = self.kern_pairs.get(pair)
+        if kern is None:
+            left_glyph = self.glyphs.get(left)
+            right_glyph = self.glyphs.get(right)
+            kern = 0
+            if left_glyph and right_glyph:
+                kern = self.font.kerning.get((left_glyph[0], right_glyph[0]), 0)
+            self.kern_pairs[pair] = kern
+            self.dirty = True
+        return kern
+
+    def to_dict(self) -> dict:
+        return {'mtime': self.mtime, 'height': self.height, 'glyphs': self.glyphs,
+                'kern': self.kern_pairs}
+
+
+class FontMetrics:
+    """Punto de entrada: busca fuentes por nombre y crea medidores cacheados"""
+
+    def __init__(self, cache_dir: str = METRICS_CACHE_DIR, font_dirs: List[str] = None):
+        self.cache_dir = cache_dir
+        self.index = FontIndex(os.path.join(cache_dir, 'index.json'), font_dirs)
+        self._faces: Dict[Tuple[str, int], CachedFace] = {}
+        self._measurers: Dict[tuple, Optional[TextMeasurer]] = {}
+
+    def _face_cache_file(self, path: str, offset: int) -> str:
+        digest = hashlib.sha1(path.encode('utf-8', 'surrogatepass')).hexdigest()[:8]
+        name = f"{os.path.basename(path)}-{offset}-{digest}.json"
+        return os.path.join(self.cache_dir, name)
+
+    def _face(self, path: str, offset: int) -> CachedFace:
+        key = (path, offset)
+        face = self._faces.get(key)
+        if face is None:
+            mtime = os.path.getmtime(path)
+            try:
+                with open(self._face_cache_file(path, offset), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('mtime') != mtime:
+                    data = {}
+            except (OSError, ValueError):
+                data = {}
+            data['mtime'] = mtime
+            face = self._faces[key] = CachedFace(path, offset, data)
+        return face
+
+    def measurer(self, family: str, size: float, scale_x: float = 100, spacing: float = 0,
+                 bold: bool = False, italic: bool = False) -> Optional[TextMeasurer]:
+        """Medidor para la fuente pedida, o None si no está instalada"""
+        key = (family, size, scale_x, spacing, bold, italic)
+        if key not in self._measurers:
+            measurer = None
+            found = self.index.find(family, bold, italic) if family else None
+            if found:
+                try:
+                    measurer = TextMeasurer(self._face(*found), size, scale_x, spacing)
+                except (OSError, struct.error, KeyError, ValueError, ZeroDivisionError):
+                    measurer = None
+            self._measurers[key] = measurer
+        return self._measurers[key]
+
+    def refresh(self) -> bool:
+        """Tomar fuentes instaladas, cambiadas o borradas; True si algo cambió
+
+        Con cambios se descartan los medidores y caras ya creados: quien los
+        guarde (anchos por estilo, generadores) tiene que volver a pedirlos.
+        """
+        if not self.index.refresh():
+            return False
+        self.save()
+        self._faces.clear()
+        self._measurers.clear()
+        return True
+
+    def save(self) -> None:
+        """Guardar en disco los glifos consultados en esta ejecución"""
+        for (path, offset), face in self._faces.items():
+            if face.dirty:
+                _write_json(self._face_cache_file(path, offset), face.to_dict())
+                face.dirty = False
+
+
+def _write_json(path: str, data) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+_default_metrics: Optional[FontMetrics] = None
+
+
+def default_metrics() -> FontMetrics:
+    """Instancia compartida; los glifos nuevos se guardan al terminar el proceso"""
+    global _default_metrics
+    if _default_metrics is None:
+        _default_metrics = FontMetrics()
+        atexit.register(_default_metrics.save)
+    return _default_metrics
+
+
+def refresh_default_metrics() -> bool:
+    """FontMetrics.refresh de la instancia compartida (False si no se creó)"""
+    return _default_metrics is not None and _default_metrics.refresh()
+
+
+def save_default_metrics() -> None:
+    """Guardar ya los glifos nuevos de la instancia compartida
+
+    Los procesos de un ProcessPoolExecutor terminan sin ejecutar atexit: cada
+    lote llama a esta función al terminar.
+    """
+    if _default_metrics is not None:
+        _default_metrics.save()
+
+
+def style_measurer(style: Optional[StyleRecord], metrics: Optional[FontMetrics] = None) -> Optional[TextMeasurer]:
+    """Medidor para un estilo ASS (Fontname, Fontsize, ScaleX, Spacing, Bold, Italic)"""
+    if not style or not style.fontname:
+        return None
+    fontname = style.fontname.lstrip('@')
+    return (metrics or default_metrics()).measurer(
+        fontname, style.fontsize, style.scale_x, style.spacing, style.bold, style.italic)
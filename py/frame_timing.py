@@ -0,0 +1,99 @@
+"""
+Tiempos alineados a cuadros de video
+Con el FPS del video (de [Aegisub Project Garbage] o indicado a mano) los
+tiempos de las líneas generadas se ajustan al cuadro más cercano y las
+duraciones de \\t, \\move y \\fad a un número entero de cuadros. Un evento
+que empieza y termina en el mismo cuadro nunca se ve: los generadores lo
+descartan en lugar de escribirlo.
+
+El tiempo de cada cuadro se guarda truncado a centésimas (lo que admite el
+formato ASS); con más de 10 ms por cuadro sigue cayendo dentro del cuadro
+correcto, igual que al ajustar tiempos en Aegisub.
+"""
+
+from array import array
+from functools import lru_cache
+from typing import Optional
+
+from ass_time import format_time
+
+
+# Cuadros que se agregan a la tabla cada vez que se queda corta
+_TABLE_CHUNK = 4096
+
+
+class FrameTiming:
+    """Conversión ms <-> cuadro para un FPS constante"""
+
+    __slots__ = ('fps', '_times')
+
+    def __init__(self, fps: float):
+        if fps <= 0:
+            raise ValueError(f"FPS inválido: {fps}")
+        self.fps = fps
+        # cuadro -> inicio en ms (truncado a centésimas), se extiende a pedido
+        self._times = array('q')
+
+    def frame(self, ms: float) -> int:
+        """Cuadro más cercano a un tiempo"""
+        return max(0, int(ms * self.fps / 1000 + 0.5))
+
+    def frames(self, duration_ms: float) -> int:
+        """Cuadros enteros más cercanos a una duración"""
+        return max(0, int(duration_ms * self.fps / 1000 + 0.5))
+
+    def time(self, frame: int) -> int:
+        """Inicio del cuadro en ms, como se escribe en el ASS"""
+        times = self._times
+        if frame >= len(times):
+            fps = self.fps
+            last = max(frame + 1, len(times) + _TABLE_CHUNK)
+            times.extend(int(n * 1000 / fps) // 10 * 10 for n in range(len(times), last))
+        return times[frame]
+
+    def format_frame(self, frame: int) -> str:
+        return format_time(self.time(frame))
+
+    def snap(self, ms: float) -> int:
+        return self.time(self.frame(ms))
+
+    def snap_duration(self, duration_ms: float) -> int:
+        """Duración redondeada a cuadros enteros (para offsets de \\t, \\move y \\fad)"""
+        return int(self.frames(duration_ms) * 1000 / self.fps + 0.5)
+
+
+@lru_cache(maxsize=16)
+def frame_timing(fps: float) -> FrameTiming:
+    """FrameTiming compartido por FPS (la tabla se arma una sola vez)"""
+    return FrameTiming(fps)
+
+
+def parse_video_fps(video_file: str) -> Optional[float]:
+    """FPS de un video dummy de Aegisub (?dummy:23.976000:10000:...)
+
+    Para un video real el FPS no está en el script: hay que indicarlo.
+    """
+    if not video_file.startswith('?dummy:'):
+        return None
+    try:
+        fps = float(video_file.split(':')[1])
+    except (IndexError, ValueError):
+        return None
+    return fps if fps > 0 else None
+
+
+def document_fps(document) -> Optional[float]:
+    """FPS del video del proyecto según [Aegisub Project Garbage]"""
+    garbage = document.sections.get('[aegisub project garbage]', {})
+    return parse_video_fps(garbage.get('Video File', ''))
+
+
+def resolve_fps(value, document=None) -> Optional[float]:
+    """FPS de la opción FPS: vacío = sin ajuste, 'auto' = el del proyecto, o un número"""
+    value = str(value or '').strip()
+    if not value or value == '0':
+        return None
+    if value.lower() == 'auto':
+        return document_fps(document) if document is not None else None
+    fps = float(value)
+    return fps if fps > 0 else None
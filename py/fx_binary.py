@@ -0,0 +1,86 @@
+"""
+Formato binario de intercambio de líneas fx (Python -> macro Lua)
+La macro lee cada registro con string.byte y string.sub, sin pattern
+matching sobre la línea: los tiempos van como enteros en ms y los campos ya
+separados. Es opcional (process_effect.py --format binary, "format":
+"binary" en el servidor); el texto Dialogue: sigue siendo el formato por
+defecto.
+
+Archivo: MAGIC y luego registros, todos little-endian:
+
+    u32 tamaño del resto del registro
+    u32 inicio (ms)   u32 fin (ms)
+    u16 layer   u16 margin_l   u16 margin_r   u16 margin_v
+    u16 largo + bytes UTF-8: style, actor, effect
+    u32 largo + bytes UTF-8: text
+
+El tamaño permite saltar registros con campos agregados en versiones nuevas.
+"""
+
+import struct
+from typing import BinaryIO, Iterable, Iterator, List
+
+from ass_document import EventRecord
+from ass_time import format_time
+
+
+MAGIC = b"PYFXBIN1\n"
+
+_HEAD = struct.Struct('<IIHHHH')
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+
+
+def encode_event(event: EventRecord) -> bytes:
+    style = event.style.encode('utf-8')
+    actor = event.name.encode('utf-8')
+    effect = event.effect.encode('utf-8')
+    text = event.text.encode('utf-8')
+    body = b''.join((
+        _HEAD.pack(max(0, event.start_ms), max(0, event.end_ms), event.layer,
+                   event.margin_l, event.margin_r, event.margin_v),
+        _U16.pack(len(style)), style,
+        _U16.pack(len(actor)), actor,
+        _U16.pack(len(effect)), effect,
+        _U32.pack(len(text)), text,
+    ))
+    return _U32.pack(len(body)) + body
+
+
+def write_records(f: BinaryIO, events: Iterable[EventRecord]) -> int:
+    """Escribir los eventos como registros; devuelve cuántos se escribieron"""
+    f.write(MAGIC)
+    count = 0
+    chunk: List[bytes] = []
+    for event in events:
+        chunk.append(encode_event(event))
+        count += 1
+        if len(chunk) >= 1024:
+            f.write(b''.join(chunk))
+            chunk = []
+    f.write(b''.join(chunk))
+    return count
+
+
+def read_records(data: bytes) -> Iterator[EventRecord]:
+    """Leer los registros de un archivo binario (el mismo recorrido que hace la macro)"""
+    if not data.startswith(MAGIC):
+        raise ValueError("No es un archivo de líneas fx binario")
+    pos = len(MAGIC)
+    end = len(data)
+    while pos + 4 <= end:
+        (size,) = _U32.unpack_from(data, pos)
+        pos += 4
+        next_pos = pos + size
+        start_ms, end_ms, layer, margin_l, margin_r, margin_v = _HEAD.unpack_from(data, pos)
+        pos += _HEAD.size
+        fields = []
+        for width in (_U16, _U16, _U16, _U32):
+            (length,) = width.unpack_from(data, pos)
+            pos += width.size
+            fields.append(data[pos:pos + length].decode('utf-8'))
+            pos += length
+        style, actor, effect, text = fields
+        yield EventRecord(False, layer, format_time(start_ms), format_time(end_ms), style, actor,
+                          margin_l, margin_r, margin_v, effect, text)
+        pos = next_pos
@@ -0,0 +1,117 @@
+"""
+Caché incremental de líneas fx
+Guarda en disco las líneas generadas por cada línea de diálogo, direccionadas
+por el hash de todo lo que influye en el resultado (texto, tiempos, métricas
+del estilo y configuración del efecto). Las entradas menos usadas se eliminan
+cuando se supera el máximo.
+"""
+
+import os
+import hashlib
+import tempfile
+from typing import List, Optional
+
+
+# Incrementar cuando cambie el formato de las líneas generadas
+CACHE_VERSION = "8"
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'py-effector-fx'
+)
+DEFAULT_MAX_ENTRIES = 20000
+
+# Cada cuántas escrituras se revisa el tamaño de la caché
+_EVICT_EVERY = 1024
+
+
+def hash_parts(*parts) -> str:
+    """Hash estable de una secuencia de valores"""
+    h = hashlib.sha1(CACHE_VERSION.encode())
+    for part in parts:
+        h.update(b'\x1f')
+        h.update(repr(part).encode('utf-8', 'surrogatepass'))
+    return h.hexdigest()
+
+
+def config_hash(config) -> str:
+    """Hash de una configuración (dict del archivo de config o EffectConfig)"""
+    if isinstance(config, dict):
+        return hash_parts(*sorted(config.items()))
+    return hash_parts(config)
+
+
+class FxCache:
+    """Caché en disco con expulsión LRU (por fecha de último acceso del archivo)"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            # Marcar como usada recientemente
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return content.split('\n') if content else []
+
+    def put(self, key: str, lines: List[str]) -> None:
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Escritura atómica: varios procesos pueden compartir la caché
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines))
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        self._writes += 1
+        if self._writes % _EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self) -> int:
+        """Eliminar las entradas menos usadas por encima de max_entries"""
+        entries = []
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass
+
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return 0
+
+        entries.sort()
+        removed = 0
+        for _, path in entries[:excess]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
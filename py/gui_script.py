@@ -2,37 +2,66 @@
 """
 Py Effector FX - Generador de efectos para Aegisub
 Punto de entrada principal de la aplicación
+
+La ventana aparece antes de leer el script: los nombres de estilo salen de
+una lectura sólo de la cabecera (sin [Events]) en un hilo aparte, cada página
+se construye la primera vez que se muestra y los módulos de efectos se
+importan recién al aplicar.
+
+    python3 gui_script.py script.ass --startup-time
 """
 
 import sys
+import time
+
+_IMPORT_TIME = time.perf_counter()
+
+import threading
 import tkinter as tk
 import subprocess
-from pages import MainPage, LeadInPage, LeadOutPage, ShapePage, TranslationPage
-from ass_parser import ASSParser
+from importlib import import_module
+
+
+# Nombre de la página -> módulo que la define (se importa al mostrarla)
+PAGE_MODULES = {
+    "MainPage": "pages.main_page",
+    "LeadInPage": "pages.lead_in_page",
+    "LeadOutPage": "pages.lead_out_page",
+    "ShapePage": "pages.shape_page",
+    "TranslationPage": "pages.translation_page",
+}
+
+# Cada cuánto se revisa si terminó la lectura de estilos (ms)
+_STYLE_POLL_MS = 20
 
 
 class EffectorApp:
     """Controlador principal de la aplicación"""
     
-    def __init__(self, ass_file: str = None):
+    def __init__(self, ass_file: str = None, ass_parser=None):
         self.root = tk.Tk()
         self.root.title("Py Effector FX")
         self.root.geometry("600x450")
         self.root.resizable(False, False)
         self.root.configure(bg="#1e1e2e")
         
-        # Parsear archivo ASS si se proporciona
-        self.ass_parser = None
+        self.ass_file = ass_file
+        self._ass_parser = ass_parser
         self.available_styles = ["Default"]
+        self.styles_loaded = threading.Event()
+        self._scanned_styles = None
         
-        if ass_file:
-            try:
-                self.ass_parser = ASSParser(ass_file)
-                styles = self.ass_parser.get_style_names()
-                if styles:
-                    self.available_styles = styles
-            except Exception as e:
-                print(f"Error parseando ASS: {e}")
+        if ass_parser:
+            styles = ass_parser.get_style_names()
+            if styles:
+                self.available_styles = styles
+            self.styles_loaded.set()
+        elif ass_file:
+            # Los estilos se leen fuera del hilo de la interfaz
+            threading.Thread(target=self._scan_styles, args=(ass_file,), daemon=True).start()
+            self.root.after(_STYLE_POLL_MS, self._poll_styles)
+        else:
+            self.styles_loaded.set()
         
         # Centrar ventana en la pantalla
         self.center_window()
@@ -43,9 +72,8 @@ class EffectorApp:
         self.container.grid_rowconfigure(0, weight=1)
         self.container.grid_columnconfigure(0, weight=1)
         
-        # Registro de páginas
+        # Páginas ya construidas (las demás se crean al mostrarlas)
         self.pages = {}
-        self._register_pages()
         
         # Mostrar página principal
         self.show_page("MainPage")
@@ -75,24 +103,48 @@ class EffectorApp:
         self.root.lift()
         self.root.focus_force()
     
-    def _register_pages(self):
-        """Registrar todas las páginas de la aplicación"""
-        page_classes = [
-            MainPage,
-            LeadInPage,
-            LeadOutPage,
-            ShapePage,
-            TranslationPage
-        ]
-        
-        for PageClass in page_classes:
+    @property
+    def ass_parser(self):
+        """ASSParser del script completo; se parsea recién cuando alguien lo pide"""
+        if self._ass_parser is None and self.ass_file:
+            from ass_parser import ASSParser
+            self._ass_parser = ASSParser(self.ass_file)
+        return self._ass_parser
+    
+    def _scan_styles(self, ass_file: str):
+        """Leer los nombres de estilo (corre en un hilo aparte)"""
+        try:
+            from ass_document import ASSDocument
+            self._scanned_styles = ASSDocument.load_header(ass_file).style_names()
+        except Exception as e:
+            print(f"Error parseando ASS: {e}")
+        finally:
+            self.styles_loaded.set()
+    
+    def _poll_styles(self):
+        """Pasar los estilos leídos a la interfaz (tkinter sólo desde su hilo)"""
+        if not self.styles_loaded.is_set():
+            self.root.after(_STYLE_POLL_MS, self._poll_styles)
+            return
+        if self._scanned_styles:
+            self.available_styles = self._scanned_styles
+            main_page = self.pages.get("MainPage")
+            if main_page is not None:
+                main_page.set_styles(self.available_styles)
+    
+    def get_page(self, page_name):
+        """Página por su nombre, construyéndola la primera vez"""
+        page = self.pages.get(page_name)
+        if page is None:
+            PageClass = getattr(import_module(PAGE_MODULES[page_name]), page_name)
             page = PageClass(self.container, self)
-            self.pages[PageClass.__name__] = page
+            self.pages[page_name] = page
             page.grid(row=0, column=0, sticky="nsew")
+        return page
     
     def show_page(self, page_name):
         """Mostrar una página por su nombre"""
-        page = self.pages[page_name]
+        page = self.get_page(page_name)
         page.tkraise()
     
     def run(self):
@@ -100,10 +152,31 @@ class EffectorApp:
         self.root.mainloop()
 
 
+def measure_startup(app: EffectorApp) -> None:
+    """Imprimir cuánto tardan la ventana y los estilos en estar listos, y cerrar"""
+    def report(label):
+        print(f"{label}: {(time.perf_counter() - _IMPORT_TIME) * 1000:.1f} ms", file=sys.stderr)
+    
+    def wait_styles():
+        if not app.styles_loaded.is_set():
+            app.root.after(5, wait_styles)
+            return
+        app.root.update()
+        report("estilos cargados")
+        app.root.destroy()
+    
+    app.root.update()
+    report("ventana visible")
+    wait_styles()
+
+
 def main():
     # Obtener archivo ASS de argumentos si existe
-    ass_file = sys.argv[1] if len(sys.argv) > 1 else None
+    args = [arg for arg in sys.argv[1:] if arg != '--startup-time']
+    ass_file = args[0] if args else None
     app = EffectorApp(ass_file)
+    if '--startup-time' in sys.argv:
+        measure_startup(app)
     app.run()
 
 
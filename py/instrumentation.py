@@ -0,0 +1,162 @@
+"""
+Instrumentación opcional del pipeline de efectos
+Tiempos por etapa (exclusivos: una etapa anidada no se cuenta en la que la
+contiene) y contadores (líneas parseadas, sílabas, caracteres de la capa 2,
+bytes escritos). Desactivada no mide nada: los puntos de medición solo
+consultan `instruments.enabled`.
+
+Se activa con `process_effect.py --profile` o con la variable PYFX_PROFILE
+(1 = resumen; cualquier otro valor = ruta donde guardar además un cProfile).
+Con --workers solo se mide el proceso principal.
+"""
+
+import os
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+
+
+PROFILE_ENV = 'PYFX_PROFILE'
+
+
+class _Stage:
+    """Context manager de una etapa medida"""
+
+    __slots__ = ('instruments', 'name')
+
+    def __init__(self, instruments: 'Instrumentation', name: str):
+        self.instruments = instruments
+        self.name = name
+
+    def __enter__(self):
+        self.instruments._push(self.name)
+
+    def __exit__(self, *exc):
+        self.instruments._pop()
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Instrumentation:
+    """Tiempos por etapa y contadores de una ejecución"""
+
+    def __init__(self):
+        self.enabled = False
+        self.counters: Dict[str, int] = {}
+        self.times: Dict[str, float] = {}
+        self._stack: List[str] = []
+        self._mark = 0.0
+        self._started = 0.0
+
+    def enable(self) -> None:
+        self.reset()
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        self.counters.clear()
+        self.times.clear()
+        self._stack.clear()
+        self._started = self._mark = time.perf_counter()
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def stage(self, name: str):
+        """`with instruments.stage('layout'):` (no mide nada si está desactivada)"""
+        return _Stage(self, name) if self.enabled else _NULL_STAGE
+
+    def timed_iter(self, name: str, iterable: Iterable) -> Iterable:
+        """Cargar a `name` el tiempo que tarda cada next() del iterable"""
+        if not self.enabled:
+            return iterable
+        return self._timed_iter(name, iterable)
+
+    def _timed_iter(self, name: str, iterable: Iterable) -> Iterator:
+        iterator = iter(iterable)
+        while True:
+            self._push(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._pop()
+            yield item
+
+    def _push(self, name: str) -> None:
+        now = time.perf_counter()
+        if self._stack:
+            parent = self._stack[-1]
+            self.times[parent] = self.times.get(parent, 0.0) + now - self._mark
+        self._stack.append(name)
+        self._mark = now
+
+    def _pop(self) -> None:
+        now = time.perf_counter()
+        name = self._stack.pop()
+        self.times[name] = self.times.get(name, 0.0) + now - self._mark
+        self._mark = now
+
+    def summary(self) -> str:
+        total = time.perf_counter() - self._started
+        lines = [f"Perfil: {total:.3f} s"]
+        measured = 0.0
+        for name, seconds in sorted(self.times.items(), key=lambda item: -item[1]):
+            measured += seconds
+            lines.append(f"  {name:<12} {seconds:9.3f} s  {seconds / total * 100 if total else 0:5.1f}%")
+        rest = max(0.0, total - measured)
+        lines.append(f"  {'(resto)':<12} {rest:9.3f} s  {rest / total * 100 if total else 0:5.1f}%")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"  {name:<20} {value:>12,}")
+        return '\n'.join(lines)
+
+
+# Instancia global que consultan los módulos del pipeline
+instruments = Instrumentation()
+
+
+class Profiler:
+    """Activa la instrumentación y, si se pide, un cProfile de toda la ejecución"""
+
+    def __init__(self, dump_path: Optional[str] = None):
+        self.dump_path = dump_path or None
+        self._profile = None
+
+    @classmethod
+    def from_env(cls) -> Optional['Profiler']:
+        value = os.environ.get(PROFILE_ENV, '')
+        if not value or value == '0':
+            return None
+        return cls(None if value == '1' else value)
+
+    def start(self) -> None:
+        instruments.enable()
+        if self.dump_path:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self, out: TextIO = sys.stderr) -> None:
+        if self._profile:
+            self._profile.disable()
+        print(instruments.summary(), file=out)
+        instruments.disable()
+        if self._profile:
+            import pstats
+            self._profile.dump_stats(self.dump_path)
+            print(f"cProfile guardado en {self.dump_path}", file=out)
+            pstats.Stats(self._profile, stream=out).sort_stats('cumulative').print_stats(15)
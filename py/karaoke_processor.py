@@ -3,12 +3,20 @@ Procesador de Karaoke para ASS
 Parsea timing {\k##} y calcula posiciones de sílabas/caracteres
 """
 
-import re
+from functools import partial
 from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass
 
+from ass_document import EventRecord, StyleRecord
+from ass_time import parse_time, format_time
+from font_metrics import FontMetrics, TextMeasurer, style_measurer
+from batch_layout import CharWidths, ScriptLayout, layout_lines
+from style_layout import LineAnchor, event_anchor, place_lines
+from override_tokens import tokenize
+from instrumentation import instruments
 
-@dataclass
+
+@dataclass(slots=True)
 class Syllable:
     """Representa una sílaba con su timing y posición"""
     text: str
@@ -21,7 +29,7 @@ class Syllable:
     char_index: int  # índice del primer caracter
 
 
-@dataclass 
+@dataclass(slots=True)
 class KaraokeLine:
     """Representa una línea de karaoke procesada"""
     layer: int
@@ -36,6 +44,8 @@ class KaraokeLine:
     text: str
     syllables: List[Syllable]
     duration: int  # duración total en ms
+    start_ms: int = 0  # start_time y end_time ya convertidos
+    end_ms: int = 0
 
 
 class KaraokeProcessor:
@@ -51,131 +61,171 @@ class KaraokeProcessor:
     NARROW_CHARS = set('iIlL1|!.,;:\'"')
     WIDE_CHARS = set('mMwWæœ')
     
-    def __init__(self, fontsize: int = 48, line_y: float = 29):
+    def __init__(self, fontsize: int = 48, line_y: Optional[float] = None,
+                 styles: Optional[Dict[str, StyleRecord]] = None, metrics: Optional[FontMetrics] = None,
+                 use_font_metrics: bool = True, play_res: Tuple[int, int] = (0, 0)):
         self.fontsize = fontsize
+        self.default_fontsize = fontsize
+        # Y fija para todas las líneas; None = la que da el Alignment del estilo
         self.line_y = line_y
-        self.margin_left = 10
+        # PlayResX/PlayResY del script: con (0, 0) las líneas van en la posición fija anterior
+        self.play_res = play_res
+        # Estilos del ASS por nombre; si la línea tiene estilo conocido se mide con su fuente
+        self.styles = styles or {}
+        self.metrics = metrics
+        self.use_font_metrics = use_font_metrics
+        self.measurer: Optional[TextMeasurer] = None
+        # Anchos memorizados del estilo actual y de cada estilo ya usado (el
+        # mismo objeto por estilo: es la clave de la caché de layout)
+        self._fallback_widths = self._default_widths()
+        self.char_widths = self._fallback_widths
+        self._style_widths: Dict[Tuple[str, ...], Tuple[int, Optional[TextMeasurer], CharWidths]] = {}
+    
+    def _default_widths(self) -> CharWidths:
+        return CharWidths(partial(self._heuristic_width, self.default_fontsize))
+    
+    def use_style(self, style: StyleRecord) -> None:
+        """Medir con el Fontname, Fontsize, ScaleX y Spacing del estilo"""
+        state = self._style_widths.get(style.key())
+        if state is None:
+            fontsize = int(style.fontsize)
+            measurer = style_measurer(style, self.metrics) if self.use_font_metrics else None
+            state = (fontsize, measurer, CharWidths(partial(self._heuristic_width, fontsize), measurer))
+            self._style_widths[style.key()] = state
+        self.fontsize, self.measurer, self.char_widths = state
+    
+    def select_style(self, style_name: str) -> None:
+        """Usar el estilo de una línea; uno desconocido vuelve a la estimación por defecto"""
+        if style_name in self.styles:
+            self.use_style(self.styles[style_name])
+        elif self.styles:
+            self.fontsize = self.default_fontsize
+            self.measurer = None
+            self.char_widths = self._fallback_widths
     
     def parse_time(self, time_str: str) -> int:
         """Convertir tiempo ASS (0:00:00.00) a milisegundos"""
-        match = re.match(r'(\d+):(\d+):(\d+)\.(\d+)', time_str)
-        if match:
-            h, m, s, cs = map(int, match.groups())
-            return (h * 3600 + m * 60 + s) * 1000 + cs * 10
-        return 0
+        return parse_time(time_str)
     
     def format_time(self, ms: int) -> str:
         """Convertir milisegundos a formato ASS (0:00:00.00)"""
-        if ms < 0:
-            ms = 0
-        cs = (ms % 1000) // 10
-        s = (ms // 1000) % 60
-        m = (ms // 60000) % 60
-        h = ms // 3600000
-        return f"{h}:{m:02d}:{s:02d}.{cs:02d}"
+        return format_time(ms)
     
     def estimate_char_width(self, char: str) -> float:
         """Estimar ancho de un caracter"""
+        if self.measurer:
+            width = self.measurer.char_width(char)
+            if width is not None:
+                return width
+        return self._heuristic_char_width(char)
+    
+    def _heuristic_char_width(self, char: str) -> float:
+        return self._heuristic_width(self.fontsize, char)
+    
+    def _heuristic_width(self, fontsize: int, char: str) -> float:
         if char in self.NARROW_CHARS:
-            return self.fontsize * self.CHAR_WIDTHS['narrow']
+            return fontsize * self.CHAR_WIDTHS['narrow']
         elif char in self.WIDE_CHARS:
-            return self.fontsize * self.CHAR_WIDTHS['wide']
+            return fontsize * self.CHAR_WIDTHS['wide']
         elif char == ' ':
-            return self.fontsize * 0.3
+            return fontsize * 0.3
         else:
-            return self.fontsize * self.CHAR_WIDTHS['default']
+            return fontsize * self.CHAR_WIDTHS['default']
     
     def estimate_text_width(self, text: str) -> float:
         """Estimar ancho total de un texto"""
+        if self.measurer:
+            return self.measurer.text_width(text, self._heuristic_char_width)
         return sum(self.estimate_char_width(c) for c in text)
     
     def parse_dialogue_line(self, line: str) -> Optional[KaraokeLine]:
         """Parsear una línea de diálogo ASS"""
-        match = re.match(
-            r'Dialogue:\s*(\d+),([^,]+),([^,]+),([^,]*),([^,]*),(\d+),(\d+),(\d+),([^,]*),(.*)',
-            line
-        )
-        if not match:
+        event = EventRecord.from_line(line)
+        if event is None or event.comment:
             return None
-        
-        layer = int(match.group(1))
-        start = match.group(2)
-        end = match.group(3)
-        style = match.group(4)
-        name = match.group(5)
-        margin_l = int(match.group(6))
-        margin_r = int(match.group(7))
-        margin_v = int(match.group(8))
-        effect = match.group(9)
-        text = match.group(10)
-        
-        start_ms = self.parse_time(start)
-        end_ms = self.parse_time(end)
-        
-        syllables = self.extract_syllables(text, start_ms)
+        return self.parse_event(event)
+    
+    def parse_event(self, event: EventRecord) -> KaraokeLine:
+        """Construir la línea de karaoke de un evento ya parseado"""
+        self.select_style(event.style)
+        syllables = self.extract_syllables(event.text, event)
+        if instruments.enabled:
+            instruments.count('lines_parsed')
+            instruments.count('syllables', len(syllables))
         
         return KaraokeLine(
-            layer=layer,
-            start_time=start,
-            end_time=end,
-            style=style,
-            name=name,
-            margin_l=margin_l,
-            margin_r=margin_r,
-            margin_v=margin_v,
-            effect=effect,
-            text=text,
+            layer=event.layer,
+            start_time=event.start,
+            end_time=event.end,
+            style=event.style,
+            name=event.name,
+            margin_l=event.margin_l,
+            margin_r=event.margin_r,
+            margin_v=event.margin_v,
+            effect=event.effect,
+            text=event.text,
             syllables=syllables,
-            duration=end_ms - start_ms
+            duration=event.end_ms - event.start_ms,
+            start_ms=event.start_ms,
+            end_ms=event.end_ms
         )
     
-    def extract_syllables(self, text: str, line_start_ms: int) -> List[Syllable]:
-        """Extraer sílabas con timing de una línea"""
-        syllables = []
-        
-        # Patrón para encontrar {\k##} o {\K##} o {\kf##}
-        pattern = r'\{[^}]*\\[kK]f?(\d+)[^}]*\}([^{]*)'
-        
-        current_time = 0  # en ms
-        current_x = self.margin_left
-        char_index = 0
+    def extract_syllables(self, text: str, event: Optional[EventRecord] = None) -> List[Syllable]:
+        """Extraer sílabas con timing de una línea (ubicada según el estilo de `event`)"""
+        layout = layout_lines([text], [self.char_widths], 0, skip_blank=True)
+        return self.layout_syllables(layout, 0, self.place_lines(layout, [event])[0])
+    
+    def anchor(self, event: Optional[EventRecord]) -> LineAnchor:
+        """Dónde va la línea según el Alignment y los márgenes de su estilo"""
+        style = self.styles.get(event.style) if event is not None else None
+        return event_anchor(event, style, self.play_res)
+    
+    def place_lines(self, layout: ScriptLayout, events: List[Optional[EventRecord]]) -> List[float]:
+        """Llevar cada línea del layout a su lugar; devuelve la y de cada una"""
+        line_y = place_lines(layout, [self.anchor(event) for event in events])
+        if self.line_y is not None:
+            return [self.line_y] * len(events)
+        return line_y
+    
+    def layout_lines(self, events: List[EventRecord]) -> Tuple[ScriptLayout, List[float]]:
+        """Layout en lote de varias líneas, cada una con las métricas y la ubicación de su estilo
         
-        for i, match in enumerate(re.finditer(pattern, text)):
-            duration_cs = int(match.group(1))  # centésimas de segundo
-            syl_text = match.group(2)
-            
-            if not syl_text.strip():
-                continue
-            
-            duration_ms = duration_cs * 10
-            
-            syl_width = self.estimate_text_width(syl_text)
-            
-            syllable = Syllable(
-                text=syl_text,
-                duration=duration_cs,
-                start_time=current_time,
-                end_time=current_time + duration_ms,
-                x=current_x + syl_width / 2,  # centro de la sílaba
-                y=self.line_y,
-                index=i,
-                char_index=char_index
+        Devuelve el layout (x ya ubicadas) y la y de cada línea.
+        """
+        with instruments.stage('layout'):
+            widths = []
+            for event in events:
+                self.select_style(event.style)
+                widths.append(self.char_widths)
+            layout = layout_lines([event.text for event in events], widths, 0, skip_blank=True)
+            line_y = self.place_lines(layout, events)
+        if instruments.enabled:
+            instruments.count('lines_parsed', len(events))
+            instruments.count('syllables', len(layout.syl_text))
+        return layout, line_y
+    
+    def layout_syllables(self, layout: ScriptLayout, line: int, y: float) -> List[Syllable]:
+        """Sílabas de una línea del layout, a la altura `y`"""
+        return [
+            Syllable(
+                text=layout.syl_text[j],
+                duration=layout.syl_duration[j],
+                start_time=layout.syl_start[j],
+                end_time=layout.syl_end[j],
+                x=layout.syl_x[j],  # centro de la sílaba
+                y=y,
+                index=layout.syl_index[j],
+                char_index=layout.syl_char_index[j]
             )
-            
-            syllables.append(syllable)
-            
-            current_time += duration_ms
-            current_x += syl_width
-            char_index += len(syl_text)
-        
-        return syllables
+            for j in layout.syllable_range(line)
+        ]
     
     def get_clean_text(self, text: str) -> str:
         """Obtener texto sin tags"""
-        return re.sub(r'\{[^}]*\}', '', text)
+        return ''.join(token for token in tokenize(text) if token.__class__ is str)
 
 
-def process_karaoke_line(line: str, fontsize: int = 48, line_y: float = 29) -> Optional[KaraokeLine]:
+def process_karaoke_line(line: str, fontsize: int = 48, line_y: Optional[float] = None) -> Optional[KaraokeLine]:
     """Función helper para procesar una línea"""
     processor = KaraokeProcessor(fontsize, line_y)
     return processor.parse_dialogue_line(line)
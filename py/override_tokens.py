@@ -0,0 +1,260 @@
+"""
+Tokenizador de texto ASS en una pasada
+Separa el texto de una línea en bloques de override (con sus tags ya
+parseados) y tramos de texto, y arma las sílabas de karaoke a partir de esa
+misma secuencia: cada \\k, \\K, \\kf o \\ko abre una sílaba, aunque haya
+varios en un bloque, y el texto y los tags que siguen (hasta el próximo
+\\k) le pertenecen.
+
+tokenize() y karaoke_segments() se memorizan por texto: en un karaoke las
+mismas líneas se procesan varias veces (un estilo por capa, re-generaciones)
+y el resultado es inmutable. Los Tag de la caché son compartidos: quien
+necesite modificarlos (tag_optimizer) usa tokenize_block directamente.
+"""
+
+from functools import lru_cache
+from typing import List, Optional, Tuple, Union
+
+
+# Nombres de tags conocidos, de más largo a más corto para reconocer el prefijo correcto
+TAG_NAMES = sorted((
+    'xbord', 'ybord', 'xshad', 'yshad', 'alpha', 'iclip', 'blur', 'bord', 'shad', 'fscx',
+    'fscy', 'fade', 'move', 'clip', 'pos', 'org', 'fad', 'fsp', 'frx', 'fry', 'frz', 'fax',
+    'fay', 'pbo', '1c', '2c', '3c', '4c', '1a', '2a', '3a', '4a', 'an', 'be', 'fs', 'fn',
+    'fe', 'fr', 'kf', 'ko', 'a', 'b', 'c', 'i', 'k', 'K', 'p', 'q', 'r', 's', 't', 'u',
+), key=len, reverse=True)
+
+# Tags que marcan el comienzo de una sílaba
+KARAOKE_TAGS = frozenset(('k', 'K', 'kf', 'ko'))
+
+# Textos distintos que se recuerdan (tokens y sílabas por separado)
+TOKEN_CACHE_SIZE = 4096
+# Bloques distintos ({\k20}, {\k21}, ...): se repiten mucho entre líneas
+BLOCK_CACHE_SIZE = 16384
+
+
+class Tag:
+    """Un tag de override: \\name + valor, o \\name(args)"""
+
+    __slots__ = ('name', 'value', 'args', 'body')
+
+    def __init__(self, name: str, value: str = '', args: Optional[str] = None):
+        self.name = name
+        self.value = value
+        self.args = args
+        # Tags animados de un \t
+        self.body: Optional[List['Tag']] = None
+
+    def __str__(self) -> str:
+        if self.args is not None:
+            return f"\\{self.name}({self.args})"
+        return f"\\{self.name}{self.value}"
+
+
+_NAME_SET = frozenset(TAG_NAMES)
+_NAME_LENGTHS = sorted({len(name) for name in TAG_NAMES}, reverse=True)
+
+
+def _match_name(block: str, pos: int) -> str:
+    for length in _NAME_LENGTHS:
+        name = block[pos:pos + length]
+        if name in _NAME_SET:
+            return name
+    end = pos
+    while end < len(block) and block[end].isalpha():
+        end += 1
+    return block[pos:end]
+
+
+def tokenize_block(block: str) -> Optional[List[Tag]]:
+    """Tags de un bloque (sin llaves); None si tiene texto que no es un tag"""
+    tags = []
+    i = 0
+    n = len(block)
+    while i < n:
+        if block[i] in ' \t':
+            i += 1
+            continue
+        if block[i] != '\\':
+            return None
+        name = _match_name(block, i + 1)
+        j = i + 1 + len(name)
+        if j < n and block[j] == '(':
+            depth = 0
+            k = j
+            while k < n:
+                if block[k] == '(':
+                    depth += 1
+                elif block[k] == ')':
+                    depth -= 1
+                    if depth == 0:
+                        break
+                k += 1
+            tag = Tag(name, args=block[j + 1:k])
+            if name == 't':
+                tag.body = _transform_body(tag.args)
+            tags.append(tag)
+            i = k + 1
+        else:
+            k = block.find('\\', j)
+            if k == -1:
+                k = n
+            tags.append(Tag(name, block[j:k].strip()))
+            i = k
+    return tags
+
+
+def _transform_body(args: str) -> Optional[List[Tag]]:
+    start = args.find('\\')
+    return tokenize_block(args[start:]) if start != -1 else None
+
+
+class OverrideBlock:
+    """Bloque {...}: el contenido tal cual y sus tags (None si es un comentario)
+
+    `karaoke` resume el bloque para karaoke_segments: tags anteriores al
+    primer \\k (texto listo para escribir) y, por cada \\k, (tag, duración,
+    tags que le siguen hasta el próximo \\k).
+    """
+
+    __slots__ = ('raw', 'tags', 'karaoke')
+
+    def __init__(self, raw: str, tags: Optional[List[Tag]]):
+        self.raw = raw
+        self.tags = tags
+        self.karaoke = _karaoke_plan(tags) if tags else ('', ())
+
+    def __str__(self) -> str:
+        return '{' + self.raw + '}'
+
+    def __repr__(self):
+        return f"OverrideBlock({self.raw!r})"
+
+
+def _duration(value: str) -> int:
+    end = 0
+    while end < len(value) and value[end].isdigit():
+        end += 1
+    return int(value[:end]) if end else 0
+
+
+def _markup(tags: List[str]) -> str:
+    return '{' + ''.join(tags) + '}' if tags else ''
+
+
+def _karaoke_plan(tags: List[Tag]) -> Tuple[str, Tuple[Tuple[str, int, str], ...]]:
+    prefix = ''
+    starts = []
+    pending: List[str] = []
+    for tag in tags:
+        if tag.name in KARAOKE_TAGS:
+            if starts:
+                starts[-1][2] = _markup(pending)
+            else:
+                prefix = _markup(pending)
+            starts.append([tag.name, _duration(tag.value), ''])
+            pending = []
+        elif tag.name:
+            # Los marcadores sin nombre (\-fx de los templates) no se copian
+            pending.append(str(tag))
+    if starts:
+        starts[-1][2] = _markup(pending)
+    else:
+        prefix = _markup(pending)
+    return prefix, tuple(tuple(start) for start in starts)
+
+
+Token = Union[str, OverrideBlock]
+
+
+@lru_cache(maxsize=BLOCK_CACHE_SIZE)
+def _override_block(raw: str) -> OverrideBlock:
+    tags = tokenize_block(raw)
+    return OverrideBlock(raw, tags)
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def tokenize(text: str) -> Tuple[Token, ...]:
+    """Tramos de texto (str) y bloques de override, en orden
+
+    Un '{' sin cerrar es texto, como en el render.
+    """
+    pieces = text.split('{')
+    tokens: List[Token] = [pieces[0]] if pieces[0] else []
+    # Un bloque sigue abierto hasta la primera '}', aunque aparezca otra '{'
+    open_block = None
+    for piece in pieces[1:]:
+        if open_block is not None:
+            piece = open_block + '{' + piece
+        raw, sep, after = piece.partition('}')
+        if not sep:
+            open_block = piece
+            continue
+        open_block = None
+        tokens.append(_override_block(raw))
+        if after:
+            tokens.append(after)
+    if open_block is not None:
+        if tokens and tokens[-1].__class__ is str:
+            tokens[-1] += '{' + open_block
+        else:
+            tokens.append('{' + open_block)
+    return tuple(tokens)
+
+
+class KaraokeSegment:
+    """Una sílaba: tag que la abre, duración, texto y texto con sus tags internos
+
+    `markup` es el texto de la sílaba con los bloques de override que tenía
+    dentro (o justo después del \\k), listo para escribir; `text` es solo lo
+    que se ve, para medir. `index` cuenta los \\k de la línea.
+    """
+
+    __slots__ = ('kind', 'duration', 'text', 'markup', 'index')
+
+    def __init__(self, kind: str, duration: int, text: str, markup: str, index: int):
+        self.kind = kind
+        self.duration = duration      # centésimas de segundo
+        self.text = text
+        self.markup = markup
+        self.index = index
+
+    def __repr__(self):
+        return f"KaraokeSegment({self.kind}{self.duration}, {self.markup!r})"
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def karaoke_segments(text: str) -> Tuple[KaraokeSegment, ...]:
+    """Sílabas de karaoke de una línea (el texto antes del primer \\k no es sílaba)
+
+    Los tags de un bloque anteriores a su \\k quedan en la sílaba anterior;
+    los que siguen al \\k, en la nueva.
+    """
+    segments: List[KaraokeSegment] = []
+    kind = None           # tag y duración de la sílaba abierta
+    duration = 0
+    plain = markup = ''
+
+    for token in tokenize(text):
+        if token.__class__ is str:
+            if kind is not None:
+                plain += token
+                markup += token
+            continue
+        prefix, starts = token.karaoke
+        if kind is None:
+            if not starts:
+                continue
+        elif prefix:
+            markup += prefix
+        for next_kind, next_duration, after in starts:
+            if kind is not None:
+                segments.append(KaraokeSegment(kind, duration, plain, markup, len(segments)))
+            kind = next_kind
+            duration = next_duration
+            plain = ''
+            markup = after
+
+    if kind is not None:
+        segments.append(KaraokeSegment(kind, duration, plain, markup, len(segments)))
+    return tuple(segments)
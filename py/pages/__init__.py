@@ -1,17 +1,25 @@
-"""Módulo de páginas - exporta todas las clases de página"""
+"""Módulo de páginas - exporta todas las clases de página
 
-from pages.base_page import BasePage
-from pages.main_page import MainPage
-from pages.lead_in_page import LeadInPage
-from pages.lead_out_page import LeadOutPage
-from pages.shape_page import ShapePage
-from pages.translation_page import TranslationPage
+Cada página se importa recién cuando se pide (``from pages import LeadInPage``),
+así abrir la ventana no carga los módulos de efectos.
+"""
 
-__all__ = [
-    'BasePage',
-    'MainPage',
-    'LeadInPage',
-    'LeadOutPage',
-    'ShapePage',
-    'TranslationPage'
-]
+from importlib import import_module
+
+_MODULES = {
+    'BasePage': 'pages.base_page',
+    'MainPage': 'pages.main_page',
+    'LeadInPage': 'pages.lead_in_page',
+    'LeadOutPage': 'pages.lead_out_page',
+    'ShapePage': 'pages.shape_page',
+    'TranslationPage': 'pages.translation_page',
+}
+
+__all__ = list(_MODULES)
+
+
+def __getattr__(name):
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module 'pages' has no attribute {name!r}")
+    return getattr(import_module(module), name)
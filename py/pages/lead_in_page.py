@@ -3,12 +3,18 @@
 import tkinter as tk
 from tkinter import ttk
 from pages.base_page import BasePage
-from effects import KaraokeEffects, MultiLayerEffectGenerator, EffectConfig, get_available_effects
 
 
 class LeadInPage(BasePage):
     """Configuración de efectos de entrada"""
     
+    # Texto del selector -> entry_mode de EffectConfig
+    ENTRY_MODES = {
+        "Por caracter": "char",
+        "Por grupo": "group",
+        "Por sílaba": "syllable",
+    }
+    
     def create_widgets(self):
         self.create_back_button()
         
@@ -27,6 +33,7 @@ class LeadInPage(BasePage):
             fg="#cdd6f4", bg="#1e1e2e").grid(row=0, column=0, sticky="w", padx=5, pady=5)
         
         self.effect_var = tk.StringVar(value="Multi-Layer")
+        from effects import get_available_effects
         effects = get_available_effects("lead_in")
         ttk.Combobox(main_frame, textvariable=self.effect_var,
             values=effects, state="readonly", font=("Segoe UI", 10), 
@@ -56,10 +63,34 @@ class LeadInPage(BasePage):
         tk.Entry(main_frame, textvariable=self.fadeout_var, font=("Segoe UI", 10),
             width=20, bg="#313244", fg="#cdd6f4", insertbackground="#cdd6f4").grid(row=3, column=1, padx=5, pady=5)
         
+        # Eventos de la capa 2: calidad (uno por caracter) vs cantidad de eventos
+        tk.Label(main_frame, text="Entrada capa 2:", font=("Segoe UI", 11),
+            fg="#cdd6f4", bg="#1e1e2e").grid(row=4, column=0, sticky="w", padx=5, pady=5)
+        
+        self.entry_mode_var = tk.StringVar(value="Por caracter")
+        ttk.Combobox(main_frame, textvariable=self.entry_mode_var,
+            values=list(self.ENTRY_MODES), state="readonly", font=("Segoe UI", 10),
+            width=18).grid(row=4, column=1, padx=5, pady=5)
+        
+        tk.Label(main_frame, text="Máx. grupos por sílaba:", font=("Segoe UI", 11),
+            fg="#cdd6f4", bg="#1e1e2e").grid(row=5, column=0, sticky="w", padx=5, pady=5)
+        
+        self.entry_max_events_var = tk.StringVar(value="3")
+        tk.Entry(main_frame, textvariable=self.entry_max_events_var, font=("Segoe UI", 10),
+            width=20, bg="#313244", fg="#cdd6f4", insertbackground="#cdd6f4").grid(row=5, column=1, padx=5, pady=5)
+        
+        # Semilla: misma semilla = misma salida al volver a generar (vacío = aleatorio)
+        tk.Label(main_frame, text="Semilla:", font=("Segoe UI", 11),
+            fg="#cdd6f4", bg="#1e1e2e").grid(row=6, column=0, sticky="w", padx=5, pady=5)
+        
+        self.seed_var = tk.StringVar(value="")
+        tk.Entry(main_frame, textvariable=self.seed_var, font=("Segoe UI", 10),
+            width=20, bg="#313244", fg="#cdd6f4", insertbackground="#cdd6f4").grid(row=6, column=1, padx=5, pady=5)
+        
         # Información
         info_text = """Capas generadas:
 • Layer 1 (Main): Texto final con posición y fade out
-• Layer 2 (Entry): Animación de entrada por caracter
+• Layer 2 (Entry): Animación de entrada por caracter, grupo o sílaba
 • Layer 3 (Highlight): Efecto de resaltado karaoke"""
         
         tk.Label(self, text=info_text, font=("Segoe UI", 9),
@@ -85,6 +116,8 @@ class LeadInPage(BasePage):
     
     def aplicar(self):
         """Aplicar efecto multi-capa"""
+        # Import diferido: effects carga karaoke_processor y las plantillas
+        from effects import EffectConfig
         try:
             entry_duration = int(self.entry_duration_var.get())
             highlight_duration = int(self.highlight_duration_var.get())
@@ -94,6 +127,16 @@ class LeadInPage(BasePage):
             highlight_duration = 300
             fadeout_duration = 300
         
+        entry_mode = self.ENTRY_MODES.get(self.entry_mode_var.get(), "char")
+        try:
+            entry_max_events = max(1, int(self.entry_max_events_var.get()))
+        except ValueError:
+            entry_max_events = 3
+        try:
+            seed = int(self.seed_var.get())
+        except ValueError:
+            seed = None
+        
         # Obtener colores del controller
         colors = getattr(self.controller, 'colors', {
             "primary": "#FFFFFF",
@@ -115,7 +158,10 @@ class LeadInPage(BasePage):
             entry_duration=entry_duration,
             highlight_duration=highlight_duration,
             fade_out_duration=fadeout_duration,
-            entry_type="random_rotate"
+            entry_type="random_rotate",
+            entry_mode=entry_mode,
+            entry_max_events=entry_max_events,
+            seed=seed
         )
         
         # Guardar configuración para Lua
@@ -131,6 +177,10 @@ class LeadInPage(BasePage):
             f.write(f"ENTRY_DURATION:{entry_duration}\n")
             f.write(f"HIGHLIGHT_DURATION:{highlight_duration}\n")
             f.write(f"FADEOUT_DURATION:{fadeout_duration}\n")
+            f.write(f"ENTRY_MODE:{entry_mode}\n")
+            f.write(f"ENTRY_MAX_EVENTS:{entry_max_events}\n")
+            if seed is not None:
+                f.write(f"SEED:{seed}\n")
             f.write(f"PRIMARY_COLOR:{colors.get('primary', '#FFFFFF')}\n")
             f.write(f"BORDER_COLOR:{colors.get('border', '#FC76F2')}\n")
             f.write(f"SHADOW_COLOR:{colors.get('shadow', '#000000')}\n")
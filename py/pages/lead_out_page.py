@@ -3,7 +3,6 @@
 import tkinter as tk
 from tkinter import ttk
 from pages.base_page import BasePage
-from effects import KaraokeEffects, get_available_effects
 
 
 class LeadOutPage(BasePage):
@@ -27,6 +26,7 @@ class LeadOutPage(BasePage):
             fg="#cdd6f4", bg="#1e1e2e").grid(row=0, column=0, sticky="w", padx=10, pady=8)
         
         self.effect_var = tk.StringVar(value="Fade Out")
+        from effects import get_available_effects
         effects = get_available_effects("lead_out")
         ttk.Combobox(options_frame, textvariable=self.effect_var,
             values=effects, state="readonly", font=("Segoe UI", 10), 
@@ -71,6 +71,7 @@ class LeadOutPage(BasePage):
         except:
             duration = 300
         
+        from effects import KaraokeEffects
         colors = getattr(self.controller, 'colors', None)
         effects = KaraokeEffects(colors=colors)
         tag = effects.generate_lead_out(self.effect_var.get(), duration)
@@ -89,6 +90,7 @@ class LeadOutPage(BasePage):
         except:
             duration = 300
         
+        from effects import KaraokeEffects
         colors = getattr(self.controller, 'colors', None)
         effects = KaraokeEffects(
             colors=colors,
@@ -137,6 +137,12 @@ class MainPage(BasePage):
             self.colors[key] = result[1]
             self.color_labels[key].configure(bg=result[1])
     
+    def set_styles(self, styles):
+        """Actualizar el combo de estilos (cuando termina la lectura del script)"""
+        self.estilo_combo.configure(values=styles)
+        if self.estilo_var.get() not in styles:
+            self.estilo_var.set(styles[0] if styles else "Default")
+    
     def navegar(self):
         """Navegar a la página seleccionada"""
         tipo_map = {
@@ -0,0 +1,132 @@
+"""
+Generación de efectos en paralelo
+Reparte las líneas de diálogo en lotes entre procesos y devuelve el
+resultado en el mismo orden que la entrada.
+
+Cada lote recibe su propia copia de la FxCache: los aciertos y fallos de
+cada lote vuelven con sus líneas y se suman a la caché del proceso principal.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from effects import EffectConfig, MultiLayerEffectGenerator
+from font_metrics import save_default_metrics
+from fx_cache import FxCache
+from process_effect import iter_generated_lines
+
+
+DEFAULT_CHUNK_SIZE = 64
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parallel_map_chunks(func: Callable, tasks: Iterable, workers: int,
+                        cache: Optional[FxCache] = None) -> Iterator[str]:
+    """Ejecutar `func` sobre cada tarea en un pool de procesos
+
+    Como mucho hay `2 * workers` lotes en vuelo, así la memoria no crece con
+    el tamaño del script; los resultados se aplanan en orden de entrada.
+    `func` devuelve (líneas, aciertos, fallos); los contadores se suman a `cache`.
+    """
+    def collect(future) -> List[str]:
+        lines, hits, misses = future.result()
+        if cache is not None:
+            cache.hits += hits
+            cache.misses += misses
+        return lines
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(func, task))
+            if len(pending) >= 2 * workers:
+                yield from collect(pending.popleft())
+        while pending:
+            yield from collect(pending.popleft())
+
+
+def _cache_counts(cache: Optional[FxCache]) -> Tuple[int, int]:
+    return (cache.hits, cache.misses) if cache is not None else (0, 0)
+
+
+def _chunk_result(lines: List[str], cache: Optional[FxCache],
+                  before: Tuple[int, int]) -> Tuple[List[str], int, int]:
+    """Líneas del lote con los aciertos y fallos de caché que generó"""
+    hits, misses = _cache_counts(cache)
+    return lines, hits - before[0], misses - before[1]
+
+
+def _simple_chunk(task: Tuple[dict, Dict, Optional[FxCache], List[str]]) -> Tuple[List[str], int, int]:
+    config, styles, cache, lines = task
+    before = _cache_counts(cache)
+    generated = list(iter_generated_lines(lines, config, styles, cache))
+    save_default_metrics()
+    return _chunk_result(generated, cache, before)
+
+
+def iter_generated_lines_parallel(dialogue_lines: Iterable[str], config: dict, styles: Dict,
+                                  workers: int = 0,
+                                  chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                  cache: Optional[FxCache] = None) -> Iterator[str]:
+    """Versión paralela de process_effect.iter_generated_lines
+
+    `styles` se copia en cada lote: en modo streaming se va llenando mientras
+    se lee el archivo, antes del primer diálogo.
+    """
+    workers = workers or default_workers()
+    tasks = ((config, dict(styles), cache, chunk) for chunk in _chunks(dialogue_lines, chunk_size))
+    return parallel_map_chunks(_simple_chunk, tasks, workers, cache)
+
+
+# Generadores por configuración, reutilizados entre lotes del mismo proceso
+_worker_generators: Dict[str, MultiLayerEffectGenerator] = {}
+
+
+def _multi_layer_chunk(task: Tuple[EffectConfig, Dict, str, Optional[int], Optional[FxCache], int, List[str]]
+                       ) -> Tuple[List[str], int, int]:
+    config, styles, style, seed, cache, start_index, lines = task
+    before = _cache_counts(cache)
+    key = repr(config)
+    generator = _worker_generators.get(key)
+    if generator is None:
+        generator = _worker_generators[key] = MultiLayerEffectGenerator(config)
+    generator.cache = cache
+    generator.processor.styles = styles
+    generated = list(generator.generate_lines(lines, style, seed, start_index))
+    save_default_metrics()
+    return _chunk_result(generated, cache, before)
+
+
+def generate_multi_layer_parallel(dialogue_lines: Iterable[str], config: EffectConfig,
+                                  style: str = '', seed: Optional[int] = None,
+                                  workers: int = 0,
+                                  chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                  cache: Optional[FxCache] = None,
+                                  styles: Optional[Dict] = None) -> Iterator[str]:
+    """Generar las 3 capas de cada línea repartiendo el trabajo entre procesos
+
+    Con `seed` el RNG se re-siembra por índice de línea, así la salida es
+    idéntica a MultiLayerEffectGenerator.generate_lines con la misma semilla,
+    sea cual sea el número de procesos.
+    """
+    workers = workers or default_workers()
+    tasks = (
+        (config, styles or {}, style, seed, cache, n * chunk_size, chunk)
+        for n, chunk in enumerate(_chunks(dialogue_lines, chunk_size))
+    )
+    return parallel_map_chunks(_multi_layer_chunk, tasks, workers, cache)
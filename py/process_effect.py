@@ -1,23 +1,37 @@
 #!/usr/bin/env python3
 """
 Procesador de efectos - Genera líneas por sílaba con efectos lead-in
-Usa el fontsize del estilo para calcular posiciones
+Usa el fontsize del estilo para calcular posiciones, y su Alignment y
+márgenes con el PlayRes del script (style_layout) para ubicarlas
 """
 
 import sys
-import re
-from dataclasses import dataclass
-from typing import List, Optional, Dict
+import argparse
+from itertools import chain
+from functools import lru_cache, partial
+from typing import List, Optional, Dict, Iterable, Iterator, Set, Tuple, Union
 
+from ass_document import ASSDocument, EventRecord, StyleRecord, iter_ass_file
+from ass_time import parse_time, format_time
+from fx_cache import FxCache, hash_parts, config_hash, DEFAULT_MAX_ENTRIES
+from font_metrics import TextMeasurer, style_measurer
+from tag_templates import lead_in_template, lead_in_text_template
+from batch_layout import CharWidths, ScriptLayout, layout_lines
+from instrumentation import instruments, Profiler
+from karaoke_processor import Syllable
+from frame_timing import FrameTiming, frame_timing, resolve_fps
+from style_layout import event_anchor, format_play_res, parse_play_res, place_lines
+from fx_binary import write_records
 
-@dataclass
-class Syllable:
-    text: str
-    duration: int
-    start_time: int
-    end_time: int
-    x: float
-    y: float
+
+WRITE_BUFFER_SIZE = 1 << 16
+
+# Diálogos por lote de layout en iter_generated_lines
+LAYOUT_BATCH = 128
+
+# Effect de las líneas generadas; con el protocolo delta va seguido del id del bloque
+FX_EFFECT = 'fx'
+BLOCK_ID_LENGTH = 12
 
 
 def read_config(config_file: str) -> dict:
@@ -39,67 +53,22 @@ def hex_to_ass(hex_color: str) -> str:
     return f"&H00{b}{g}{r}&"
 
 
-def parse_time(time_str: str) -> int:
-    match = re.match(r'(\d+):(\d+):(\d+)\.(\d+)', time_str)
-    if match:
-        h, m, s, cs = map(int, match.groups())
-        return (h * 3600 + m * 60 + s) * 1000 + cs * 10
-    return 0
-
-
-def format_time(ms: int) -> str:
-    if ms < 0:
-        ms = 0
-    cs = (ms % 1000) // 10
-    s = (ms // 1000) % 60
-    m = (ms // 60000) % 60
-    h = ms // 3600000
-    return f"{h}:{m:02d}:{s:02d}.{cs:02d}"
-
-
-def parse_styles(ass_file: str) -> Dict[str, dict]:
-    """Parsear estilos del archivo ASS"""
-    styles = {}
-    in_styles = False
-    format_fields = []
-    
+def parse_styles(ass_file: str) -> Dict[str, StyleRecord]:
+    """Parsear estilos del archivo ASS (se detiene en el primer evento)"""
+    document = ASSDocument()
     try:
-        with open(ass_file, 'r', encoding='utf-8-sig') as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith('[V4'):
-                    in_styles = True
-                    continue
-                elif line.startswith('[') and in_styles:
-                    break
-                
-                if in_styles:
-                    if line.startswith('Format:'):
-                        format_str = line[7:].strip()
-                        format_fields = [f.strip() for f in format_str.split(',')]
-                    elif line.startswith('Style:'):
-                        style_str = line[6:].strip()
-                        values = [v.strip() for v in style_str.split(',')]
-                        if format_fields and len(values) >= 3:
-                            style = {}
-                            for i, field in enumerate(format_fields):
-                                if i < len(values):
-                                    style[field] = values[i]
-                            if 'Name' in style:
-                                styles[style['Name']] = style
-    except:
+        for _ in document.feed(iter_ass_file(ass_file), keep_events=False):
+            break
+    except OSError:
         pass
-    
-    return styles
+    return document.styles
 
 
 def get_style_metrics(styles: Dict, style_name: str) -> tuple:
     """Obtener fontsize y spacing del estilo"""
-    if style_name in styles:
-        style = styles[style_name]
-        fontsize = int(style.get('Fontsize', 48))
-        spacing = float(style.get('Spacing', 0))
-        return fontsize, spacing
+    style = styles.get(style_name)
+    if style:
+        return int(style.fontsize), style.spacing
     return 48, 0
 
 
@@ -123,176 +92,606 @@ def estimate_char_width(char: str, fontsize: int, spacing: float = 0) -> float:
     return fontsize * factor + spacing
 
 
-def estimate_text_width(text: str, fontsize: int, spacing: float = 0) -> float:
+def estimate_text_width(text: str, fontsize: int, spacing: float = 0,
+                        measurer: Optional[TextMeasurer] = None) -> float:
+    if measurer:
+        return measurer.text_width(text, lambda c: estimate_char_width(c, fontsize, spacing))
     total = sum(estimate_char_width(c, fontsize, spacing) for c in text)
     return total
 
 
-def extract_syllables(text: str, fontsize: int, spacing: float, line_y: float) -> List[Syllable]:
+def get_style_measurer(styles: Dict, style_name: str, config: dict) -> Optional[TextMeasurer]:
+    """Medidor con la fuente real del estilo, o None para usar la estimación"""
+    if config.get('FONT_METRICS', '1') == '0':
+        return None
+    return style_measurer(styles.get(style_name))
+
+
+def extract_syllables(text: str, fontsize: int, spacing: float, line_y: float,
+                      measurer: Optional[TextMeasurer] = None) -> List[Syllable]:
     """Extraer sílabas con timing"""
-    syllables = []
-    pattern = r'\{[^}]*\\[kK]f?(\d+)[^}]*\}([^{]*)'
-    
-    current_time = 0
-    current_x = 10  # margin izquierdo
+    return layout_syllables(layout_lines([text], [_metric_widths(fontsize, spacing, measurer)]), 0, line_y)
+
+
+def _estimate_width(fontsize: int, spacing: float, char: str) -> float:
+    return estimate_char_width(char, fontsize, spacing)
+
+
+@lru_cache(maxsize=64)
+def _metric_widths(fontsize: int, spacing: float, measurer: Optional[TextMeasurer]) -> CharWidths:
+    """Un CharWidths por métricas, así las líneas repetidas salen de la caché de layout"""
+    return CharWidths(partial(_estimate_width, fontsize, spacing), measurer)
+
+
+# (estilo, métricas reales) -> anchos memorizados
+_style_widths: Dict[Tuple, CharWidths] = {}
+
+
+def clear_style_widths() -> None:
+    """Olvidar los anchos por estilo (p. ej. si cambiaron las fuentes instaladas)"""
+    _style_widths.clear()
+    _metric_widths.cache_clear()
+
+
+def get_style_widths(styles: Dict, style_name: str, config: dict) -> CharWidths:
+    """Anchos por caracter del estilo, reutilizados entre líneas y lotes"""
+    style = styles.get(style_name)
+    key = (style.key() if style else None, config.get('FONT_METRICS', '1'))
+    widths = _style_widths.get(key)
+    if widths is None:
+        if len(_style_widths) > 256:
+            _style_widths.clear()
+        fontsize, spacing = get_style_metrics(styles, style_name)
+        measurer = get_style_measurer(styles, style_name, config)
+        widths = _style_widths[key] = CharWidths(partial(_estimate_width, fontsize, spacing), measurer)
+    return widths
+
+
+def layout_dialogues(dialogues: List[EventRecord], config: dict, styles: Dict) -> Tuple[ScriptLayout, List[float]]:
+    """Layout en lote de varios diálogos, cada uno con las métricas y la ubicación de su estilo
     
-    for match in re.finditer(pattern, text):
-        duration_cs = int(match.group(1))
-        syl_text = match.group(2)
-        
-        if not syl_text:
-            continue
-        
-        duration_ms = duration_cs * 10
-        syl_width = estimate_text_width(syl_text, fontsize, spacing)
-        
-        syllable = Syllable(
-            text=syl_text,
-            duration=duration_cs,
-            start_time=current_time,
-            end_time=current_time + duration_ms,
-            x=current_x + syl_width / 2,
-            y=line_y
+    Devuelve el layout (x ya ubicadas según Alignment, márgenes y PLAY_RES)
+    y la y de cada diálogo.
+    """
+    play_res = parse_play_res(config.get('PLAY_RES'))
+    with instruments.stage('layout'):
+        widths = [get_style_widths(styles, dialogue.style, config) for dialogue in dialogues]
+        layout = layout_lines([dialogue.text for dialogue in dialogues], widths, 0)
+        line_y = place_lines(layout, [
+            event_anchor(dialogue, styles.get(dialogue.style), play_res) for dialogue in dialogues
+        ])
+    if instruments.enabled:
+        instruments.count('lines_parsed', len(dialogues))
+        instruments.count('syllables', len(layout.syl_text))
+    return layout, line_y
+
+
+def layout_syllables(layout: ScriptLayout, line: int, line_y: float) -> List[Syllable]:
+    """Sílabas de una línea del layout"""
+    return [
+        Syllable(
+            text=layout.syl_text[j],
+            duration=layout.syl_duration[j],
+            start_time=layout.syl_start[j],
+            end_time=layout.syl_end[j],
+            x=layout.syl_x[j],
+            y=line_y,
+            index=layout.syl_index[j],
+            char_index=layout.syl_char_index[j]
         )
-        
-        syllables.append(syllable)
-        current_time += duration_ms
-        current_x += syl_width
-    
-    return syllables
+        for j in layout.syllable_range(line)
+    ]
 
 
-def parse_dialogue(line: str):
-    match = re.match(
-        r'Dialogue:\s*(\d+),([^,]+),([^,]+),([^,]*),([^,]*),(\d+),(\d+),(\d+),([^,]*),(.*)',
-        line
-    )
-    if not match:
+def parse_dialogue(line: str) -> Optional[EventRecord]:
+    event = EventRecord.from_line(line)
+    if event is None or event.comment:
         return None
-    
-    return {
-        'layer': int(match.group(1)),
-        'start': match.group(2),
-        'end': match.group(3),
-        'style': match.group(4),
-        'actor': match.group(5),
-        'margin_l': int(match.group(6)),
-        'margin_r': int(match.group(7)),
-        'margin_v': int(match.group(8)),
-        'effect': match.group(9),
-        'text': match.group(10)
-    }
-
-
-def generate_syllable_lines(dialogue: dict, config: dict, styles: Dict) -> List[str]:
+    return event
+
+
+def generate_syllable_lines(dialogue: EventRecord, config: dict, styles: Dict) -> List[str]:
     """Generar líneas por sílaba con efecto lead-in"""
-    lines = []
-    
-    entry_duration = int(config.get('ENTRY_DURATION', 300))
-    fadeout_duration = int(config.get('FADEOUT_DURATION', 300))
-    primary = config.get('PRIMARY_COLOR', '#FFFFFF')
-    border_color = config.get('BORDER_COLOR', '#FC76F2')
-    shadow_color = config.get('SHADOW_COLOR', '#000000')
-    border_size = config.get('BORDER_SIZE', '2')
-    shadow_size = config.get('SHADOW_SIZE', '0')
-    blur = config.get('BLUR', '3')
-    
-    # Obtener métricas del estilo
-    fontsize, spacing = get_style_metrics(styles, dialogue['style'])
-    
-    line_start_ms = parse_time(dialogue['start'])
-    line_end_ms = parse_time(dialogue['end'])
-    
-    # Posición Y por defecto (puedes ajustar según el alignment del estilo)
-    line_y = 29
-    
-    syllables = extract_syllables(dialogue['text'], fontsize, spacing, line_y)
-    
-    if not syllables:
-        return lines
-    
-    for syl in syllables:
-        syl_start_abs = line_start_ms + syl.start_time
-        syl_end_abs = line_end_ms
-        
-        tags = (
-            f"\\an5\\pos({syl.x:.0f},{syl.y:.0f})"
-            f"\\fad({entry_duration},{fadeout_duration})"
-            f"\\blur{blur}"
-            f"\\bord{border_size}"
-            f"\\shad{shadow_size}"
-            f"\\c{hex_to_ass(primary)}"
-            f"\\3c{hex_to_ass(border_color)}"
-            f"\\4c{hex_to_ass(shadow_color)}"
-        )
-        
-        line = (
-            f"Dialogue: {dialogue['layer']},"
-            f"{format_time(syl_start_abs)},{format_time(syl_end_abs)},"
-            f"{dialogue['style']},,0,0,0,fx,"
-            f"{{{tags}}}{syl.text}"
-        )
-        
-        lines.append(line)
+    layout, line_y = layout_dialogues([dialogue], config, styles)
+    return layout_syllable_lines(layout, [dialogue], config, line_y)[0]
+
+
+def layout_syllable_lines(layout: ScriptLayout, dialogues: List[EventRecord],
+                          config: dict, line_y: List[float]) -> List[List[str]]:
+    """Líneas lead-in de cada diálogo del lote, a partir de su layout
+    
+    `line_y` es la y de cada diálogo (de layout_dialogues).
+    """
+    # Tags constantes compilados una vez por configuración
+    template = lead_in_template(config)
+    syl_text = layout.syl_markup
+    syl_start = layout.syl_start
+    syl_x = layout.syl_x
+    
+    fps = resolve_fps(config.get('FPS'))
+    if fps:
+        return _frame_syllable_lines(layout, dialogues, line_y, template, frame_timing(fps))
+    
+    results = []
+    for n, dialogue in enumerate(dialogues):
+        line_start_ms = dialogue.start_ms
+        end_time = format_time(dialogue.end_ms)
+        y = line_y[n]
+        results.append([
+            template(
+                dialogue.layer, format_time(line_start_ms + syl_start[j]), end_time,
+                dialogue.style, syl_x[j], y, syl_text[j]
+            )
+            for j in layout.syllable_range(n)
+        ])
+    return results
+
+
+def _frame_syllable_lines(layout: ScriptLayout, dialogues: List[EventRecord],
+                          line_y: List[float], template, timing: FrameTiming) -> List[List[str]]:
+    """layout_syllable_lines con tiempos ajustados a cuadros; omite las sílabas de menos de un cuadro"""
+    syl_text = layout.syl_markup
+    syl_start = layout.syl_start
+    syl_x = layout.syl_x
+    frame = timing.frame
+    at = timing.format_frame
+    
+    results = []
+    for n, dialogue in enumerate(dialogues):
+        line_start_ms = dialogue.start_ms
+        end_frame = frame(dialogue.end_ms)
+        end_time = at(end_frame)
+        y = line_y[n]
+        lines = []
+        for j in layout.syllable_range(n):
+            start_frame = frame(line_start_ms + syl_start[j])
+            if start_frame < end_frame:
+                lines.append(template(
+                    dialogue.layer, at(start_frame), end_time,
+                    dialogue.style, syl_x[j], y, syl_text[j]
+                ))
+        results.append(lines)
+    return results
+
+
+def layout_syllable_records(layout: ScriptLayout, dialogues: List[EventRecord],
+                            config: dict, line_y: List[float]) -> List[List[EventRecord]]:
+    """layout_syllable_lines como EventRecord, para escribirlas en binario sin
+    volver a parsear cada línea; to_line() da la misma línea de texto
+    """
+    text = lead_in_text_template(config)
+    record = EventRecord.from_ms
+    syl_text = layout.syl_markup
+    syl_start = layout.syl_start
+    syl_x = layout.syl_x
+    
+    fps = resolve_fps(config.get('FPS'))
+    timing = frame_timing(fps) if fps else None
+    
+    results = []
+    for n, dialogue in enumerate(dialogues):
+        layer, style = dialogue.layer, dialogue.style
+        line_start_ms = dialogue.start_ms
+        y = line_y[n]
+        records = []
+        if timing is None:
+            end_ms = dialogue.end_ms
+            for j in layout.syllable_range(n):
+                records.append(record(layer, line_start_ms + syl_start[j], end_ms, style, '',
+                                      0, 0, 0, FX_EFFECT, text(syl_x[j], y, syl_text[j])))
+        else:
+            end_frame = timing.frame(dialogue.end_ms)
+            end_ms = timing.time(end_frame)
+            for j in layout.syllable_range(n):
+                start_frame = timing.frame(line_start_ms + syl_start[j])
+                if start_frame < end_frame:
+                    records.append(record(layer, timing.time(start_frame), end_ms, style, '',
+                                          0, 0, 0, FX_EFFECT, text(syl_x[j], y, syl_text[j])))
+        results.append(records)
+    return results
+
+
+def with_project_fps(config: dict, events: Iterator[EventRecord], document: ASSDocument) -> Iterator[EventRecord]:
+    """Resolver FPS:auto con [Aegisub Project Garbage] antes de generar
+    
+    La sección está antes de [Events]: se lee hasta el primer diálogo (ya,
+    no de forma perezosa, así la clave de caché usa el FPS resuelto). Sin FPS
+    en el proyecto se genera en ms.
+    """
+    first = next(events, None)
+    fps = resolve_fps(config['FPS'], document)
+    if fps:
+        config['FPS'] = repr(fps)
+    else:
+        del config['FPS']
+        print("Aviso: el proyecto no tiene FPS (video dummy); se genera sin ajustar a cuadros", file=sys.stderr)
+    return chain([first], events) if first is not None else iter(())
+
+
+def with_script_play_res(config: dict, events: Iterator[EventRecord], document: ASSDocument) -> Iterator[EventRecord]:
+    """Tomar PLAY_RES de [Script Info] antes de generar
+    
+    Como en with_project_fps, se lee hasta el primer diálogo para que la
+    resolución entre en la clave de caché.
+    """
+    first = next(events, None)
+    config['PLAY_RES'] = format_play_res(document.play_res)
+    return chain([first], events) if first is not None else iter(())
+
+
+def iter_dialogue_events(ass_file: str, document: Optional[ASSDocument] = None,
+                         style: str = '') -> Iterator[EventRecord]:
+    """Recorrer los eventos Dialogue en una sola pasada
     
-    return lines
+    Si se pasa `document`, sus estilos se llenan antes de que aparezca el
+    primer diálogo (los eventos no se guardan), así stdin se lee una sola vez.
+    Con `style`, las líneas de otros estilos se descartan sin parsearlas.
+    """
+    document = document or ASSDocument()
+    for event in document.feed(iter_ass_file(ass_file), keep_events=False, style=style):
+        if not event.comment:
+            yield event
+
+
+def iter_dialogue_lines(ass_file: str) -> Iterator[str]:
+    """Líneas Dialogue: del archivo, como texto"""
+    for event in iter_dialogue_events(ass_file):
+        yield event.to_line()
 
 
 def read_dialogue_lines(ass_file: str) -> list:
-    lines = []
     try:
-        with open(ass_file, 'r', encoding='utf-8-sig') as f:
-            for line in f:
-                if line.startswith('Dialogue:'):
-                    lines.append(line.strip())
-    except:
-        try:
-            with open(ass_file, 'r', encoding='latin-1') as f:
-                for line in f:
-                    if line.startswith('Dialogue:'):
-                        lines.append(line.strip())
-        except:
-            pass
-    return lines
+        return list(iter_dialogue_lines(ass_file))
+    except OSError:
+        return []
+
+
+def line_cache_key(dialogue: EventRecord, styles: Dict, config: dict, config_key: str) -> str:
+    """Clave de caché: todo lo que influye en las líneas generadas de un diálogo"""
+    style = styles.get(dialogue.style)
+    measurer = get_style_measurer(styles, dialogue.style, config)
+    font = (measurer.face.path, measurer.face.mtime) if measurer else None
+    return hash_parts(
+        'lead_in', config_key, dialogue.layer, dialogue.start, dialogue.end,
+        dialogue.style, dialogue.margin_l, dialogue.margin_r, dialogue.margin_v,
+        style.key() if style else None, font, dialogue.text
+    )
+
+
+def iter_generated_lines(dialogue_lines: Iterable[Union[str, EventRecord]], config: dict, styles: Dict,
+                         cache: Optional[FxCache] = None, records: bool = False) -> Iterator[Union[str, EventRecord]]:
+    """Generar las líneas fx del estilo seleccionado de forma perezosa
+    
+    Con `cache`, solo se regeneran las líneas que cambiaron desde la última
+    ejecución; el resto se copia de la caché. Con `records`, las líneas
+    generadas son EventRecord (para write_lines binario); las que vienen de la
+    caché siguen siendo texto.
+    """
+    for _, _, lines in _iter_blocks(dialogue_lines, config, styles, cache, False, records):
+        yield from lines
+
+
+def iter_generated_blocks(dialogue_lines: Iterable[Union[str, EventRecord]], config: dict, styles: Dict,
+                          cache: Optional[FxCache] = None,
+                          records: bool = False) -> Iterator[Tuple[EventRecord, str, List[Union[str, EventRecord]]]]:
+    """(diálogo, id, líneas fx) de cada diálogo del estilo seleccionado
+    
+    El id sale de la clave de caché: es el mismo en cada ejecución mientras no
+    cambien la línea, su estilo ni la configuración. Las líneas idénticas
+    comparten la clave; para que cada una tenga su bloque, desde la segunda
+    el id incluye el número de repetición (borrar una copia deja sin uso el
+    id de la última, y ese bloque se borra). `records` como en
+    iter_generated_lines.
+    """
+    repeats: Dict[str, int] = {}
+    for dialogue, key, lines in _iter_blocks(dialogue_lines, config, styles, cache, True, records):
+        repeat = repeats.get(key, 0)
+        repeats[key] = repeat + 1
+        if repeat:
+            key = hash_parts(key, repeat)
+        yield dialogue, key[:BLOCK_ID_LENGTH], lines
+
+
+def _iter_blocks(dialogue_lines: Iterable[Union[str, EventRecord]], config: dict, styles: Dict,
+                 cache: Optional[FxCache], with_keys: bool,
+                 records: bool = False) -> Iterator[Tuple[EventRecord, Optional[str], List[Union[str, EventRecord]]]]:
+    selected_style = config.get('SELECTED_STYLE', '')
+    config_key = config_hash(config) if cache or with_keys else ''
+    
+    batch = []
+    for line in dialogue_lines:
+        dialogue = line if isinstance(line, EventRecord) else parse_dialogue(line)
+        if dialogue:
+            if selected_style and dialogue.style != selected_style:
+                continue
+            batch.append(dialogue)
+            if len(batch) >= LAYOUT_BATCH:
+                yield from _generate_batch(batch, config, styles, cache, config_key, with_keys, records)
+                batch = []
+    if batch:
+        yield from _generate_batch(batch, config, styles, cache, config_key, with_keys, records)
+
+
+def _generate_batch(dialogues: List[EventRecord], config: dict, styles: Dict, cache: Optional[FxCache],
+                    config_key: str, with_keys: bool,
+                    records: bool = False) -> Iterator[Tuple[EventRecord, Optional[str], List[Union[str, EventRecord]]]]:
+    """Líneas de un lote de diálogos; solo se hace el layout de las que no están en caché"""
+    results: List[Optional[List[Union[str, EventRecord]]]] = [None] * len(dialogues)
+    keys: List[Optional[str]] = [None] * len(dialogues)
+    if cache is not None or with_keys:
+        with instruments.stage('cache'):
+            for n, dialogue in enumerate(dialogues):
+                keys[n] = line_cache_key(dialogue, styles, config, config_key)
+                if cache is not None:
+                    results[n] = cache.get(keys[n])
+    
+    pending = [n for n, generated in enumerate(results) if generated is None]
+    if pending:
+        batch = [dialogues[n] for n in pending]
+        layout, line_y = layout_dialogues(batch, config, styles)
+        with instruments.stage('format'):
+            if records:
+                generated = layout_syllable_records(layout, batch, config, line_y)
+            else:
+                generated = layout_syllable_lines(layout, batch, config, line_y)
+        with instruments.stage('cache'):
+            for n, lines in zip(pending, generated):
+                results[n] = lines
+                if cache is not None:
+                    cache.put(keys[n], [line.to_line() for line in lines] if records else lines)
+    
+    if instruments.enabled:
+        instruments.count('lines_generated', sum(len(lines) for lines in results))
+    return zip(dialogues, keys, results)
+
+
+def block_effect(block_id: str) -> str:
+    """Campo Effect de las líneas de un bloque: fx:<id>"""
+    return f"{FX_EFFECT}:{block_id}"
+
+
+def tag_block(lines: List[Union[str, EventRecord]], block_id: str) -> List[Union[str, EventRecord]]:
+    """Escribir el id del bloque en el campo Effect de sus líneas
+    
+    Los EventRecord (recién generados, de iter_generated_blocks) se cambian
+    en el lugar.
+    """
+    effect = block_effect(block_id)
+    tagged = []
+    for line in lines:
+        if isinstance(line, EventRecord):
+            line.effect = effect
+            tagged.append(line)
+            continue
+        fields = line.split(',', 9)
+        fields[8] = effect
+        tagged.append(','.join(fields))
+    return tagged
+
+
+def iter_delta_lines(blocks: Iterable[Tuple[EventRecord, str, List[Union[str, EventRecord]]]], keep_ids: Set[str],
+                     manifest: List[Tuple[str, str, int]]) -> Iterator[Union[str, EventRecord]]:
+    """Líneas de los bloques que la macro todavía no tiene
+    
+    Los bloques cuyo id está en `keep_ids` ya están en el script y no se
+    escriben. `manifest` recibe (Effect del diálogo de origen, id, líneas
+    escritas) de cada bloque, en orden: la macro lo usa para saber qué
+    bloques conservar, cuáles borrar y qué líneas de origen comentar.
+    """
+    for dialogue, block_id, lines in blocks:
+        if block_id in keep_ids:
+            manifest.append((dialogue.effect, block_id, 0))
+            continue
+        manifest.append((dialogue.effect, block_id, len(lines)))
+        yield from tag_block(lines, block_id)
+
+
+def read_keep_ids(path: Optional[str]) -> Set[str]:
+    """Ids de los bloques que la macro ya tiene (uno por línea)"""
+    if not path:
+        return set()
+    try:
+        with open(path, encoding='utf-8') as f:
+            return {line.strip() for line in f if line.strip()}
+    except OSError:
+        return set()
+
+
+def write_manifest(path: str, manifest: List[Tuple[str, str, int]]) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        for source, block_id, count in manifest:
+            f.write(f"{source}\t{block_id}\t{count}\n")
+
+
+def process_dialogue_lines(dialogue_lines: Iterable[Union[str, EventRecord]], config: dict, styles: Dict,
+                           cache: Optional[FxCache] = None, records: bool = False) -> List[Union[str, EventRecord]]:
+    """Generar las líneas fx de todas las líneas de diálogo del estilo seleccionado"""
+    return list(iter_generated_lines(dialogue_lines, config, styles, cache, records))
+
+
+def write_lines(output_file: str, lines: Iterable[Union[str, EventRecord]], buffer_size: int = WRITE_BUFFER_SIZE,
+                binary: bool = False) -> int:
+    """Escribir las líneas generadas ('-' = stdout); devuelve cuántas se escribieron
+    
+    Con `binary` se escriben en el formato de fx_binary para la macro; las
+    líneas pueden ser EventRecord (generadas con records=True) o texto, que
+    se parsea. Sin `binary` solo texto.
+    """
+    if binary:
+        return _write_binary(output_file, lines, buffer_size)
+    if output_file == '-':
+        f = sys.stdout
+    else:
+        f = open(output_file, 'w', encoding='utf-8', buffering=buffer_size)
+    
+    count = 0
+    try:
+        if instruments.enabled:
+            count = _write_measured(f, lines)
+        else:
+            for line in lines:
+                f.write(line + '\n')
+                count += 1
+    finally:
+        if f is sys.stdout:
+            f.flush()
+        else:
+            f.close()
+    return count
+
+
+def _write_binary(output_file: str, lines: Iterable[Union[str, EventRecord]], buffer_size: int) -> int:
+    if output_file == '-':
+        f = sys.stdout.buffer
+    else:
+        f = open(output_file, 'wb', buffering=buffer_size)
+    try:
+        with instruments.stage('write'):
+            count = write_records(f, _as_records(lines))
+    finally:
+        if f is sys.stdout.buffer:
+            f.flush()
+        else:
+            f.close()
+    return count
+
+
+def _as_records(lines: Iterable[Union[str, EventRecord]]) -> Iterator[EventRecord]:
+    """Los EventRecord pasan tal cual; las líneas de texto (caché, optimizador,
+    multi_layer, workers) se parsean y las que no son eventos se descartan
+    """
+    for line in lines:
+        if not isinstance(line, EventRecord):
+            line = EventRecord.from_line(line)
+            if line is None:
+                continue
+        yield line
+
+
+def _write_measured(f, lines: Iterable[str]) -> int:
+    """write_lines con tiempos y bytes escritos (solo con la instrumentación activa)"""
+    count = 0
+    written = 0
+    for line in lines:
+        line += '\n'
+        with instruments.stage('write'):
+            f.write(line)
+        count += 1
+        written += len(line.encode('utf-8'))
+    instruments.count('bytes_written', written)
+    return count
 
 
 def main():
-    if len(sys.argv) < 4:
-        print("Uso: process_effect.py <ass_file> <config_file> <output_file>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Genera líneas por sílaba con efecto lead-in",
+        usage="process_effect.py <ass_file> <config_file> <output_file>"
+    )
+    parser.add_argument('ass_file', help="Archivo ASS de entrada ('-' = stdin)")
+    parser.add_argument('config_file', help="Configuración escrita por la GUI")
+    parser.add_argument('output_file', help="Archivo de salida ('-' = stdout)")
+    parser.add_argument('--buffer-size', type=int, default=WRITE_BUFFER_SIZE,
+        help="Tamaño del buffer de escritura en bytes")
+    parser.add_argument('--workers', type=int, default=1,
+        help="Procesos para generar en paralelo (0 = uno por núcleo)")
+    parser.add_argument('--chunk-size', type=int, default=64,
+        help="Líneas de diálogo por lote en modo paralelo")
+    parser.add_argument('--cache-dir', default=None,
+        help="Reutilizar las líneas ya generadas guardadas en este directorio")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_ENTRIES,
+        help="Máximo de líneas de diálogo guardadas en la caché")
+    parser.add_argument('--no-font-metrics', action='store_true',
+        help="Estimar anchos en lugar de leer las fuentes instaladas")
+    parser.add_argument('--fps', default=None, metavar='FPS',
+        help="Ajustar tiempos a los cuadros del video (número, o 'auto' = el del proyecto)")
+    parser.add_argument('--format', choices=('text', 'binary'), default='text',
+        help="Formato de salida: líneas Dialogue: o registros binarios para la macro")
+    parser.add_argument('--optimize', action='store_true',
+        help="Quitar tags redundantes de las líneas generadas (reporta los bytes ahorrados)")
+    parser.add_argument('--manifest', default=None, metavar='ARCHIVO',
+        help="Protocolo delta: marcar cada bloque con fx:<id> y guardar aquí origen, id y líneas de cada bloque")
+    parser.add_argument('--keep-ids', default=None, metavar='ARCHIVO',
+        help="Con --manifest: ids de bloques que ya están en el script (no se vuelven a escribir)")
+    parser.add_argument('--profile', nargs='?', const='', default=None, metavar='ARCHIVO',
+        help="Mostrar tiempos por etapa y contadores en stderr; con ARCHIVO guarda además un cProfile")
+    args = parser.parse_args()
     
-    ass_file = sys.argv[1]
-    config_file = sys.argv[2]
-    output_file = sys.argv[3]
+    profiler = Profiler(args.profile) if args.profile is not None else Profiler.from_env()
+    if profiler:
+        profiler.start()
     
-    config = read_config(config_file)
+    # El resumen se muestra también cuando la ejecución termina con sys.exit o un error
+    try:
+        run(args)
+    finally:
+        if profiler:
+            profiler.stop()
+
+
+def run(args: argparse.Namespace) -> None:
+    """Generar las líneas de efecto con los argumentos de main"""
+    config = read_config(args.config_file)
     
     if not config:
-        print("No se pudo leer la configuracion")
+        print("No se pudo leer la configuracion", file=sys.stderr)
         sys.exit(1)
     
-    # Parsear estilos del ASS
-    styles = parse_styles(ass_file)
+    if args.no_font_metrics:
+        config['FONT_METRICS'] = '0'
+    if args.fps is not None:
+        config['FPS'] = args.fps
     
-    selected_style = config.get('SELECTED_STYLE', '')
+    # Los estilos se parsean en la misma pasada que los diálogos
+    document = ASSDocument()
+    styles = document.styles
     
-    dialogue_lines = read_dialogue_lines(ass_file)
+    dialogue_events = iter_dialogue_events(args.ass_file, document, config.get('SELECTED_STYLE', ''))
+    if str(config.get('FPS', '')).strip().lower() == 'auto':
+        dialogue_events = with_project_fps(config, dialogue_events, document)
+    if 'PLAY_RES' not in config:
+        dialogue_events = with_script_play_res(config, dialogue_events, document)
+    dialogue_lines = instruments.timed_iter('read', dialogue_events)
+    cache = FxCache(args.cache_dir, args.cache_size) if args.cache_dir else None
     
-    all_generated = []
-    for line in dialogue_lines:
-        dialogue = parse_dialogue(line)
-        if dialogue:
-            if selected_style and dialogue['style'] != selected_style:
-                continue
-            
-            generated = generate_syllable_lines(dialogue, config, styles)
-            all_generated.extend(generated)
+    # En binario sin --optimize las líneas se generan ya como registros
+    records = args.format == 'binary' and not args.optimize
+    manifest: List[Tuple[str, str, int]] = []
+    if args.manifest:
+        # Los bloques se generan en orden en este proceso (sin --workers)
+        blocks = iter_generated_blocks(dialogue_lines, config, styles, cache, records)
+        generated = iter_delta_lines(blocks, read_keep_ids(args.keep_ids), manifest)
+    elif args.workers != 1:
+        from parallel import iter_generated_lines_parallel
+        generated = iter_generated_lines_parallel(
+            dialogue_lines, config, styles, args.workers, args.chunk_size, cache)
+    else:
+        generated = iter_generated_lines(dialogue_lines, config, styles, cache, records)
+    
+    generated = instruments.timed_iter('generate', generated)
+    
+    optimizer = None
+    if args.optimize:
+        from tag_optimizer import TagOptimizer
+        optimizer = TagOptimizer(styles)
+        generated = instruments.timed_iter('optimize', optimizer.optimize_lines(generated))
+    
+    try:
+        count = write_lines(args.output_file, generated, args.buffer_size, args.format == 'binary')
+        if args.manifest:
+            write_manifest(args.manifest, manifest)
+    except OSError as e:
+        print(f"Error procesando ASS: {e}", file=sys.stderr)
+        sys.exit(1)
+    
+    log = sys.stderr if args.output_file == '-' else sys.stdout
+    print(f"Generadas {count} lineas con fontsize del estilo", file=log)
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for line in all_generated:
-            f.write(line + '\n')
+    if cache:
+        cache.evict()
+        print(f"Cache: {cache.hits} lineas reutilizadas, {cache.misses} regeneradas", file=log)
     
-    print(f"Generadas {len(all_generated)} lineas con fontsize del estilo")
+    if optimizer:
+        print(optimizer.stats.report(), file=log)
 
 
 if __name__ == "__main__":
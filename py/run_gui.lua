@@ -7,30 +7,244 @@ local PYTHON = "/Library/Frameworks/Python.framework/Versions/3.13/bin/python3"
 local SCRIPT_DIR = "/Users/macbookpro/py-effector-fx/py"
 local GUI_SCRIPT = SCRIPT_DIR .. "/gui_script.py"
 local PROCESS_SCRIPT = SCRIPT_DIR .. "/process_effect.py"
+local SERVER_SCRIPT = SCRIPT_DIR .. "/effector_server.py"
 local TEMP_FILE = "/tmp/aegisub_current.ass"
+local STYLES_FILE = "/tmp/aegisub_styles.ass"
 local RESULT_FILE = "/tmp/aegisub_effect_result.txt"
 local LINES_FILE = "/tmp/aegisub_effect_lines.txt"
 
+-- Servidor persistente: evita arrancar Python dos veces por ejecución
+local USE_DAEMON = true
+-- Mismo lugar que default_socket_path() de effector_server.py
+local SOCKET_FILE = (os.getenv("XDG_RUNTIME_DIR")
+    or ("/tmp/pyfx-" .. (os.getenv("USER") or "aegisub"))) .. "/pyfx.sock"
+-- PROTOCOL_VERSION de effector_server.py: un servidor con otra versión se reinicia
+local DAEMON_VERSION = 2
+
+-- Caché incremental: solo se regeneran las líneas que cambiaron
+local CACHE_DIR = (os.getenv("HOME") or "/tmp") .. "/.cache/py-effector-fx"
+
+-- Líneas generadas en registros binarios (fx_binary.py): se leen sin pattern matching
+local LINES_FORMAT = "binary"
+local BINARY_MAGIC = "PYFXBIN1\n"
+
+-- Protocolo delta: cada bloque fx lleva el id de su línea de origen en Effect
+-- (fx:<id>); solo se borran e insertan los bloques que cambiaron
+local USE_DELTA = true
+local MANIFEST_FILE = "/tmp/aegisub_effect_manifest.txt"
+local KEEP_FILE = "/tmp/aegisub_effect_keep.txt"
+-- Líneas por llamada a subs.delete/subs.append (unpack tiene un límite de valores)
+local BULK_SIZE = 1000
+
+local unpack = table.unpack or unpack
+
+-- Tiempos ya convertidos (en un karaoke se repiten mucho); se vacían al llenarse
+local TIME_CACHE_SIZE = 8192
+local formatted_times, formatted_count = {}, 0
+local parsed_times, parsed_count = {}, 0
+
+-- ms -> 0:00:00.00 (truncado a centésimas)
 function ass_time(ms)
-    local s = ms / 1000
-    local cs = math.floor((ms % 1000) / 10)
-    local sec = math.floor(s) % 60
-    local min = math.floor(s / 60) % 60
-    local hour = math.floor(s / 3600)
-    return string.format("%d:%02d:%02d.%02d", hour, min, sec, cs)
+    local cs = math.floor(math.max(ms, 0) / 10)
+    local cached = formatted_times[cs]
+    if cached then return cached end
+    local text = string.format("%d:%02d:%02d.%02d",
+        math.floor(cs / 360000), math.floor(cs / 6000) % 60, math.floor(cs / 100) % 60, cs % 100)
+    if formatted_count >= TIME_CACHE_SIZE then
+        formatted_times, formatted_count = {}, 0
+    end
+    formatted_times[cs] = text
+    formatted_count = formatted_count + 1
+    return text
 end
 
 function parse_time(time_str)
+    local cached = parsed_times[time_str]
+    if cached then return cached end
     local h, m, s, cs = time_str:match("(%d+):(%d+):(%d+)%.(%d+)")
     if not h then return 0 end
-    return (tonumber(h) * 3600 + tonumber(m) * 60 + tonumber(s)) * 1000 + tonumber(cs) * 10
+    local ms = (tonumber(h) * 3600 + tonumber(m) * 60 + tonumber(s)) * 1000 + tonumber(cs) * 10
+    if parsed_count >= TIME_CACHE_SIZE then
+        parsed_times, parsed_count = {}, 0
+    end
+    parsed_times[time_str] = ms
+    parsed_count = parsed_count + 1
+    return ms
 end
 
-function run_effector(subs, sel, act)
-    local file = io.open(TEMP_FILE, "w")
-    if not file then return end
+-- Enteros little-endian con string.byte (LuaJIT no tiene string.unpack)
+local function read_u16(data, pos)
+    local a, b = data:byte(pos, pos + 1)
+    return a + b * 256, pos + 2
+end
+
+local function read_u32(data, pos)
+    local a, b, c, d = data:byte(pos, pos + 3)
+    return a + b * 256 + c * 65536 + d * 16777216, pos + 4
+end
+
+local function read_field(data, pos, read_len)
+    local len
+    len, pos = read_len(data, pos)
+    return data:sub(pos, pos + len - 1), pos + len
+end
+
+local function new_dialogue(layer, start_time, end_time, style, actor, margin_l, margin_r, margin_v, effect, text)
+    return {
+        class = "dialogue", raw = "", section = "[Events]", comment = false,
+        layer = layer, start_time = start_time, end_time = end_time,
+        style = style, actor = actor, margin_l = margin_l,
+        margin_r = margin_r, margin_t = margin_v, effect = effect, text = text
+    }
+end
+
+-- Registros del formato binario; nil si el archivo no lo es
+function read_binary_lines(path)
+    local f = io.open(path, "rb")
+    if not f then return nil end
+    local data = f:read("*a")
+    f:close()
+    if data:sub(1, #BINARY_MAGIC) ~= BINARY_MAGIC then return nil end
     
-    file:write("[Script Info]\nScriptType: v4.00+\n\n")
+    local lines = {}
+    local n = 0
+    local pos = #BINARY_MAGIC + 1
+    local size = #data
+    while pos + 3 <= size do
+        local len, start_time, end_time, layer, ml, mr, mv, sty, act, eff, txt
+        len, pos = read_u32(data, pos)
+        local next_pos = pos + len
+        start_time, pos = read_u32(data, pos)
+        end_time, pos = read_u32(data, pos)
+        layer, pos = read_u16(data, pos)
+        ml, pos = read_u16(data, pos)
+        mr, pos = read_u16(data, pos)
+        mv, pos = read_u16(data, pos)
+        sty, pos = read_field(data, pos, read_u16)
+        act, pos = read_field(data, pos, read_u16)
+        eff, pos = read_field(data, pos, read_u16)
+        txt, pos = read_field(data, pos, read_u32)
+        n = n + 1
+        lines[n] = new_dialogue(layer, start_time, end_time, sty, act, ml, mr, mv, eff, txt)
+        pos = next_pos
+    end
+    return lines
+end
+
+-- Líneas Dialogue: de texto
+function read_text_lines(path, style)
+    local lf = io.open(path, "r")
+    if not lf then return nil end
+    local lines = {}
+    for ls in lf:lines() do
+        if ls:match("^Dialogue:") then
+            local layer, st, et, sty, act, ml, mr, mv, eff, txt = 
+                ls:match("Dialogue:%s*(%d+),([^,]+),([^,]+),([^,]*),([^,]*),(%d+),(%d+),(%d+),([^,]*),(.*)")
+            if layer then
+                table.insert(lines, new_dialogue(tonumber(layer), parse_time(st), parse_time(et),
+                    sty or style, act or "", tonumber(ml), tonumber(mr), tonumber(mv),
+                    eff or "fx", txt or ""))
+            end
+        end
+    end
+    lf:close()
+    return lines
+end
+
+function json_string(str)
+    return '"' .. str:gsub('[%c"\\]', function(c)
+        return string.format("\\u%04x", c:byte())
+    end) .. '"'
+end
+
+function exec_ok(cmd)
+    local ok = os.execute(cmd)
+    return ok == true or ok == 0
+end
+
+-- nc se busca una sola vez; sin él no hay servidor
+local has_nc
+function nc_available()
+    if has_nc == nil then
+        has_nc = exec_ok("command -v nc > /dev/null 2>&1")
+    end
+    return has_nc
+end
+
+-- Respuesta del servidor si fue "ok": true; nil si no
+function daemon_request(fields)
+    local parts = {}
+    for k, v in pairs(fields) do
+        table.insert(parts, json_string(k) .. ":" .. json_string(v))
+    end
+    local request = "{" .. table.concat(parts, ",") .. ',"close":true}'
+    local cmd = "printf '%s\\n' '" .. request:gsub("'", "'\\''") .. "' | nc -U " .. SOCKET_FILE
+    local pipe = io.popen(cmd)
+    if not pipe then return false end
+    local response = pipe:read("*a") or ""
+    pipe:close()
+    if response:match('"ok":%s*true') then return response end
+    return nil
+end
+
+-- true si el servidor responde con nuestra versión; false si responde con
+-- otra (o sin versión); nil si no responde
+function ping_daemon()
+    local response = daemon_request({cmd = "ping"})
+    if not response then return nil end
+    return tonumber(response:match('"version":%s*(%d+)')) == DAEMON_VERSION
+end
+
+function wait_socket_removed()
+    for _ = 1, 20 do
+        local f = io.open(SOCKET_FILE, "r")
+        if not f then return end
+        f:close()
+        exec_ok("sleep 0.1")
+    end
+end
+
+function ensure_daemon()
+    if not nc_available() then return false end
+    local current = ping_daemon()
+    if current then return true end
+    if current == false then
+        -- Servidor de una versión anterior: se cierra antes de arrancar el nuevo
+        daemon_request({cmd = "shutdown"})
+        wait_socket_removed()
+    end
+    os.execute(PYTHON .. ' "' .. SERVER_SCRIPT .. '" --socket "' .. SOCKET_FILE .. '" > /dev/null 2>&1 &')
+    for _ = 1, 50 do
+        if ping_daemon() then return true end
+        exec_ok("sleep 0.1")
+    end
+    return false
+end
+
+-- La GUI del servidor corre en otro proceso: se espera a que se cierre
+function daemon_gui(ass_file)
+    local response = daemon_request({cmd = "gui", ass_file = ass_file, version = tostring(DAEMON_VERSION)})
+    local pid = response and response:match('"pid":%s*(%d+)')
+    if not pid then return false end
+    exec_ok("while kill -0 " .. pid .. " 2> /dev/null; do sleep 0.1; done")
+    return true
+end
+
+-- Script Info (con la resolución, para ubicar las líneas) y estilos: es
+-- todo lo que necesita la GUI para elegir el estilo
+local function write_header(file, subs)
+    file:write("[Script Info]\nScriptType: v4.00+\n")
+    for i = 1, #subs do
+        local line = subs[i]
+        if line.class == "info" then
+            if line.key == "PlayResX" or line.key == "PlayResY" then
+                file:write(line.key .. ": " .. line.value .. "\n")
+            end
+        elseif line.class == "style" or line.class == "dialogue" then
+            break
+        end
+    end
+    file:write("\n")
     file:write("[V4+ Styles]\n")
     file:write("Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding\n")
     
@@ -45,29 +259,186 @@ function run_effector(subs, sel, act)
                 line.scale_x, line.scale_y, line.spacing, line.angle,
                 line.borderstyle, line.outline, line.shadow, line.align,
                 line.margin_l, line.margin_r, line.margin_t, line.encoding))
+        elseif line.class == "dialogue" then
+            break
         end
     end
     
     file:write("\n[Events]\n")
     file:write("Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n")
-    
-    local count = 0
+end
+
+local function is_fx(effect)
+    return effect == "fx" or (effect ~= nil and effect:match("^fx:%x+$") ~= nil)
+end
+
+-- Índices de los diálogos a procesar: sin fx y del estilo elegido; con
+-- `selection` solo los seleccionados en lugar de todo el script
+local function scoped_lines(subs, sel, style, selection)
+    local indices = {}
+    local function add(i)
+        local line = subs[i]
+        if line.class == "dialogue" and not is_fx(line.effect)
+                and (style == "" or line.style == style) then
+            indices[#indices + 1] = i
+        end
+    end
+    if selection then
+        for _, i in ipairs(sel) do add(i) end
+        table.sort(indices)
+    else
+        for i = 1, #subs do add(i) end
+    end
+    return indices
+end
+
+-- Con `tag_source` el Effect exportado es el índice de la línea: vuelve en el
+-- manifiesto para saber qué bloque salió de qué línea
+local function write_events(path, subs, indices, tag_source)
+    local file = io.open(path, "w")
+    if not file then return false end
+    write_header(file, subs)
+    for _, i in ipairs(indices) do
+        local line = subs[i]
+        file:write(string.format("Dialogue: %d,%s,%s,%s,%s,%d,%d,%d,%s,%s\n",
+            line.layer, ass_time(line.start_time), ass_time(line.end_time),
+            line.style, line.actor, line.margin_l, line.margin_r, line.margin_t,
+            tag_source and tostring(i) or (line.effect or ""), line.text))
+    end
+    file:close()
+    return true
+end
+
+-- Bloques fx del estilo ya presentes: id -> índices; las fx sin id (de
+-- versiones anteriores) van aparte
+local function existing_blocks(subs, style)
+    local blocks, legacy = {}, {}
     for i = 1, #subs do
         local line = subs[i]
-        if line.class == "dialogue" and line.effect ~= "fx" then
-            file:write(string.format("Dialogue: %d,%s,%s,%s,%s,%d,%d,%d,%s,%s\n",
-                line.layer, ass_time(line.start_time), ass_time(line.end_time),
-                line.style, line.actor, line.margin_l, line.margin_r, line.margin_t,
-                line.effect or "", line.text))
-            count = count + 1
+        if line.class == "dialogue" and (style == "" or line.style == style) then
+            if line.effect == "fx" then
+                legacy[#legacy + 1] = i
+            else
+                local id = line.effect:match("^fx:(%x+)$")
+                if id then
+                    local block = blocks[id]
+                    if not block then
+                        block = {}
+                        blocks[id] = block
+                    end
+                    block[#block + 1] = i
+                end
+            end
+        end
+    end
+    return blocks, legacy
+end
+
+local function write_keep_ids(path, blocks)
+    local file = io.open(path, "w")
+    if not file then return false end
+    for id in pairs(blocks) do
+        file:write(id, "\n")
+    end
+    file:close()
+    return true
+end
+
+-- Filas del manifiesto: línea de origen, id del bloque y líneas escritas
+local function read_manifest(path)
+    local file = io.open(path, "r")
+    if not file then return nil end
+    local rows = {}
+    for ln in file:lines() do
+        local source, id, count = ln:match("^(%d+)\t(%x+)\t(%d+)")
+        if source then
+            rows[#rows + 1] = {index = tonumber(source), id = id, count = tonumber(count)}
         end
     end
     file:close()
+    return rows
+end
+
+local function bulk_delete(subs, indices)
+    table.sort(indices, function(a, b) return a > b end)
+    for first = 1, #indices, BULK_SIZE do
+        subs.delete(unpack(indices, first, math.min(first + BULK_SIZE - 1, #indices)))
+    end
+end
+
+local function bulk_append(subs, lines)
+    for first = 1, #lines, BULK_SIZE do
+        subs.append(unpack(lines, first, math.min(first + BULK_SIZE - 1, #lines)))
+    end
+end
+
+local function comment_sources(subs, indices)
+    for _, i in ipairs(indices) do
+        local line = subs[i]
+        line.comment = true
+        subs[i] = line
+    end
+end
+
+-- Aplicar el manifiesto: se conservan los bloques sin cambios, se borran los
+-- que ya no corresponden a ninguna línea y se agregan solo los nuevos
+local function apply_delta(subs, rows, new_lines, blocks, legacy, selection)
+    local current = {}
+    for _, row in ipairs(rows) do current[row.id] = true end
+    
+    local stale_ids = {}
+    if selection then
+        -- Solo los bloques anteriores de las líneas procesadas
+        for _, row in ipairs(rows) do
+            local extra = subs[row.index].extra
+            local old = extra and extra.pyfx
+            if old and not current[old] then stale_ids[old] = true end
+        end
+    else
+        for id in pairs(blocks) do
+            if not current[id] then stale_ids[id] = true end
+        end
+    end
+    
+    local stale = {}
+    for id in pairs(stale_ids) do
+        for _, i in ipairs(blocks[id] or {}) do stale[#stale + 1] = i end
+    end
+    if not selection then
+        for _, i in ipairs(legacy) do stale[#stale + 1] = i end
+    end
+    
+    -- Orígenes antes de borrar (los índices todavía son válidos)
+    for _, row in ipairs(rows) do
+        local line = subs[row.index]
+        line.comment = true
+        if line.extra then line.extra.pyfx = row.id end
+        subs[row.index] = line
+    end
+    
+    bulk_delete(subs, stale)
+    bulk_append(subs, new_lines)
+    return #stale > 0 or #new_lines > 0
+end
+
+function run_effector_scoped(subs, sel, selection)
+    -- La GUI solo recibe la cabecera; los diálogos se exportan después de
+    -- elegir el estilo y solo los que se van a procesar
+    local header = io.open(STYLES_FILE, "w")
+    if not header then return end
+    write_header(header, subs)
+    header:close()
     
     os.remove(RESULT_FILE)
     os.remove(LINES_FILE)
+    os.remove(MANIFEST_FILE)
     
-    os.execute(PYTHON .. ' "' .. GUI_SCRIPT .. '" "' .. TEMP_FILE .. '"')
+    local daemon = USE_DAEMON and ensure_daemon()
+    
+    if not (daemon and daemon_gui(STYLES_FILE)) then
+        daemon = false
+        os.execute(PYTHON .. ' "' .. GUI_SCRIPT .. '" "' .. STYLES_FILE .. '"')
+    end
     
     local cf = io.open(RESULT_FILE, "r")
     if not cf then return end
@@ -80,47 +451,57 @@ function run_effector(subs, sel, act)
     cf:close()
     
     local style = config.SELECTED_STYLE or ""
+    local indices = scoped_lines(subs, sel, style, selection)
+    if #indices == 0 then return end
+    if not write_events(TEMP_FILE, subs, indices, USE_DELTA) then return end
     
-    os.execute(PYTHON .. ' "' .. PROCESS_SCRIPT .. '" "' .. TEMP_FILE .. '" "' .. RESULT_FILE .. '" "' .. LINES_FILE .. '"')
-    
-    local lf = io.open(LINES_FILE, "r")
-    if not lf then return end
-    
-    local new_lines = {}
-    for ls in lf:lines() do
-        if ls:match("^Dialogue:") then
-            local layer, st, et, sty, act, ml, mr, mv, eff, txt = 
-                ls:match("Dialogue:%s*(%d+),([^,]+),([^,]+),([^,]*),([^,]*),(%d+),(%d+),(%d+),([^,]*),(.*)")
-            if layer then
-                table.insert(new_lines, {
-                    class = "dialogue", raw = "", section = "[Events]", comment = false,
-                    layer = tonumber(layer), start_time = parse_time(st), end_time = parse_time(et),
-                    style = sty or style, actor = act or "", margin_l = tonumber(ml),
-                    margin_r = tonumber(mr), margin_t = tonumber(mv), effect = eff or "fx", text = txt or ""
-                })
-            end
-        end
+    local request = {cmd = "process", ass_file = TEMP_FILE,
+        config_file = RESULT_FILE, output_file = LINES_FILE, cache_dir = CACHE_DIR,
+        format = LINES_FORMAT, version = tostring(DAEMON_VERSION)}
+    local delta_args = ""
+    local blocks, legacy
+    if USE_DELTA then
+        blocks, legacy = existing_blocks(subs, style)
+        write_keep_ids(KEEP_FILE, blocks)
+        request.manifest_file = MANIFEST_FILE
+        request.keep_ids_file = KEEP_FILE
+        delta_args = ' --manifest "' .. MANIFEST_FILE .. '" --keep-ids "' .. KEEP_FILE .. '"'
     end
-    lf:close()
-    os.remove(LINES_FILE)
-    
-    if #new_lines == 0 then return end
     
-    for i = 1, #subs do
-        local line = subs[i]
-        if line.class == "dialogue" and line.style == style and line.effect ~= "fx" then
-            line.comment = true
-            subs[i] = line
-        end
+    if not (daemon and daemon_request(request)) then
+        os.execute(PYTHON .. ' "' .. PROCESS_SCRIPT .. '" "' .. TEMP_FILE .. '" "' .. RESULT_FILE .. '" "' .. LINES_FILE .. '"'
+            .. ' --cache-dir "' .. CACHE_DIR .. '" --format ' .. LINES_FORMAT .. delta_args)
     end
     
-    local pos = #subs + 1
-    for _, nl in ipairs(new_lines) do
-        subs.insert(pos, nl)
-        pos = pos + 1
+    -- Un servidor viejo puede responder en texto aunque se pida binario
+    local new_lines = LINES_FORMAT == "binary" and read_binary_lines(LINES_FILE)
+        or read_text_lines(LINES_FILE, style)
+    os.remove(LINES_FILE)
+    if not new_lines then return end
+    
+    local rows = USE_DELTA and read_manifest(MANIFEST_FILE)
+    os.remove(MANIFEST_FILE)
+    if rows then
+        if not apply_delta(subs, rows, new_lines, blocks, legacy, selection) then return end
+    else
+        -- Sin manifiesto (servidor viejo): se agregan todas las líneas
+        if #new_lines == 0 then return end
+        comment_sources(subs, indices)
+        bulk_append(subs, new_lines)
     end
     
     aegisub.set_undo_point("Py Effector FX")
 end
 
+function run_effector(subs, sel, act)
+    run_effector_scoped(subs, sel, false)
+end
+
+-- Solo las líneas seleccionadas: re-generar una línea no exporta todo el script
+function run_effector_selection(subs, sel, act)
+    run_effector_scoped(subs, sel, true)
+end
+
 aegisub.register_macro(script_name, script_description, run_effector)
+aegisub.register_macro(script_name .. " (selección)", script_description .. " (solo líneas seleccionadas)",
+    run_effector_selection)
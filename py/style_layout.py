@@ -0,0 +1,140 @@
+"""
+Ubicación de las líneas según su estilo
+Con el Alignment, los márgenes (los de la línea si no son 0, si no los del
+estilo) y PlayResX/PlayResY del script se calcula, como el render, dónde
+empieza cada línea y a qué altura queda su centro: las sílabas caen sobre el
+texto original con cualquier alineación.
+
+El área útil y la altura de cada combinación de estilo, márgenes y
+resolución se calculan una vez (LineAnchor, memorizado); de cada línea solo
+hace falta su ancho, que ya está en el layout.
+
+Sin PlayRes o sin el estilo de la línea (uso directo de la API, estilos
+que no están en el script) no hay con qué ubicarla: se usa LEGACY_ANCHOR,
+la posición fija de siempre (alineada a la izquierda desde x = 10, y = 29).
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ass_document import EventRecord, StyleRecord
+from batch_layout import ScriptLayout, line_widths, shift_lines
+
+
+# Resolución que usa el render cuando el script no indica PlayResX/PlayResY
+DEFAULT_PLAY_RES = (384, 288)
+
+# Alignment inválido (fuera de 1-9): abajo al centro, el de ASS por defecto
+DEFAULT_ALIGNMENT = 2
+
+
+def resolve_play_res(play_res: Tuple[int, int]) -> Tuple[int, int]:
+    """Resolución efectiva: si falta un lado se deduce del otro, como en libass"""
+    x, y = play_res
+    if x <= 0 and y <= 0:
+        return DEFAULT_PLAY_RES
+    if y <= 0:
+        y = 1024 if x == 1280 else x * 3 // 4
+    elif x <= 0:
+        x = 1280 if y == 1024 else y * 4 // 3
+    return x, y
+
+
+def parse_play_res(value) -> Tuple[int, int]:
+    """Opción PLAY_RES ('1920x1080'); vacía o inválida = (0, 0), sin resolución"""
+    x, sep, y = str(value or '').strip().lower().partition('x')
+    try:
+        return (int(x), int(y)) if sep else (0, 0)
+    except ValueError:
+        return (0, 0)
+
+
+def format_play_res(play_res: Tuple[int, int]) -> str:
+    return f"{play_res[0]}x{play_res[1]}"
+
+
+def with_play_res(config: Dict[str, str], document) -> Dict[str, str]:
+    """Configuración con PLAY_RES del script, salvo que ya la indique
+
+    Así la resolución forma parte de config_hash y de las claves de caché.
+    """
+    if 'PLAY_RES' in config:
+        return config
+    return dict(config, PLAY_RES=format_play_res(document.play_res))
+
+
+class LineAnchor:
+    """Área útil de una línea (entre márgenes) y el centro vertical del texto"""
+
+    __slots__ = ('column', 'left', 'right', 'y')
+
+    def __init__(self, column: int, left: float, right: float, y: float):
+        self.column = column     # 0 izquierda, 1 centro, 2 derecha
+        self.left = left
+        self.right = right
+        self.y = y
+
+    @property
+    def width(self) -> float:
+        return self.right - self.left
+
+    def origin(self, line_width: float) -> float:
+        """Borde izquierdo de una línea de `line_width` píxeles"""
+        if self.column == 0:
+            return self.left
+        if self.column == 2:
+            return self.right - line_width
+        return self.left + (self.right - self.left - line_width) / 2
+
+    def __repr__(self):
+        return f"LineAnchor({self.column}, {self.left}, {self.right}, {self.y})"
+
+
+# Ubicación anterior a style_layout: izquierda desde x = 10, y = 29
+LEGACY_ANCHOR = LineAnchor(0, 10, 10, 29)
+
+
+@lru_cache(maxsize=1024)
+def line_anchor(alignment: int, margin_l: int, margin_r: int, margin_v: int, height: float,
+                play_res: Tuple[int, int]) -> LineAnchor:
+    """Anchor de una alineación \\an (1-9) con sus márgenes en una resolución
+
+    Abajo y arriba se respeta MarginV; al medio se centra en la pantalla,
+    como en el render.
+    """
+    if not 1 <= alignment <= 9:
+        alignment = DEFAULT_ALIGNMENT
+    width, screen_height = resolve_play_res(play_res)
+    row, column = divmod(alignment - 1, 3)
+    if row == 0:
+        y = screen_height - margin_v - height / 2
+    elif row == 1:
+        y = screen_height / 2
+    else:
+        y = margin_v + height / 2
+    return LineAnchor(column, margin_l, width - margin_r, y)
+
+
+def event_anchor(event: Optional[EventRecord], style: Optional[StyleRecord],
+                 play_res: Tuple[int, int]) -> LineAnchor:
+    """Anchor de un evento: márgenes de la línea (o del estilo) y alto del estilo
+
+    Sin estilo o sin PlayRes, LEGACY_ANCHOR; sin evento, márgenes 0.
+    """
+    if style is None or not any(play_res):
+        return LEGACY_ANCHOR
+    margins = (event.margin_l, event.margin_r, event.margin_v) if event is not None else (0, 0, 0)
+    return line_anchor(
+        style.alignment,
+        margins[0] or style.margin_l,
+        margins[1] or style.margin_r,
+        margins[2] or style.margin_v,
+        style.fontsize * style.scale_y / 100,
+        play_res,
+    )
+
+
+def place_lines(layout: ScriptLayout, anchors: Sequence[LineAnchor]) -> List[float]:
+    """Mover cada línea del layout (armado desde x = 0) a su anchor; devuelve la y de cada línea"""
+    shift_lines(layout, [anchor.origin(width) for anchor, width in zip(anchors, line_widths(layout))])
+    return [anchor.y for anchor in anchors]
@@ -0,0 +1,321 @@
+"""
+Optimizador de tags de las líneas generadas
+Recorre los bloques de override de cada línea Dialogue: y quita lo que no
+cambia el render: tags sin efecto (\\fad(0,0), valores iguales a los del
+estilo o a los ya vigentes), tags pisados por otro posterior en el mismo
+bloque, \\t que animan hacia el valor actual y bloques vacíos. También une
+bloques contiguos y acorta números y colores (\\bord2.0 -> \\bord2,
+&H00FFFFFF& -> &HFFFFFF&).
+
+Es una etapa opcional al final del pipeline (`process_effect.py --optimize`).
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ass_document import StyleRecord
+from override_tokens import Tag, tokenize_block
+
+
+# Tags de los que solo cuenta la primera aparición en la línea (grupo -> tags)
+FIRST_WINS = {'an': 'align', 'a': 'align', 'pos': 'position', 'move': 'position',
+              'org': 'origin', 'fad': 'fade', 'fade': 'fade'}
+
+# Propiedades que fija cada tag de override
+PROPERTIES: Dict[str, Tuple[str, ...]] = {
+    'bord': ('xbord', 'ybord'), 'xbord': ('xbord',), 'ybord': ('ybord',),
+    'shad': ('xshad', 'yshad'), 'xshad': ('xshad',), 'yshad': ('yshad',),
+    'blur': ('blur',), 'be': ('be',), 'fscx': ('fscx',), 'fscy': ('fscy',), 'fsp': ('fsp',),
+    'frx': ('frx',), 'fry': ('fry',), 'frz': ('frz',), 'fr': ('frz',),
+    'fax': ('fax',), 'fay': ('fay',), 'fs': ('fs',),
+    'c': ('1c',), '1c': ('1c',), '2c': ('2c',), '3c': ('3c',), '4c': ('4c',),
+    'alpha': ('1a', '2a', '3a', '4a'), '1a': ('1a',), '2a': ('2a',), '3a': ('3a',), '4a': ('4a',),
+}
+
+ALL_PROPERTIES = frozenset(p for props in PROPERTIES.values() for p in props)
+
+COLOR_TAGS = {'c', '1c', '2c', '3c', '4c'}
+ALPHA_TAGS = {'alpha', '1a', '2a', '3a', '4a'}
+
+
+def _transform_args(tag: Tag) -> str:
+    """Argumentos de un \\t con su cuerpo ya optimizado"""
+    prefix = tag.args[:tag.args.find('\\')]
+    return prefix + ''.join(str(inner) for inner in tag.body)
+
+
+def _parse_number(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _format_number(number: float) -> str:
+    if number == int(number):
+        return str(int(number))
+    return repr(number)
+
+
+def _parse_hex(value: str, mask: int) -> Optional[int]:
+    try:
+        return int(value.strip('&Hh'), 16) & mask
+    except ValueError:
+        return None
+
+
+def _parse_value(tag: Tag):
+    """Valor normalizado del tag (número o entero de color/alpha), o None"""
+    if tag.name in COLOR_TAGS:
+        return _parse_hex(tag.value, 0xFFFFFF)
+    if tag.name in ALPHA_TAGS:
+        return _parse_hex(tag.value, 0xFF)
+    return _parse_number(tag.value)
+
+
+def _normalize(tag: Tag, value) -> None:
+    """Escribir el valor en su forma más corta"""
+    if tag.name in COLOR_TAGS:
+        tag.value = f"&H{value:X}&"
+    elif tag.name in ALPHA_TAGS:
+        tag.value = f"&H{value:02X}&"
+    else:
+        tag.value = _format_number(value)
+
+
+def style_state(style: Optional[StyleRecord]) -> Dict[str, object]:
+    """Valores de cada propiedad al comienzo de una línea con este estilo"""
+    if style is None:
+        return {}
+    return {
+        'xbord': style.outline, 'ybord': style.outline,
+        'xshad': style.shadow, 'yshad': style.shadow,
+        'blur': 0.0, 'be': 0.0, 'frx': 0.0, 'fry': 0.0, 'fax': 0.0, 'fay': 0.0,
+        'fscx': style.scale_x, 'fscy': style.scale_y, 'fsp': style.spacing,
+        'frz': style.angle, 'fs': style.fontsize,
+        '1c': style.primary_colour & 0xFFFFFF, '2c': style.secondary_colour & 0xFFFFFF,
+        '3c': style.outline_colour & 0xFFFFFF, '4c': style.back_colour & 0xFFFFFF,
+        '1a': style.primary_colour >> 24, '2a': style.secondary_colour >> 24,
+        '3a': style.outline_colour >> 24, '4a': style.back_colour >> 24,
+    }
+
+
+class OptimizerStats:
+    """Bytes y tags antes y después de optimizar"""
+
+    def __init__(self):
+        self.lines = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.tags_before = 0
+        self.tags_after = 0
+
+    def report(self) -> str:
+        saved = self.bytes_before - self.bytes_after
+        percent = saved / self.bytes_before * 100 if self.bytes_before else 0.0
+        return (f"Optimizador: {self.lines} lineas, {saved} bytes menos ({percent:.1f}%), "
+                f"{self.tags_before - self.tags_after} tags menos "
+                f"({self.tags_before} -> {self.tags_after})")
+
+
+def _count_tags(tags: List[Tag]) -> int:
+    return sum(1 + (len(tag.body) if tag.body else 0) for tag in tags)
+
+
+class TagOptimizer:
+    """Quita tags redundantes de las líneas Dialogue: generadas"""
+
+    def __init__(self, styles: Optional[Dict[str, StyleRecord]] = None):
+        # Se guarda la referencia: en streaming los estilos se llenan después
+        self.styles = styles if styles is not None else {}
+        self.stats = OptimizerStats()
+
+    def optimize_lines(self, lines: Iterable[str]) -> Iterator[str]:
+        for line in lines:
+            yield self.optimize_line(line)
+
+    def optimize_line(self, line: str) -> str:
+        if not line.startswith('Dialogue:'):
+            return line
+        # El texto empieza después de la 9.ª coma
+        pos = 0
+        for _ in range(9):
+            pos = line.find(',', pos) + 1
+            if pos == 0:
+                return line
+        prefix, text = line[:pos], line[pos:]
+        style_name = prefix.split(',', 4)[3]
+        style = self.styles.get(style_name)
+
+        optimized = self.optimize_text(text, style)
+        stats = self.stats
+        stats.lines += 1
+        stats.bytes_before += len(line.encode('utf-8'))
+        result = prefix + optimized
+        stats.bytes_after += len(result.encode('utf-8'))
+        return result
+
+    def optimize_text(self, text: str, style: Optional[StyleRecord] = None) -> str:
+        """Optimizar los bloques de override del texto de una línea"""
+        parts = _split_text(text)
+        state = style_state(style)
+        alignment = style.alignment if style else None
+        seen_first = set()
+        out = []
+        for kind, content in parts:
+            if kind == 'text':
+                out.append(content)
+                continue
+            tags = tokenize_block(content)
+            if tags is None:
+                # Comentario u otro contenido: se deja tal cual
+                out.append('{' + content + '}')
+                continue
+            self.stats.tags_before += _count_tags(tags)
+            tags = _drop_shadowed(tags)
+            tags = _static_moves(tags)
+            tags = self._apply(tags, state, seen_first, alignment)
+            self.stats.tags_after += _count_tags(tags)
+            if tags:
+                out.append('{' + ''.join(str(tag) for tag in tags) + '}')
+        return ''.join(out)
+
+    def _apply(self, tags: List[Tag], state: Dict, seen_first: set, alignment: Optional[int]) -> List[Tag]:
+        """Recorrer el bloque en orden quitando tags sin efecto y actualizando el estado"""
+        kept = []
+        for tag in tags:
+            name = tag.name
+            group = FIRST_WINS.get(name)
+            if group is not None:
+                if group in seen_first:
+                    continue
+                seen_first.add(group)
+                if _first_tag_is_noop(tag, alignment):
+                    continue
+                kept.append(tag)
+                continue
+
+            if name == 't':
+                if tag.body is None:
+                    kept.append(tag)
+                    continue
+                body = []
+                for inner in tag.body:
+                    props = PROPERTIES.get(inner.name)
+                    value = _parse_value(inner) if props else None
+                    if value is not None and all(state.get(p) == value for p in props):
+                        continue  # anima hacia el valor que ya tiene
+                    if value is not None:
+                        _normalize(inner, value)
+                    body.append(inner)
+                if not body:
+                    continue
+                tag.body = body
+                tag.args = _transform_args(tag)
+                for inner in body:
+                    for prop in PROPERTIES.get(inner.name, ()):
+                        state[prop] = None
+                kept.append(tag)
+                continue
+
+            if name == 'r':
+                # Vuelve al estilo de la línea; con otro estilo el estado queda desconocido
+                state.clear()
+                kept.append(tag)
+                continue
+
+            props = PROPERTIES.get(name)
+            if props is None:
+                kept.append(tag)
+                continue
+            value = _parse_value(tag)
+            if value is None:
+                for prop in props:
+                    state[prop] = None
+                kept.append(tag)
+                continue
+            if all(state.get(p) == value for p in props):
+                continue
+            _normalize(tag, value)
+            for prop in props:
+                state[prop] = value
+            kept.append(tag)
+        return kept
+
+
+def _first_tag_is_noop(tag: Tag, alignment: Optional[int]) -> bool:
+    """\\an igual al del estilo o \\fad(0,0)"""
+    if tag.name == 'an':
+        return alignment is not None and _parse_number(tag.value) == alignment
+    if tag.name == 'fad' and tag.args is not None:
+        values = [_parse_number(v) for v in tag.args.split(',')]
+        return len(values) == 2 and values[0] == 0 and values[1] == 0
+    return False
+
+
+def _static_moves(tags: List[Tag]) -> List[Tag]:
+    """Cambiar cada \\move sin desplazamiento por el \\pos equivalente"""
+    result = []
+    for tag in tags:
+        if tag.name == 'move' and tag.args is not None:
+            args = [v.strip() for v in tag.args.split(',')]
+            if len(args) in (4, 6):
+                x1, y1, x2, y2 = (_parse_number(v) for v in args[:4])
+                if x1 is not None and x1 == x2 and y1 == y2:
+                    tag = Tag('pos', args=f"{args[0]},{args[1]}")
+        result.append(tag)
+    return result
+
+
+def _drop_shadowed(tags: List[Tag]) -> List[Tag]:
+    """Quitar tags cuyas propiedades vuelve a fijar un tag posterior del mismo bloque"""
+    set_later = set()
+    kept = []
+    for tag in reversed(tags):
+        if tag.name == 't' and tag.body is not None:
+            body = [inner for inner in tag.body
+                    if not (PROPERTIES.get(inner.name) and set_later.issuperset(PROPERTIES[inner.name]))]
+            if not body:
+                continue
+            if len(body) != len(tag.body):
+                tag.body = body
+                tag.args = _transform_args(tag)
+            kept.append(tag)
+            continue
+        if tag.name == 'r':
+            # \r devuelve todo al estilo: lo anterior del bloque no tiene efecto
+            set_later.update(ALL_PROPERTIES)
+            kept.append(tag)
+            continue
+        props = PROPERTIES.get(tag.name)
+        if props and _parse_value(tag) is not None:
+            if set_later.issuperset(props):
+                continue
+            set_later.update(props)
+        kept.append(tag)
+    kept.reverse()
+    return kept
+
+
+def _split_text(text: str) -> List[Tuple[str, str]]:
+    """Partes ('block' | 'text', contenido); bloques contiguos quedan unidos"""
+    parts: List[Tuple[str, str]] = []
+    pos = 0
+    while pos < len(text):
+        start = text.find('{', pos)
+        if start == -1:
+            parts.append(('text', text[pos:]))
+            break
+        end = text.find('}', start)
+        if end == -1:
+            parts.append(('text', text[pos:]))
+            break
+        if start > pos:
+            parts.append(('text', text[pos:start]))
+        block = text[start + 1:end]
+        if parts and parts[-1][0] == 'block' and tokenize_block(block) is not None \
+                and tokenize_block(parts[-1][1]) is not None:
+            parts[-1] = ('block', parts[-1][1] + block)
+        else:
+            parts.append(('block', block))
+        pos = end + 1
+    return parts
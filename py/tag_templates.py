@@ -0,0 +1,149 @@
+"""
+Plantillas de tags precompiladas
+Dado un EffectConfig (o la configuración de la GUI para el lead-in simple),
+arma una sola vez todos los fragmentos que no cambian entre sílabas y deja
+formateadores que solo reciben tiempos, posiciones y texto.
+"""
+
+from typing import Callable, Dict, Optional, Tuple
+
+from frame_timing import FrameTiming, frame_timing, resolve_fps
+
+
+def hex_to_ass(hex_color: str) -> str:
+    """Convertir HEX a formato ASS (&HBBGGRR&)"""
+    hex_color = hex_color.lstrip('#')
+    r, g, b = hex_color[0:2], hex_color[2:4], hex_color[4:6]
+    return f"&H00{b}{g}{r}&"
+
+
+def _literal(text: str) -> str:
+    """Escapar un fragmento constante para usarlo dentro de str.format"""
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+class LayerTemplates:
+    """Formateadores de las 3 capas de MultiLayerEffectGenerator
+
+    layer1(start, end, style, x, y, text)
+    layer2(start, end, style, entry_x, entry_y, x, y, rotation, char)
+    layer3(start, end, style, x, y_from, y, text)
+
+    Con `timing` las duraciones de \\t, \\move y \\fad se redondean a cuadros.
+    """
+
+    def __init__(self, config, timing: Optional[FrameTiming] = None):
+        c = config
+        self.base_tags = (
+            f"\\blur{c.blur}"
+            f"\\bord{c.border_size}"
+            f"\\shad{c.shadow_size}"
+            f"\\3c{hex_to_ass(c.border_color)}"
+            f"\\c{hex_to_ass(c.primary_color)}"
+        )
+        base = _literal(self.base_tags)
+        entry = c.entry_duration
+        half_dur = c.highlight_duration // 2
+        highlight_dur = c.highlight_duration
+        fade_out = c.fade_out_duration
+        settle = 100
+        if timing is not None:
+            entry, half_dur, highlight_dur, fade_out, settle = (
+                timing.snap_duration(value) for value in (entry, half_dur, highlight_dur, fade_out, settle)
+            )
+
+        self.layer1: Callable[..., str] = (
+            "Dialogue: 1,{0},{1},{2},,0,0,0,fx,"
+            "{{\\an5\\pos({3:.0f},{4:.0f})"
+            f"\\fad(0,{fade_out})"
+            f"{base}}}}}{{5}}"
+        ).format
+
+        self.layer2: Callable[..., str] = (
+            "Dialogue: 2,{0},{1},{2},,0,0,0,fx,"
+            f"{{{{{base}"
+            "\\an5\\move({3:.0f},{4:.0f},{5:.0f},{6:.0f},"
+            f"0,{entry})\\fad({entry},0)"
+            "\\frz{7}"
+            f"\\t(0,{entry},\\frz0)}}}}{{8}}"
+        ).format
+
+        highlight = _literal(
+            f"\\fscx{c.highlight_scale_x}\\fscy{c.highlight_scale_y}"
+            f"\\bord3\\blur4"
+            f"\\3c{hex_to_ass(c.highlight_border_color)}"
+            f"\\xshad0\\yshad-4"
+            f"\\4c{hex_to_ass(c.highlight_shadow_color)}"
+            f"\\t(0,{half_dur},\\frz{c.highlight_rotation}"
+            f"\\fry{c.highlight_perspective_y}\\frx{c.highlight_perspective_x})"
+            f"\\t({half_dur},{highlight_dur},\\c{hex_to_ass(c.primary_color)})"
+            f"\\t({settle},{highlight_dur},\\fscx100\\fscy100\\fry0\\frz0\\frx0)"
+        )
+        self.layer3: Callable[..., str] = (
+            "Dialogue: 3,{0},{1},{2},,0,0,0,fx,"
+            "{{\\an5\\move({3:.0f},{4:.0f},{3:.0f},{5:.0f})"
+            f"{highlight}}}}}{{6}}"
+        ).format
+
+
+def _lead_in_tags(config: Dict[str, str]) -> str:
+    """Tags del lead-in después de \\pos, ya escapados para str.format"""
+    fade_in = int(config.get('ENTRY_DURATION', 300))
+    fade_out = int(config.get('FADEOUT_DURATION', 300))
+    fps = resolve_fps(config.get('FPS'))
+    if fps:
+        timing = frame_timing(fps)
+        fade_in, fade_out = timing.snap_duration(fade_in), timing.snap_duration(fade_out)
+    return _literal(
+        f"\\fad({fade_in},{fade_out})"
+        f"\\blur{config.get('BLUR', '3')}"
+        f"\\bord{config.get('BORDER_SIZE', '2')}"
+        f"\\shad{config.get('SHADOW_SIZE', '0')}"
+        f"\\c{hex_to_ass(config.get('PRIMARY_COLOR', '#FFFFFF'))}"
+        f"\\3c{hex_to_ass(config.get('BORDER_COLOR', '#FC76F2'))}"
+        f"\\4c{hex_to_ass(config.get('SHADOW_COLOR', '#000000'))}"
+    )
+
+
+def compile_lead_in(config: Dict[str, str]) -> Callable[..., str]:
+    """Formateador del lead-in de process_effect:
+    f(layer, start, end, style, x, y, text)
+
+    Con FPS (ya resuelto a un número) el \\fad se redondea a cuadros.
+    """
+    return (
+        "Dialogue: {0},{1},{2},{3},,0,0,0,fx,"
+        "{{\\an5\\pos({4:.0f},{5:.0f})"
+        f"{_lead_in_tags(config)}}}}}{{6}}"
+    ).format
+
+
+def compile_lead_in_text(config: Dict[str, str]) -> Callable[..., str]:
+    """Solo el campo Text del lead-in: f(x, y, text)"""
+    return (
+        "{{\\an5\\pos({0:.0f},{1:.0f})"
+        f"{_lead_in_tags(config)}}}}}{{2}}"
+    ).format
+
+
+_lead_in_cache: Dict[Tuple, Callable[..., str]] = {}
+
+
+def _memoized(compile_template: Callable, config: Dict[str, str]) -> Callable[..., str]:
+    key = (compile_template, tuple(sorted(config.items())))
+    template = _lead_in_cache.get(key)
+    if template is None:
+        if len(_lead_in_cache) > 64:
+            _lead_in_cache.clear()
+        template = _lead_in_cache[key] = compile_template(config)
+    return template
+
+
+def lead_in_template(config: Dict[str, str]) -> Callable[..., str]:
+    """compile_lead_in memorizado por el contenido de la configuración"""
+    return _memoized(compile_lead_in, config)
+
+
+def lead_in_text_template(config: Dict[str, str]) -> Callable[..., str]:
+    """compile_lead_in_text memorizado por el contenido de la configuración"""
+    return _memoized(compile_lead_in_text, config)
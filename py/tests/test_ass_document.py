@@ -0,0 +1,120 @@
+import pytest
+
+import ass_document
+from ass_document import DEFAULT_EVENT_FORMAT, ASSDocument, EventRecord, raw_event_style
+
+
+SCRIPT = """\ufeff[Script Info]
+PlayResX: 1920
+PlayResY: 1080
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,40,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,-1,0,0,0,100,110,0,0,1,2,0,8,10,20,30,1
+Style: Other,Arial,30,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,2,10,10,10,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+Dialogue: 0,0:00:01.00,0:00:03.00,Default,,0,0,0,,{\\k20}ka{\\k30}ra  
+Comment: 0,0:00:03.00,0:00:04.00,Default,,0,0,0,,comentario
+Dialogue: 1,0:00:04.00,0:00:05.50,Other,Actor,5,6,7,fx,uno, dos, tres
+"""
+
+
+def load(tmp_path, text=SCRIPT, encoding='utf-8', newline='\n'):
+    path = tmp_path / 'script.ass'
+    path.write_bytes(text.replace('\n', newline).encode(encoding))
+    return ASSDocument.load(str(path))
+
+
+def test_script_info_and_styles(tmp_path):
+    document = load(tmp_path)
+    assert document.play_res == (1920, 1080)
+    assert document.style_names() == ['Default', 'Other']
+    style = document.styles['Default']
+    assert (style.fontsize, style.scale_y, style.bold, style.alignment) == (40.0, 110.0, True, 8)
+    assert (style.margin_l, style.margin_r, style.margin_v) == (10, 20, 30)
+
+
+def test_events_keep_text_as_written(tmp_path):
+    for newline in ('\n', '\r\n'):
+        document = load(tmp_path, newline=newline)
+        first, comment, last = document.events
+        assert first.text == "{\\k20}ka{\\k30}ra  "
+        assert (first.start_ms, first.end_ms) == (1000, 3000)
+        assert comment.comment
+        assert (last.layer, last.name, last.margin_v, last.effect) == (1, 'Actor', 7, 'fx')
+        assert last.text == "uno, dos, tres"
+        assert [event.text for event in document.dialogues('Default')] == [first.text]
+
+
+def test_latin1_fallback(tmp_path):
+    document = load(tmp_path, SCRIPT.replace('\ufeff', '').replace('uno', 'año'), encoding='latin-1')
+    assert document.events[-1].text == "año, dos, tres"
+
+
+def test_event_format_order_and_style_filter():
+    document = ASSDocument()
+    lines = ["[Events]", "Format: Layer, Style, Start, End, Name, MarginL, MarginR, MarginV, Effect, Text",
+             "Dialogue: 0,Other,0:00:01.00,0:00:02.00,,0,0,0,,a",
+             "Dialogue: 0,Default,0:00:02.00,0:00:03.00,,0,0,0,,b"]
+    events = list(document.feed(lines, style='Default'))
+    assert [(event.style, event.start_ms, event.text) for event in events] == [('Default', 2000, 'b')]
+    assert EventRecord.from_line("Dialogue: 0,0:00:01.00") is None
+    assert EventRecord.from_line("Style: Default,Arial") is None
+
+
+# Estilos con espacios (y uno con coma, que en ASS parte el campo)
+STYLE_LINES = [
+    "Dialogue: 0,0:00:01.00,0:00:02.00,Romaji Top,,0,0,0,,a",
+    "Dialogue: 0,0:00:01.00,0:00:02.00, Romaji,,0,0,0,,b",
+    "Dialogue: 0,0:00:01.00,0:00:02.00,Romaji ,,0,0,0,,c",
+    "Comment: 0,0:00:02.00,0:00:03.00,Romaji Top,,0,0,0,,d",
+    "Dialogue: 0,0:00:02.00,0:00:03.00,Kanji,Actor,0,0,0,,e, con, comas",
+    "Dialogue: 0,0:00:02.00,0:00:03.00,Mi,estilo,0,0,0,,f",
+    "Dialogue:0,0:00:02.00,0:00:03.00,Romaji Top,,0,0,0,,g",
+]
+
+
+@pytest.mark.parametrize('line', STYLE_LINES)
+def test_raw_event_style_matches_parsed_style(line):
+    style_field = DEFAULT_EVENT_FORMAT.index('Style')
+    assert raw_event_style(line, style_field) == EventRecord.from_line(line).style
+
+
+def test_raw_event_style_with_style_first_and_missing_fields():
+    line = "Dialogue:  Romaji Top,0,0:00:01.00,0:00:02.00,,0,0,0,,a"
+    assert raw_event_style(line, 0) == 'Romaji Top'
+    assert raw_event_style("Dialogue: 0,0:00:01.00,0:00:02.00", 3) is None
+    assert raw_event_style("Dialogue: 0,0:00:01.00,0:00:02.00,Romaji", 3) is None
+
+
+def test_style_filter_skips_other_styles_without_parsing(monkeypatch):
+    parsed = []
+    from_line = EventRecord.from_line.__func__
+
+    def counting_from_line(cls, line, *args):
+        parsed.append(line)
+        return from_line(cls, line, *args)
+    monkeypatch.setattr(ass_document.EventRecord, 'from_line', classmethod(counting_from_line))
+
+    document = ASSDocument()
+    events = list(document.feed(['[Events]'] + STYLE_LINES, style='Romaji Top'))
+    assert [event.text for event in events] == ['a', 'd', 'g']
+    assert parsed == [STYLE_LINES[0], STYLE_LINES[3], STYLE_LINES[6]]
+    # Los comentarios se guardan pero dialogues() no los devuelve
+    assert [event.text for event in document.dialogues('Romaji Top')] == ['a', 'g']
+    assert document.dialogues('Romaji') == []
+    assert [event.text for event in document.dialogues()] == ['a', 'g']
+
+
+def test_style_filter_with_spaces_and_commas():
+    for style, texts in ((' Romaji', ['b']), ('Romaji ', ['c']), ('Romaji', []),
+                         ('Kanji', ['e, con, comas']), ('Mi', ['f']), ('Mi,estilo', [])):
+        document = ASSDocument()
+        events = list(document.feed(['[Events]'] + STYLE_LINES, style=style))
+        assert [event.text for event in events] == texts
+        # Sin filtro, el índice por estilo da lo mismo
+        full = ASSDocument()
+        list(full.feed(['[Events]'] + STYLE_LINES))
+        assert [event.text for event in full.dialogues(style)] == texts
@@ -0,0 +1,64 @@
+import pytest
+
+from ass_document import ASSDocument
+from ass_reader import ASSReader, find_sections, section_header
+
+
+STYLE_FORMAT = ("Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, "
+                "BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, "
+                "BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding")
+STYLE = "Style: Default,Arial,40,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,2,10,10,30,1"
+EVENT_FORMAT = "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
+DIALOGUE = "Dialogue: 0,0:00:01.00,0:00:03.00,Default,,0,0,0,,{\\k20}ka{\\k30}ra"
+
+# Líneas uuencode que empiezan con '[' (un carácter válido del uuencode)
+FONTS = ["[Fonts]", "fontname: font_0.ttf", "[EVENTS]M0(/,@", "[[Q]!<5", "[ABC]", "M0(/,@[!<5"]
+
+
+def script(*sections):
+    lines = ["[Script Info]", "PlayResX: 1280", "PlayResY: 720", "",
+             "[V4+ Styles]", STYLE_FORMAT, STYLE, ""]
+    for section in sections:
+        lines.extend(section)
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+@pytest.mark.parametrize('line, name', [
+    ("[Events]", "[events]"),
+    ("  [V4+ Styles]  ", "[v4+ styles]"),
+    ("[Aegisub Project Garbage]", "[aegisub project garbage]"),
+    ("[Custom data]", "[custom data]"),
+    ("[ABC]", None),
+    ("[[Q]!<5", None),
+    ("[Events] extra", None),
+])
+def test_section_header(line, name):
+    assert section_header(line) == name
+
+
+def test_embedded_fonts_do_not_split_sections(tmp_path):
+    path = tmp_path / 'fonts.ass'
+    text = script(FONTS, ["[Events]", EVENT_FORMAT, DIALOGUE])
+    path.write_bytes(text.encode('utf-8'))
+
+    names = [name for name, _, _ in find_sections(path.read_bytes())]
+    assert names == ['[script info]', '[v4+ styles]', '[fonts]', '[events]']
+
+    lines = list(ASSReader(str(path)).iter_lines())
+    assert not any(line in FONTS for line in lines)
+    assert DIALOGUE in lines
+
+
+def test_document_after_embedded_fonts(tmp_path):
+    path = tmp_path / 'fonts.ass'
+    # Eventos antes y después de [Fonts]: el uuencode no cambia de sección
+    path.write_text(script(["[Events]", EVENT_FORMAT, DIALOGUE], FONTS), encoding='utf-8')
+    document = ASSDocument.load(str(path))
+    assert document.play_res == (1280, 720)
+    assert [event.text for event in document.events] == ["{\\k20}ka{\\k30}ra"]
+
+    streamed = ASSDocument()
+    list(streamed.feed(script(FONTS, ["[Events]", EVENT_FORMAT, DIALOGUE]).splitlines()))
+    assert len(streamed.events) == 1
+    assert '[events]m0(/,@' not in streamed.sections
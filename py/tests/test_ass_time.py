@@ -0,0 +1,61 @@
+import re
+
+import pytest
+
+from ass_time import format_time, parse_time
+
+
+def regex_parse_time(time_str):
+    """Parseo anterior a ass_time (karaoke_processor y process_effect)"""
+    match = re.match(r'(\d+):(\d+):(\d+)\.(\d+)', time_str)
+    if match:
+        h, m, s, cs = map(int, match.groups())
+        return (h * 3600 + m * 60 + s) * 1000 + cs * 10
+    return 0
+
+
+@pytest.mark.parametrize('text, ms', [
+    ('0:00:00.00', 0),
+    ('0:00:01.50', 1500),
+    ('0:00:01.5', 1050),
+    ('0:00:01.05', 1050),
+    ('0:00:01.123', 2230),
+    ('1:02:03.04', 3723040),
+    ('10:00:00.00', 36000000),
+    ('0:0:1.00', 1000),
+    ('0:00:01.50abc', 1500),
+    ('0:00:01.5:7', 1050),
+])
+def test_parse_time(text, ms):
+    assert parse_time(text) == ms
+    assert parse_time(text) == regex_parse_time(text)
+
+
+@pytest.mark.parametrize('text', [
+    '', '0:00:01', '0:00', '1.5', 'a:bb:cc.dd', '0:00:-1.00', '-0:00:01.00',
+    ' 0:00:01.00', '0:00:01.', '0:00:.50', '0:00:01,50', '0:00:01.5x0',
+])
+def test_malformed_times_match_the_previous_parser(text):
+    assert parse_time(text) == regex_parse_time(text)
+
+
+@pytest.mark.parametrize('ms, text', [
+    (0, '0:00:00.00'),
+    (-250, '0:00:00.00'),
+    (1059, '0:00:01.05'),
+    (59999, '0:00:59.99'),
+    (3723040, '1:02:03.04'),
+    (36000000, '10:00:00.00'),
+    (1234.9, '0:00:01.23'),
+])
+def test_format_time(ms, text):
+    assert format_time(ms) == text
+
+
+def test_round_trip():
+    for cs in range(0, 400000, 7):
+        text = format_time(cs * 10)
+        assert parse_time(text) == cs * 10
+        assert format_time(parse_time(text)) == text
+    # Los ms se truncan a centésimas
+    assert parse_time(format_time(1999)) == 1990
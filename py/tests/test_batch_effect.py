@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+import batch_effect
+from batch_effect import BatchOptions, StyleJob, load_manifest, process_script, run_batch
+
+
+HEADER = """[Script Info]
+PlayResX: 1280
+PlayResY: 720
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Romaji,Arial,40,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,8,10,10,30,1
+Style: Kanji,Arial,30,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,2,10,10,10,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def write_script(path, lines):
+    events = []
+    for n in range(lines):
+        events.append(f"Dialogue: 0,0:00:{2 * n:02d}.00,0:00:{2 * n + 2:02d}.00,Romaji,,0,0,0,,"
+                      f"{{\\k20}}ka{{\\k30}}ra{{\\k25}}o{{\\k40}}ke{n}")
+        events.append(f"Dialogue: 0,0:00:{2 * n:02d}.00,0:00:{2 * n + 2:02d}.00,Kanji,,0,0,0,,"
+                      f"{{\\k20}}空{{\\k30}}{n}")
+    path.write_text(HEADER + '\n'.join(events) + '\n', encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def batch(tmp_path):
+    scripts = [write_script(tmp_path / 'ep01.ass', 3), write_script(tmp_path / 'ep02.ass', 5)]
+    (tmp_path / 'romaji.txt').write_text("FONT_METRICS:0\n", encoding='utf-8')
+    (tmp_path / 'kanji.txt').write_text("FONT_METRICS:0\nFPS:23.976\n", encoding='utf-8')
+    manifest = tmp_path / 'lote.json'
+    manifest.write_text(json.dumps({
+        'scripts': ['ep*.ass'],
+        'styles': {
+            'Romaji': 'romaji.txt',
+            'Kanji': {'config_file': 'kanji.txt', 'generator': 'multi_layer', 'seed': 1},
+        },
+        'output_dir': 'fx',
+    }), encoding='utf-8')
+    return tmp_path, scripts, str(manifest)
+
+
+def read_output(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def test_manifest_expands_scripts_and_styles(batch):
+    tmp_path, scripts, manifest = batch
+    found, jobs, options = load_manifest(manifest)
+    assert found == scripts
+    assert [(job.style, job.generator, job.seed) for job in jobs] == [('Romaji', 'lead_in', None), ('Kanji', 'multi_layer', 1)]
+    assert all(job.config['SELECTED_STYLE'] == job.style for job in jobs)
+    assert options.output_dir == str(tmp_path / 'fx')
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_multi_script_multi_style_run(batch, workers):
+    _, _, manifest = batch
+    scripts, jobs, options = load_manifest(manifest)
+    results = list(run_batch(scripts, jobs, options, workers))
+    assert [(r.ass_file, r.style) for r in results] == [(s, j.style) for s in scripts for j in jobs]
+    assert not any(r.error for r in results)
+    # 4 sílabas lead-in por línea Romaji; 2 sílabas x 3 capas por línea Kanji,
+    # menos la entrada de la primera sílaba (empieza en 0 y no llega a un cuadro)
+    assert [r.lines for r in results] == [12, 15, 20, 25]
+    for r in results:
+        output = read_output(r.output_file)
+        assert output.count('Dialogue:') == r.lines
+        assert all(f',{r.style},' in line for line in output.splitlines())
+
+    serial = list(run_batch(scripts, jobs, options, 1))
+    assert [read_output(r.output_file) for r in serial] == [read_output(r.output_file) for r in results]
+
+
+def test_per_job_errors_do_not_stop_the_batch(batch):
+    tmp_path, scripts, manifest = batch
+    _, jobs, options = load_manifest(manifest)
+    # Sin el directorio {style}/ solo falla la escritura de Kanji
+    (tmp_path / 'fx' / 'Romaji').mkdir(parents=True)
+    options.output = '{style}/{stem}.txt'
+    missing = str(tmp_path / 'ep99.ass')
+    results = list(run_batch(scripts[:1] + [missing], jobs, options))
+    assert [(r.style, bool(r.error)) for r in results] == [
+        ('Romaji', False), ('Kanji', True), ('Romaji', True), ('Kanji', True)]
+    assert results[0].lines == 12
+    assert 'ep99.ass' in results[2].error
+
+
+def test_cache_hits_on_second_run(batch):
+    tmp_path, _, manifest = batch
+    scripts, jobs, options = load_manifest(manifest)
+    options.cache_dir = str(tmp_path / 'cache')
+    first = list(run_batch(scripts, jobs, options))
+    outputs = [read_output(r.output_file) for r in first]
+    # Las 3 primeras líneas de ep02 son iguales a las de ep01
+    assert [r.cache_hits for r in first] == [0, 0, 3, 3]
+    assert [r.cache_misses for r in first] == [3, 3, 2, 2]
+
+    second = list(run_batch(scripts, jobs, options, 2))
+    assert [r.cache_hits for r in second] == [3, 3, 5, 5]
+    assert [r.cache_misses for r in second] == [0, 0, 0, 0]
+    assert [read_output(r.output_file) for r in second] == outputs
+
+
+def test_font_metrics_are_saved_after_each_script(batch, monkeypatch):
+    tmp_path, scripts, _ = batch
+    saved = []
+    monkeypatch.setattr(batch_effect, 'save_default_metrics', lambda: saved.append(True))
+    job = StyleJob('Romaji', {'FONT_METRICS': '0', 'SELECTED_STYLE': 'Romaji'})
+    options = BatchOptions(output_dir=str(tmp_path))
+    process_script((scripts[0], [job], options))
+    assert saved == [True]
+
+    def fail(*args):
+        raise RuntimeError('boom')
+    monkeypatch.setattr(batch_effect, '_generate', fail)
+    with pytest.raises(RuntimeError):
+        process_script((scripts[0], [job], options))
+    assert saved == [True, True]
@@ -0,0 +1,212 @@
+import random
+
+import pytest
+
+import batch_layout
+import fx_random
+from batch_layout import CharWidths, layout_lines
+from effects import MultiLayerEffectGenerator
+from process_effect import clear_style_widths, get_style_widths, process_dialogue_lines
+from ass_document import ASSDocument, EventRecord
+
+
+class FakeMeasurer:
+    """Avances y kerning fraccionarios, para que el orden de las sumas importe"""
+
+    def char_width(self, char):
+        return 7.3 + (ord(char) % 11) * 0.37
+
+    def kerning(self, previous, char):
+        return ((ord(previous) * 31 + ord(char)) % 7 - 3) * 0.113
+
+
+def karaoke_texts(lines=60, seed=3):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(lines):
+        parts = []
+        for _ in range(rng.randint(1, 14)):
+            # Algunas sílabas largas: más de 8 caracteres cambia el orden de np.add.reduce
+            syllable = ''.join(rng.choice('aeiouknstmr') for _ in range(rng.choice((1, 2, 3, 12))))
+            parts.append(f"{{\\k{rng.randint(5, 60)}}}{syllable}{rng.choice(('', ' '))}")
+        texts.append(''.join(parts))
+    return texts
+
+
+def both_paths(monkeypatch, build):
+    pytest.importorskip('numpy')
+    monkeypatch.setattr(batch_layout, 'NUMPY_MIN_ITEMS', 0)
+    monkeypatch.setattr(batch_layout, 'USE_NUMPY', True)
+    monkeypatch.setattr(fx_random, 'USE_NUMPY', True)
+    with_numpy = build()
+    monkeypatch.setattr(batch_layout, 'USE_NUMPY', False)
+    monkeypatch.setattr(fx_random, 'USE_NUMPY', False)
+    return with_numpy, build()
+
+
+@pytest.mark.parametrize('skip_blank', [False, True])
+def test_numpy_positions_match_python(monkeypatch, skip_blank):
+    texts = karaoke_texts()
+    widths = CharWidths(lambda char: 9.5, FakeMeasurer())
+
+    def build():
+        return layout_lines(texts, [widths] * len(texts), 10.7, skip_blank, cache=None)
+
+    with_numpy, python = both_paths(monkeypatch, build)
+    for column in ('syl_start', 'syl_end', 'syl_width', 'syl_x', 'char_center'):
+        assert getattr(with_numpy, column) == getattr(python, column), column
+
+
+def test_numpy_output_matches_python(monkeypatch):
+    events = [
+        EventRecord(False, 0, '0:00:%02d.00' % n, '0:00:%02d.50' % (n + 3), 'Default', '', 0, 0, 0, '', text)
+        for n, text in enumerate(karaoke_texts(40))
+    ]
+
+    def build():
+        generator = MultiLayerEffectGenerator()
+        layers = list(generator.generate_lines(events, seed=5))
+        return layers + process_dialogue_lines(events, {'FONT_METRICS': '0'}, {})
+
+    with_numpy, python = both_paths(monkeypatch, build)
+    assert with_numpy == python
+
+
+def test_layout_cache_returns_same_layout():
+    texts = karaoke_texts(10) * 3
+    widths = CharWidths(lambda char: 9.5, FakeMeasurer())
+    cache = batch_layout.LayoutCache()
+    cached = layout_lines(texts, [widths] * len(texts), 0, cache=cache)
+    fresh = layout_lines(texts, [widths] * len(texts), 0, cache=None)
+    assert cached.syl_x == fresh.syl_x
+    assert cached.char_center == fresh.char_center
+    assert cache.stats() == {'hits': 20, 'misses': 10, 'entries': 10}
+
+
+def test_layout_cache_key_uses_char_widths_identity():
+    texts = karaoke_texts(4)
+    first = CharWidths(lambda char: 9.5)
+    # Mismas medidas pero otro objeto: no comparte entradas
+    second = CharWidths(lambda char: 9.5)
+    cache = batch_layout.LayoutCache()
+    layout_lines(texts, [first] * 4, 0, cache=cache)
+    layout_lines(texts, [second] * 4, 0, cache=cache)
+    assert cache.stats() == {'hits': 0, 'misses': 8, 'entries': 8}
+    layout_lines(texts, [first] * 2 + [second] * 2, 0, cache=cache)
+    assert cache.hits == 4
+    # El margen y skip_blank también son parte de la clave
+    layout_lines(texts[:1], [first], 10, cache=cache)
+    layout_lines(texts[:1], [first], 0, True, cache=cache)
+    assert cache.stats() == {'hits': 4, 'misses': 10, 'entries': 10}
+
+
+def test_layout_cache_evicts_least_recently_used():
+    widths = CharWidths(lambda char: 9.5)
+    texts = karaoke_texts(3)
+    cache = batch_layout.LayoutCache(max_entries=2)
+    layout_lines(texts[:2], [widths] * 2, 0, cache=cache)
+    layout_lines(texts[:1], [widths], 0, cache=cache)
+    layout_lines(texts[2:], [widths], 0, cache=cache)
+    assert len(cache) == 2
+    assert cache.get((texts[0], widths, 0, False)) is not None
+    assert cache.get((texts[1], widths, 0, False)) is None
+
+
+STYLE_HEADER = """[Script Info]
+PlayResX: 1280
+PlayResY: 720
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Romaji,Arial,{fontsize},&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,{spacing},0,1,2,0,8,10,10,30,1
+"""
+
+CACHE_EVENTS = [
+    EventRecord(False, 0, '0:00:01.00', '0:00:03.00', 'Romaji', '', 0, 0, 0, '', text)
+    for text in karaoke_texts(6, seed=11) * 2
+]
+
+
+def script_styles(fontsize=40, spacing=0):
+    document = ASSDocument()
+    list(document.feed(STYLE_HEADER.format(fontsize=fontsize, spacing=spacing).splitlines()))
+    return document.styles
+
+
+@pytest.fixture
+def shared_cache():
+    batch_layout.layout_cache.clear()
+    clear_style_widths()
+    yield batch_layout.layout_cache
+    batch_layout.layout_cache.clear()
+    clear_style_widths()
+
+
+def generate(styles, config):
+    # Cada lote pasa por la caché compartida de layout
+    return process_dialogue_lines(CACHE_EVENTS, dict(config, FONT_METRICS='0'), styles)
+
+
+def uncached(styles, config):
+    batch_layout.layout_cache.clear()
+    clear_style_widths()
+    return generate(styles, config)
+
+
+@pytest.mark.parametrize('changed', [{'fontsize': 52}, {'spacing': 3}])
+def test_style_change_invalidates_layouts(shared_cache, changed):
+    before = generate(script_styles(), {})
+    assert shared_cache.stats() == {'hits': 6, 'misses': 6, 'entries': 6}
+    after = generate(script_styles(**changed), {})
+    # Otro estilo, otros CharWidths: solo se reutilizan las repetidas del mismo lote
+    assert shared_cache.stats() == {'hits': 12, 'misses': 12, 'entries': 12}
+    assert after != before
+    assert after == uncached(script_styles(**changed), {})
+
+
+def test_font_change_invalidates_layouts(shared_cache):
+    styles = script_styles()
+    widths = get_style_widths(styles, 'Romaji', {'FONT_METRICS': '0'})
+    generate(styles, {})
+    assert get_style_widths(styles, 'Romaji', {'FONT_METRICS': '0'}) is widths
+    # Al cambiar las fuentes instaladas (refresh_fonts del servidor) se olvidan los anchos
+    clear_style_widths()
+    assert get_style_widths(styles, 'Romaji', {'FONT_METRICS': '0'}) is not widths
+    assert get_style_widths(styles, 'Romaji', {'FONT_METRICS': '1'}) is not widths
+    generate(styles, {})
+    assert shared_cache.misses == 12
+
+
+def test_play_res_change_reuses_layouts_without_stale_positions(shared_cache):
+    styles = script_styles()
+    small = generate(styles, {'PLAY_RES': '640x360'})
+    large = generate(styles, {'PLAY_RES': '1920x1080'})
+    # El layout se guarda desde x = 0: la ubicación por PlayRes se aplica después
+    assert shared_cache.stats() == {'hits': 18, 'misses': 6, 'entries': 6}
+    assert small != large
+    assert large == uncached(styles, {'PLAY_RES': '1920x1080'})
+    assert small == uncached(styles, {'PLAY_RES': '640x360'})
+
+
+def test_char_centers_include_kerning(monkeypatch):
+    measurer = FakeMeasurer()
+    widths = CharWidths(lambda char: 9.5, measurer)
+    # Un par con kerning y una sílaba muy larga (un grupo mucho más largo que el resto)
+    texts = ["{\\k20}AV{\\k30}ra", "{\\k10}" + "kanstmr" * 700 + "{\\k5}o"]
+
+    def build():
+        return layout_lines(texts, [widths] * len(texts), 10.7, False, cache=None)
+
+    with_numpy, python = both_paths(monkeypatch, build)
+    assert with_numpy.char_center == python.char_center
+    assert with_numpy.syl_width == python.syl_width
+
+    kern = measurer.kerning('A', 'V')
+    assert kern
+    first, second = python.char_center[:2]
+    assert second - first == pytest.approx(measurer.char_width('A') / 2 + kern + measurer.char_width('V') / 2)
+    # El último caracter de cada sílaba termina en su borde derecho
+    for j in range(len(python.syl_width)):
+        last = python.char_offsets[j + 1] - 1
+        right = python.syl_x[j] + python.syl_width[j] / 2
+        assert python.char_center[last] + python.char_advance[last] / 2 == pytest.approx(right)
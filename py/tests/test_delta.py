@@ -0,0 +1,54 @@
+from ass_document import EventRecord
+from process_effect import iter_delta_lines, iter_generated_blocks, read_keep_ids, write_manifest
+
+
+LINE = "Dialogue: 0,0:00:01.00,0:00:03.00,Default,,0,0,0,{source},{text}"
+CONFIG = {'FONT_METRICS': '0'}
+
+
+def events(*texts):
+    return [EventRecord.from_line(LINE.format(source=n, text=text)) for n, text in enumerate(texts, 1)]
+
+
+def blocks(*texts):
+    return [(dialogue.effect, block_id, lines)
+            for dialogue, block_id, lines in iter_generated_blocks(events(*texts), CONFIG, {})]
+
+
+def delta(texts, keep_ids):
+    manifest = []
+    lines = list(iter_delta_lines(iter_generated_blocks(events(*texts), CONFIG, {}), keep_ids, manifest))
+    return lines, manifest
+
+
+def test_block_ids_are_stable_and_unique_for_identical_lines():
+    first = blocks("{\\k20}ka{\\k30}ra", "{\\k20}ka{\\k30}ra", "{\\k25}o{\\k40}ke")
+    ids = [block_id for _, block_id, _ in first]
+    assert len(set(ids)) == 3
+    assert ids == [block_id for _, block_id, _ in blocks("{\\k20}ka{\\k30}ra", "{\\k20}ka{\\k30}ra",
+                                                           "{\\k25}o{\\k40}ke")]
+    # Sin una de las copias, el id de la segunda deja de usarse
+    remaining = [block_id for _, block_id, _ in blocks("{\\k20}ka{\\k30}ra", "{\\k25}o{\\k40}ke")]
+    assert remaining == [ids[0], ids[2]]
+
+
+def test_keep_ids_skip_blocks_already_in_script(tmp_path):
+    texts = ("{\\k20}ka{\\k30}ra", "{\\k25}o{\\k40}ke")
+    lines, manifest = delta(texts, set())
+    assert [count for _, _, count in manifest] == [2, 2]
+    assert all(line.split(',')[8] == f"fx:{manifest[n // 2][1]}" for n, line in enumerate(lines))
+
+    keep = tmp_path / 'keep.txt'
+    keep.write_text(f"{manifest[0][1]}\n\n", encoding='utf-8')
+    lines, kept = delta(texts, read_keep_ids(str(keep)))
+    assert [(source, count) for source, _, count in kept] == [('1', 0), ('2', 2)]
+    assert len(lines) == 2
+
+    path = tmp_path / 'manifest.txt'
+    write_manifest(str(path), kept)
+    assert path.read_text(encoding='utf-8').splitlines()[0] == f"1\t{manifest[0][1]}\t0"
+
+
+def test_missing_keep_ids_file_keeps_nothing(tmp_path):
+    assert read_keep_ids(None) == set()
+    assert read_keep_ids(str(tmp_path / 'missing.txt')) == set()
@@ -0,0 +1,133 @@
+import json
+import os
+import socket
+import stat
+import threading
+import time
+
+import effector_server
+from effector_server import PROTOCOL_VERSION, EffectorServer, handle_json_line
+from fx_binary import read_records
+
+
+SCRIPT = """[Script Info]
+PlayResX: 1280
+PlayResY: 720
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,40,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,2,10,10,30,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+Dialogue: 0,0:00:01.00,0:00:03.00,Default,,0,0,0,,{\\k20}ka{\\k30}ra{\\k25}o{\\k40}ke
+"""
+
+
+def test_ping_reports_protocol_version():
+    assert EffectorServer().handle({'cmd': 'ping'}) == {'ok': True, 'version': PROTOCOL_VERSION}
+
+
+def test_seed_from_json_string_is_coerced(tmp_path):
+    ass_file = tmp_path / 'script.ass'
+    ass_file.write_text(SCRIPT, encoding='utf-8')
+    server = EffectorServer()
+
+    def process(seed):
+        return server.handle({'cmd': 'process', 'ass_file': str(ass_file), 'generator': 'multi_layer',
+                              'config': {'FONT_METRICS': '0'}, 'seed': seed})['lines']
+
+    assert process('7') == process(7)
+
+
+def test_manifest_with_multi_layer_is_an_error(tmp_path):
+    ass_file = tmp_path / 'script.ass'
+    ass_file.write_text(SCRIPT, encoding='utf-8')
+    response = EffectorServer().handle({'cmd': 'process', 'ass_file': str(ass_file), 'generator': 'multi_layer',
+                                        'config': {'FONT_METRICS': '0'},
+                                        'manifest_file': str(tmp_path / 'manifest.txt')})
+    assert not response['ok']
+    assert not (tmp_path / 'manifest.txt').exists()
+
+
+def test_binary_delta_output_matches_text(tmp_path):
+    # La macro pide binario con protocolo delta: el servidor escribe registros sin reparsear
+    ass_file = tmp_path / 'script.ass'
+    ass_file.write_text(SCRIPT, encoding='utf-8')
+    server = EffectorServer()
+    base = {'cmd': 'process', 'ass_file': str(ass_file), 'config': {'FONT_METRICS': '0'},
+            'manifest_file': str(tmp_path / 'manifest.txt')}
+    text = server.handle(base)
+    binary_file = tmp_path / 'fx.bin'
+    response = server.handle(dict(base, format='binary', output_file=str(binary_file)))
+    assert response['ok'] and response['count'] == len(text['lines']) == 4
+    lines = [record.to_line() for record in read_records(binary_file.read_bytes())]
+    assert lines == text['lines']
+
+
+def test_version_mismatch_is_rejected():
+    server = EffectorServer()
+    response = server.handle({'cmd': 'ping', 'version': PROTOCOL_VERSION + 1})
+    assert not response['ok'] and response['version'] == PROTOCOL_VERSION
+    assert server.handle({'cmd': 'ping', 'version': str(PROTOCOL_VERSION)})['ok']
+    assert server.running
+
+
+def test_malformed_requests():
+    server = EffectorServer()
+    for raw in ('{"cmd": ', '[1, 2]', '"ping"', '{"cmd": "nada"}', '{"cmd": "process"}',
+                '{"cmd": "styles", "ass_file": "/no/existe.ass"}'):
+        response, close = handle_json_line(server, raw)
+        assert json.loads(response)['ok'] is False
+        assert not close
+    assert server.running
+
+
+def test_documents_are_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(effector_server, 'MAX_DOCUMENTS', 2)
+    server = EffectorServer()
+    paths = []
+    for n in range(3):
+        path = tmp_path / f'{n}.ass'
+        path.write_text(SCRIPT, encoding='utf-8')
+        paths.append(str(path))
+        server.load_document(paths[-1])
+    server.load_document(paths[1])
+    assert list(server._documents) == [paths[2], paths[1]]
+
+
+def test_socket_is_private(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    assert effector_server.default_socket_path() == str(tmp_path / 'pyfx.sock')
+    monkeypatch.delenv('XDG_RUNTIME_DIR')
+    assert 'pyfx-' in effector_server.default_socket_path()
+
+    socket_path = tmp_path / 'run' / 'pyfx.sock'
+    server = EffectorServer()
+    thread = threading.Thread(target=effector_server.serve_unix, args=(server, str(socket_path)))
+    thread.start()
+    try:
+        for _ in range(100):
+            if socket_path.exists():
+                break
+            time.sleep(0.01)
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+        assert stat.S_IMODE(os.stat(socket_path.parent).st_mode) == 0o700
+        with socket.socket(socket.AF_UNIX) as client:
+            client.connect(str(socket_path))
+            client.sendall(b'{"cmd": "shutdown", "close": true}\n')
+            assert json.loads(client.makefile().readline())['ok']
+    finally:
+        thread.join(5)
+    assert not socket_path.exists()
+
+
+def test_font_refresh_clears_derived_state(monkeypatch):
+    server = EffectorServer()
+    server._generators['x'] = object()
+    monkeypatch.setattr(effector_server, 'refresh_default_metrics', lambda: False)
+    assert not server.refresh_fonts()
+    assert not server.refresh_fonts(force=True) and server._generators
+    monkeypatch.setattr(effector_server, 'refresh_default_metrics', lambda: True)
+    assert server.refresh_fonts(force=True)
+    assert not server._generators
@@ -0,0 +1,138 @@
+import pytest
+
+from ass_document import ASSDocument
+from effects import EffectConfig, MultiLayerEffectGenerator
+from karaoke_processor import KaraokeProcessor
+
+
+HEADER = """[Script Info]
+PlayResX: 1280
+PlayResY: 720
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Romaji,Arial,36,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,8,10,10,30,1
+Style: Wide,Arial,52,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,120,100,2,0,1,2,0,2,10,10,20,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+LINES = [
+    "Dialogue: 0,0:00:01.00,0:00:04.00,Romaji,,0,0,0,,{\\k20}ka{\\k30}ra{\\k25}o{\\k40}ke",
+    "Dialogue: 0,0:00:04.00,0:00:07.50,Wide,,0,0,0,,{\\k35}mil{\\k20} {\\k45}lí!{\\k30}wa;",
+    "Dialogue: 0,0:00:07.50,0:00:09.00,Romaji,,0,0,0,,{\\k50}i m{\\b1}w{\\k20\\i1}ow{\\k10}",
+    "Comment: 0,0:00:09.00,0:00:10.00,Romaji,,0,0,0,,{\\k20}no",
+    "Dialogue: 0,0:00:10.00,0:00:12.00,Otro,,0,0,0,,{\\k12}ab{\\k44}cdefg{\\k20}h",
+    "Dialogue: 0,0:00:12.00,0:00:13.00,Romaji,,0,0,0,,sin karaoke",
+]
+
+
+def styles():
+    doc = ASSDocument()
+    list(doc.feed(HEADER.splitlines()))
+    return doc.styles
+
+
+@pytest.mark.parametrize('entry_mode', ['char', 'group', 'syllable'])
+@pytest.mark.parametrize('seed', [None, 3])
+@pytest.mark.parametrize('fps', [None, 23.976])
+def test_per_line_and_batch_output_match(entry_mode, seed, fps):
+    config = EffectConfig(entry_mode=entry_mode, entry_max_events=2, seed=seed, fps=fps, play_res=(1280, 720))
+    batch = MultiLayerEffectGenerator(config, styles=styles())
+    per_line = MultiLayerEffectGenerator(config, styles=styles())
+    parsed = MultiLayerEffectGenerator(config, styles=styles())
+    # Sin semilla el RNG se consume en el mismo orden en los tres caminos
+    for generator in (batch, per_line, parsed):
+        generator.rng.seed(1)
+
+    expected = list(batch.generate_lines(LINES))
+    assert any(line.startswith('Dialogue: 2,') for line in expected)
+    # Los tags en línea de LINES[2] llegan a las capas 1 y 3 en los tres caminos
+    for layer in (1, 3):
+        assert any(line.startswith(f'Dialogue: {layer},') and line.endswith('}{\\i1}ow') for line in expected)
+    assert [line for n, text in enumerate(LINES) for line in per_line.process_line(text, n)] == expected
+
+    processor = KaraokeProcessor(styles=styles(), play_res=config.play_res)
+    karaoke_lines = [processor.parse_dialogue_line(text) for text in LINES]
+    assert [
+        line for n, karaoke_line in enumerate(karaoke_lines) if karaoke_line is not None
+        for line in parsed.generate_all_layers(karaoke_line, n)
+    ] == expected
+
+
+@pytest.mark.parametrize('fps', [None, 23.976])
+def test_inline_markup_is_kept_in_layers_1_and_3(fps):
+    line = "Dialogue: 0,0:00:01.00,0:00:03.00,Romaji,,0,0,0,,{\\k50}i m{\\b1}w{\\k20\\i1}ow{\\k10}"
+    config = EffectConfig(entry_mode='char', seed=1, fps=fps, play_res=(1280, 720))
+    lines = list(MultiLayerEffectGenerator(config, styles=styles()).generate_lines([line]))
+
+    def texts(layer):
+        return [text[text.index('}') + 1:] for text in lines if text.startswith(f'Dialogue: {layer},')]
+
+    for layer in (1, 3):
+        assert texts(layer) == ['i m{\\b1}w', '{\\i1}ow']
+    # La capa 2 lleva solo los caracteres visibles, sin tags (con FPS la entrada
+    # de la primera sílaba empieza en 0 y no llega a un cuadro)
+    assert texts(2) == (list('imwow') if fps is None else list('ow'))
+
+
+def entry_generator(mode, max_events=3):
+    return MultiLayerEffectGenerator(EffectConfig(entry_mode=mode, entry_max_events=max_events))
+
+
+# "ab cde": anchos 10 y espacio de 4, empezando en x=0
+TEXT = 'ab cde'
+ADVANCES = [10, 10, 4, 10, 10, 10]
+CENTERS = [5, 15, 22, 29, 39, 49]
+
+
+def test_entry_cap_per_mode():
+    assert entry_generator('char').entry_cap() == 0
+    assert entry_generator('syllable').entry_cap() == 1
+    assert entry_generator('group', 4).entry_cap() == 4
+    assert entry_generator('group', 0).entry_cap() == 1
+
+
+def test_char_mode_skips_blank_chars():
+    groups = entry_generator('char').entry_groups(TEXT, CENTERS, ADVANCES)
+    assert groups == [('a', 5), ('b', 15), ('c', 29), ('d', 39), ('e', 49)]
+
+
+def test_group_mode_splits_visible_chars_evenly():
+    # 5 caracteres visibles en 3 grupos: 2, 2 y 1 (el espacio no cuenta)
+    groups = entry_generator('group', 3).entry_groups(TEXT, CENTERS, ADVANCES)
+    assert [text for text, _ in groups] == ['ab', 'cd', 'e']
+    # Centro de cada grupo: entre el borde izquierdo del primero y el derecho del último
+    assert [center for _, center in groups] == [10, 34, 49]
+
+    # Con 2 grupos el espacio queda dentro del primero
+    groups = entry_generator('group', 2).entry_groups(TEXT, CENTERS, ADVANCES)
+    assert groups == [('ab c', (0 + 34) / 2), ('de', (34 + 54) / 2)]
+
+
+def test_group_mode_with_more_events_than_chars_is_per_char():
+    generator = entry_generator('group', 5)
+    assert generator.entry_groups(TEXT, CENTERS, ADVANCES) == entry_generator('char').entry_groups(TEXT, CENTERS, ADVANCES)
+
+
+def test_syllable_mode_is_one_event_without_outer_blanks():
+    text, advances, centers = ' ab ', [4, 10, 10, 4], [2, 9, 19, 26]
+    assert entry_generator('syllable').entry_groups(text, centers, advances) == [('ab', 14)]
+    assert entry_generator('syllable').entry_groups(TEXT, CENTERS, ADVANCES) == [(TEXT, 27)]
+
+
+@pytest.mark.parametrize('mode', ['char', 'group', 'syllable'])
+def test_blank_syllables_have_no_entry_events(mode):
+    generator = entry_generator(mode)
+    assert generator.entry_groups('  ', [2, 6], [4, 4]) == []
+    assert generator.entry_groups('', [], []) == []
+
+
+@pytest.mark.parametrize('mode, events', [('char', 7), ('group', 5), ('syllable', 3)])
+def test_layer2_events_per_mode(mode, events):
+    line = "Dialogue: 0,0:00:01.00,0:00:03.00,Default,,0,0,0,,{\\k20}abcd{\\k20}e f{\\k20}g{\\k20} "
+    lines = list(MultiLayerEffectGenerator(EffectConfig(entry_mode=mode, entry_max_events=2, seed=1)).generate_lines([line]))
+    layer2 = [text[text.rfind('}') + 1:] for text in lines if text.startswith('Dialogue: 2,')]
+    assert len(layer2) == events
+    assert ''.join(layer2).replace(' ', '') == 'abcdefg'
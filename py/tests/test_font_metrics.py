@@ -0,0 +1,57 @@
+import font_metrics
+from batch_layout import CharWidths
+from font_metrics import TextMeasurer, save_default_metrics
+
+
+class FakeFace:
+    """Fuente de 1000 unidades con glifo solo para A y V; todo par tiene kerning"""
+
+    height = 1000
+    path, mtime = 'fake.ttf', 0
+
+    def glyph(self, char):
+        return [ord(char), 600] if char in 'AV' else None
+
+    def kerning(self, left, right):
+        return -100
+
+
+def test_no_kerning_across_missing_glyphs():
+    measurer = TextMeasurer(FakeFace(), 10)
+    fallback = lambda char: 5.0
+    assert measurer.text_width('AV', fallback) == 6 + 6 - 1
+    assert measurer.text_width('AxV', fallback) == 6 + 5 + 6
+    assert measurer.text_width('xAV', fallback) == 5 + 6 + 6 - 1
+
+    advances, kerns = [], []
+    CharWidths(fallback, measurer).measure('AVxA', advances, kerns)
+    assert advances == [6, 6, 5, 6]
+    assert kerns == [0.0, -1.0, 0.0, 0.0]
+    assert sum(advances) + sum(kerns) == measurer.text_width('AVxA', fallback)
+
+
+def test_save_default_metrics(monkeypatch):
+    saved = []
+
+    class Metrics:
+        def save(self):
+            saved.append(True)
+
+    monkeypatch.setattr(font_metrics, '_default_metrics', None)
+    save_default_metrics()
+    monkeypatch.setattr(font_metrics, '_default_metrics', Metrics())
+    save_default_metrics()
+    assert saved == [True]
+
+
+def test_font_index_refresh(tmp_path):
+    fonts = tmp_path / 'fonts'
+    fonts.mkdir()
+    index = font_metrics.FontIndex(str(tmp_path / 'index.json'), [str(fonts)])
+    assert index.find('Arial') is None
+    assert not index.refresh()
+    (fonts / 'nueva.ttf').write_bytes(b'no es una fuente')
+    assert index.refresh()
+    assert not index.refresh()
+    (fonts / 'nueva.ttf').unlink()
+    assert index.refresh()
@@ -0,0 +1,45 @@
+import pytest
+
+from ass_document import ASSDocument
+from frame_timing import FrameTiming, frame_timing, parse_video_fps, resolve_fps
+
+
+@pytest.mark.parametrize('fps', [23.976, 24, 25, 29.97, 30, 59.94])
+def test_frame_times_fall_inside_their_frame(fps):
+    timing = FrameTiming(fps)
+    for frame in range(1, 20000):
+        time = timing.time(frame)
+        assert time % 10 == 0
+        # Truncado a centésimas: después del cuadro anterior y no después del propio
+        assert (frame - 1) * 1000 / fps < time <= frame * 1000 / fps
+
+
+def test_rounding_to_nearest_frame():
+    timing = frame_timing(23.976)
+    assert timing is frame_timing(23.976)
+    assert [timing.frame(ms) for ms in (0, 20, 21, 41.7, 62, 63)] == [0, 0, 1, 1, 1, 2]
+    assert timing.frame(-50) == 0
+    assert timing.snap(1000) == 1001 // 10 * 10
+    assert timing.format_frame(24) == '0:00:01.00'
+    # 400 ms son 9,59 cuadros: se redondea a 10 (417,08 ms)
+    assert timing.frames(400) == 10
+    assert timing.snap_duration(400) == 417
+    assert timing.snap_duration(0) == 0
+
+
+def test_invalid_fps():
+    with pytest.raises(ValueError):
+        FrameTiming(0)
+    assert resolve_fps('') is None
+    assert resolve_fps('0') is None
+    assert resolve_fps('-5') is None
+    assert resolve_fps('29.97') == 29.97
+    assert parse_video_fps('?dummy:23.976000:10000:1920:1080:47:163:254:') == 23.976
+    assert parse_video_fps('video.mkv') is None
+
+
+def test_auto_fps_from_project_garbage():
+    document = ASSDocument()
+    list(document.feed(["[Aegisub Project Garbage]", "Video File: ?dummy:25.000000:40000:1280:720:0:0:0:"]))
+    assert resolve_fps('auto', document) == 25.0
+    assert resolve_fps('AUTO', ASSDocument()) is None
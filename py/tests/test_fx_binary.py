@@ -0,0 +1,101 @@
+import io
+
+import pytest
+
+from ass_document import EventRecord
+from fx_binary import read_records, write_records
+from fx_cache import FxCache
+from process_effect import iter_delta_lines, iter_generated_blocks, process_dialogue_lines, write_lines
+
+
+SOURCE = [
+    "Dialogue: 0,0:00:01.00,0:00:04.00,Romaji,,0,0,0,,{\\k20}ka{\\k30}i {\\k25}no {\\k40}ne",
+    "Dialogue: 0,0:00:05.00,0:00:07.50,Romaji,,0,0,0,,{\\k50}so{\\k20}ra {\\k30}",
+]
+
+
+def generated_lines(config=None, records=False, cache=None):
+    events = [EventRecord.from_line(line) for line in SOURCE]
+    return process_dialogue_lines(events, config or {'FONT_METRICS': '0'}, {}, cache, records)
+
+
+def test_from_line_keeps_trailing_text_whitespace():
+    event = EventRecord.from_line("Dialogue: 0,0:00:00.00,0:00:01.00,Default,,0,0,0,fx,{\\an5}i  \n")
+    assert event.text == "{\\an5}i  "
+    assert event.to_line().endswith("}i  ")
+
+
+def test_round_trip_matches_text_output(tmp_path):
+    lines = generated_lines()
+    assert any(line.endswith(' ') for line in lines)
+
+    text_file = tmp_path / 'fx.txt'
+    binary_file = tmp_path / 'fx.bin'
+    write_lines(str(text_file), lines)
+    write_lines(str(binary_file), lines, binary=True)
+
+    text_lines = text_file.read_text(encoding='utf-8').splitlines()
+    records = [record.to_line() for record in read_records(binary_file.read_bytes())]
+    assert records == text_lines
+
+
+def test_write_records_counts():
+    buffer = io.BytesIO()
+    events = [EventRecord.from_line(line) for line in generated_lines()]
+    assert write_records(buffer, events) == len(events)
+    assert [record.to_line() for record in read_records(buffer.getvalue())] == generated_lines()
+
+
+def test_write_lines_skips_text_that_is_not_an_event(tmp_path):
+    binary_file = tmp_path / 'fx.bin'
+    assert write_lines(str(binary_file), generated_lines() + ["no es un evento"], binary=True) == len(generated_lines())
+
+
+def test_from_ms_matches_parsed_line():
+    event = EventRecord.from_ms(1, 61234.9, 3723456, 'Romaji', '', 0, 0, 0, 'fx', '{\\pos(1,2)}a, b')
+    parsed = EventRecord.from_line(event.to_line())
+    assert event.to_line() == "Dialogue: 1,0:01:01.23,1:02:03.45,Romaji,,0,0,0,fx,{\\pos(1,2)}a, b"
+    assert [getattr(event, name) for name in EventRecord.__slots__] == \
+        [getattr(parsed, name) for name in EventRecord.__slots__]
+    assert EventRecord.from_ms(0, -5, 0, 'A', '', 0, 0, 0, '', '').start_ms == 0
+
+
+def binary_output(lines, tmp_path):
+    binary_file = tmp_path / 'fx.bin'
+    write_lines(str(binary_file), lines, binary=True)
+    return binary_file.read_bytes()
+
+
+@pytest.mark.parametrize('fps', [None, '23.976'])
+def test_records_write_the_same_bytes_as_text(tmp_path, fps):
+    config = {'FONT_METRICS': '0', 'FPS': fps} if fps else {'FONT_METRICS': '0'}
+    lines = generated_lines(config)
+    records = generated_lines(config, records=True)
+    assert all(isinstance(record, EventRecord) for record in records)
+    assert [record.to_line() for record in records] == lines
+    assert binary_output(records, tmp_path) == binary_output(lines, tmp_path)
+
+
+def test_delta_records_write_the_same_bytes_as_text(tmp_path):
+    config = {'FONT_METRICS': '0', 'FPS': '25'}
+    events = [EventRecord.from_line(line) for line in SOURCE]
+    outputs = []
+    for records in (False, True):
+        manifest = []
+        blocks = iter_generated_blocks(events, config, {}, records=records)
+        outputs.append((binary_output(iter_delta_lines(blocks, set(), manifest), tmp_path), manifest))
+    assert outputs[0] == outputs[1]
+    assert b'fx:' + outputs[0][1][0][1].encode() in outputs[0][0]
+
+
+def test_cache_hits_and_generated_records_mix(tmp_path):
+    config = {'FONT_METRICS': '0'}
+    expected = binary_output(generated_lines(config), tmp_path)
+    cache = FxCache(str(tmp_path / 'cache'))
+    # La primera línea queda en la caché como texto; la segunda se genera como registro
+    process_dialogue_lines([EventRecord.from_line(SOURCE[0])], config, {}, cache, records=True)
+    mixed = generated_lines(config, records=True, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert [type(line) for line in mixed] == [str] * 4 + [EventRecord] * 2
+    assert binary_output(mixed, tmp_path) == expected
+    assert [record.to_line() for record in read_records(expected)] == generated_lines(config, cache=cache)
@@ -0,0 +1,42 @@
+from effects import EffectConfig, MultiLayerEffectGenerator
+from fx_cache import FxCache
+from parallel import generate_multi_layer_parallel, iter_generated_lines_parallel
+
+
+LINES = [f"Dialogue: 0,0:00:0{n}.00,0:00:0{n + 1}.00,Default,,0,0,0,,{{\\k20}}ka{{\\k30}}ra{n}"
+         for n in range(6)]
+
+
+def test_unseeded_output_is_not_cached(tmp_path):
+    cache = FxCache(str(tmp_path))
+    generator = MultiLayerEffectGenerator(cache=cache)
+    assert list(generator.generate_lines(LINES))
+    assert generator.process_line(LINES[0])
+    assert (cache.hits, cache.misses) == (0, 0)
+    assert not any(tmp_path.iterdir())
+
+
+def test_seeded_output_is_cached(tmp_path):
+    cache = FxCache(str(tmp_path))
+    first = list(MultiLayerEffectGenerator(cache=cache).generate_lines(LINES, seed=3))
+    assert (cache.hits, cache.misses) == (0, len(LINES))
+    assert list(MultiLayerEffectGenerator(cache=cache).generate_lines(LINES, seed=3)) == first
+    assert cache.hits == len(LINES)
+
+    fixed = MultiLayerEffectGenerator(EffectConfig(seed=7), cache=cache)
+    assert fixed.process_line(LINES[0]) == fixed.process_line(LINES[0])
+    assert cache.hits == len(LINES) + 1
+
+
+def test_worker_cache_stats_are_aggregated(tmp_path):
+    cache = FxCache(str(tmp_path))
+    run = lambda: list(generate_multi_layer_parallel(LINES, EffectConfig(), seed=1, workers=2,
+                                                    chunk_size=2, cache=cache))
+    first = run()
+    assert (cache.hits, cache.misses) == (0, len(LINES))
+    assert run() == first
+    assert (cache.hits, cache.misses) == (len(LINES), len(LINES))
+
+    config = {'FONT_METRICS': '0'}
+    lines = list(iter_generated_lines_parallel(LINES, config, {}, workers=2, chunk_size=2, cache=cache))
+    assert lines and (cache.hits, cache.misses) == (len(LINES), 2 * len(LINES))
@@ -0,0 +1,65 @@
+import warnings
+
+import pytest
+
+import fx_random
+from effects import EffectConfig, MultiLayerEffectGenerator
+from fx_random import entry_draws, stream_key
+
+
+def stream_keys(lines=40, syllables=8):
+    return [stream_key(7, n, 1000 * n, 'Romaji', j) for n in range(lines) for j in range(syllables)]
+
+
+def test_draws_are_deterministic():
+    keys = stream_keys()
+    counts = [2] * len(keys)
+    assert entry_draws(keys, counts) == entry_draws(keys, counts)
+
+
+def test_stream_does_not_depend_on_other_lines():
+    keys = stream_keys()
+    counts = [3] * len(keys)
+    angles, rotations = entry_draws(keys, counts)
+    alone = entry_draws(keys[5:6], [3])
+    assert alone == (angles[15:18], rotations[15:18])
+
+
+def test_numpy_path_matches_python_without_warnings(monkeypatch):
+    pytest.importorskip('numpy')
+    keys = stream_keys()
+    counts = [3] * len(keys)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        numpy_draws = fx_random._entry_draws_numpy(keys, counts, sum(counts))
+    monkeypatch.setattr(fx_random, 'USE_NUMPY', False)
+    assert numpy_draws == entry_draws(keys, counts)
+
+
+def test_config_seed_does_not_depend_on_other_lines():
+    lines = [f"Dialogue: 0,0:00:{2 * n:02d}.00,0:00:{2 * n + 2:02d}.00,Default,,0,0,0,,"
+             f"{{\\k20}}ka{{\\k30}}ra{{\\k25}}o{{\\k40}}ke{n}" for n in range(8)]
+
+    def generate(lines, seed, start_index=0):
+        generator = MultiLayerEffectGenerator(EffectConfig(seed=seed))
+        return list(generator.generate_lines(lines, start_index=start_index))
+
+    everything = generate(lines, 11)
+    per_line = len(everything) // len(lines)
+    assert generate(lines, 11) == everything
+    # Con su índice, las líneas vecinas no cambian la salida de una línea
+    assert generate(lines[5:6], 11, start_index=5) == everything[5 * per_line:6 * per_line]
+    assert generate(lines[5:], 11, start_index=5) == everything[5 * per_line:]
+    assert generate(lines[5:6], 11) != everything[5 * per_line:6 * per_line]
+    assert generate(lines, 12) != everything
+
+
+def test_config_seed_differs_for_identical_lines():
+    line = "Dialogue: 0,0:00:01.00,0:00:03.00,Default,,0,0,0,,{\\k20}ka{\\k30}ra"
+    generated = list(MultiLayerEffectGenerator(EffectConfig(seed=11)).generate_lines([line, line]))
+    first, second = generated[:len(generated) // 2], generated[len(generated) // 2:]
+    entries = lambda lines: [text for text in lines if text.startswith('Dialogue: 2,')]
+    assert entries(first) != entries(second)
+    # Las capas 1 y 3 no usan números aleatorios
+    assert [text for text in first if text not in entries(first)] == \
+        [text for text in second if text not in entries(second)]
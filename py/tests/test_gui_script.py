@@ -0,0 +1,125 @@
+import sys
+import threading
+import types
+
+import pytest
+
+pytest.importorskip('tkinter')
+
+import gui_script
+from ass_document import ASSDocument
+from gui_script import PAGE_MODULES, EffectorApp
+
+
+SCRIPT = """[Script Info]
+PlayResX: 1280
+PlayResY: 720
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Romaji,Arial,40,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,8,10,10,30,1
+Style: Kanji,Arial,30,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,2,10,10,10,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+Dialogue: 0,0:00:01.00,0:00:03.00,Romaji,,0,0,0,,{\\k20}ka
+"""
+
+
+class FakeRoot:
+    """Solo registra los after(); sin display no se puede crear tk.Tk()"""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, callback):
+        self.scheduled.append((ms, callback))
+
+
+class FakePage:
+    def __init__(self, parent, controller):
+        self.parent = parent
+        self.controller = controller
+        self.styles = None
+
+    def grid(self, **kwargs):
+        pass
+
+    def set_styles(self, styles):
+        self.styles = styles
+
+
+def headless_app(ass_file=None):
+    """EffectorApp sin ventana: el estado que arma __init__ antes de crear widgets"""
+    app = EffectorApp.__new__(EffectorApp)
+    app.root = FakeRoot()
+    app.container = None
+    app.ass_file = ass_file
+    app._ass_parser = None
+    app.available_styles = ["Default"]
+    app.styles_loaded = threading.Event()
+    app._scanned_styles = None
+    app.pages = {}
+    return app
+
+
+@pytest.fixture
+def ass_file(tmp_path):
+    path = tmp_path / 'script.ass'
+    path.write_text(SCRIPT, encoding='utf-8')
+    return str(path)
+
+
+def test_load_header_skips_events(ass_file):
+    document = ASSDocument.load_header(ass_file)
+    assert document.style_names() == ['Romaji', 'Kanji']
+    assert document.events == []
+
+
+def test_scanned_styles_reach_the_main_page(ass_file):
+    app = headless_app(ass_file)
+    app.pages['MainPage'] = page = FakePage(None, app)
+
+    # Mientras el hilo no termina, el sondeo se vuelve a programar
+    app._poll_styles()
+    assert app.root.scheduled == [(gui_script._STYLE_POLL_MS, app._poll_styles)]
+
+    thread = threading.Thread(target=app._scan_styles, args=(ass_file,))
+    thread.start()
+    thread.join()
+    assert app.styles_loaded.is_set()
+    app._poll_styles()
+    assert app.available_styles == ['Romaji', 'Kanji']
+    assert page.styles == ['Romaji', 'Kanji']
+    assert len(app.root.scheduled) == 1
+
+
+def test_failed_scan_keeps_default_style(tmp_path, capsys):
+    app = headless_app()
+    app._scan_styles(str(tmp_path / 'missing.ass'))
+    assert app.styles_loaded.is_set()
+    app._poll_styles()
+    assert app.available_styles == ["Default"]
+    assert 'Error parseando ASS' in capsys.readouterr().out
+
+
+def test_pages_are_built_once_on_first_use(monkeypatch):
+    module = types.ModuleType('fake_page_module')
+    module.FakePage = FakePage
+    monkeypatch.setitem(sys.modules, 'fake_page_module', module)
+    monkeypatch.setitem(PAGE_MODULES, 'FakePage', 'fake_page_module')
+
+    app = headless_app()
+    assert 'FakePage' not in app.pages
+    page = app.get_page('FakePage')
+    assert page.controller is app
+    assert app.get_page('FakePage') is page
+
+
+def test_page_registries_match():
+    import pages
+    assert set(PAGE_MODULES) <= set(pages.__all__)
+    for name, module in PAGE_MODULES.items():
+        assert pages._MODULES[name] == module
+    with pytest.raises(AttributeError):
+        pages.NoSuchPage
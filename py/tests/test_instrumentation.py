@@ -0,0 +1,113 @@
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+from effects import EffectConfig, MultiLayerEffectGenerator
+from instrumentation import Instrumentation, Profiler, instruments
+from karaoke_processor import KaraokeProcessor
+
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'process_effect.py')
+
+# La caché de layout es global: sus aciertos dependen de las pruebas anteriores
+COUNTERS = ('layer2_chars', 'layer2_events', 'lines_parsed', 'syllables', 'lines_generated')
+
+LINES = [
+    "Dialogue: 0,0:00:01.00,0:00:03.00,Default,,0,0,0,,{\\k20}ka{\\k30}ra{\\k25}o{\\k40}ke",
+    "Comment: 0,0:00:03.00,0:00:04.00,Default,,0,0,0,,{\\k20}no",
+    "Dialogue: 0,0:00:04.00,0:00:06.00,Default,,0,0,0,,{\\k20}a b{\\k30}cde",
+]
+
+
+@pytest.fixture
+def enabled():
+    instruments.enable()
+    yield instruments
+    instruments.disable()
+
+
+def test_nested_stages_are_exclusive(monkeypatch):
+    clock = iter([0.0, 1.0, 3.0, 6.0, 10.0, 15.0, 21.0])
+    monkeypatch.setattr('instrumentation.time.perf_counter', lambda: next(clock))
+    recorder = Instrumentation()
+    recorder.enable()
+    with recorder.stage('outer'):
+        with recorder.stage('inner'):
+            pass
+    items = list(recorder.timed_iter('read', iter([])))
+    assert items == []
+    # outer: 1..3 y 6..10; inner: 3..6; read: 15..21
+    assert recorder.times == {'outer': 6.0, 'inner': 3.0, 'read': 6.0}
+
+
+def test_disabled_instrumentation_measures_nothing():
+    recorder = Instrumentation()
+    with recorder.stage('layout'):
+        pass
+    assert list(recorder.timed_iter('read', [1, 2])) == [1, 2]
+    assert recorder.times == {}
+
+
+@pytest.mark.parametrize('entry_mode, events', [('char', 12), ('group', 11), ('syllable', 6)])
+def test_layer2_counters_match_in_both_paths(enabled, entry_mode, events):
+    config = EffectConfig(entry_mode=entry_mode, entry_max_events=2, seed=5)
+    list(MultiLayerEffectGenerator(config).generate_lines(LINES))
+    batch = {name: enabled.counters.get(name) for name in COUNTERS}
+    assert batch['layer2_chars'] == 12
+    assert batch['layer2_events'] == events
+    assert batch['lines_parsed'] == 2
+    assert batch['syllables'] == 6
+    assert batch['lines_generated'] == 6 * 2 + events
+
+    enabled.reset()
+    generator = MultiLayerEffectGenerator(config)
+    for line in LINES:
+        generator.process_line(line)
+    assert {name: enabled.counters.get(name) for name in COUNTERS} == batch
+
+    enabled.reset()
+    processor = KaraokeProcessor()
+    for line in filter(None, map(processor.parse_dialogue_line, LINES)):
+        generator.generate_all_layers(line)
+    assert {name: enabled.counters.get(name) for name in COUNTERS} == batch
+    assert {'layout', 'format'} <= set(enabled.times)
+
+
+def test_profiler_summary(enabled):
+    list(MultiLayerEffectGenerator(EffectConfig(seed=1)).generate_lines(LINES))
+    out = io.StringIO()
+    Profiler().stop(out)
+    summary = out.getvalue()
+    assert summary.startswith('Perfil: ')
+    assert 'layout' in summary and 'format' in summary
+    assert 'layer2_events' in summary
+    assert not instruments.enabled
+
+
+def test_profile_summary_is_printed_on_exit(tmp_path):
+    ass_file = tmp_path / 'in.ass'
+    ass_file.write_text("[Events]\n", encoding='utf-8')
+    result = subprocess.run(
+        [sys.executable, SCRIPT, str(ass_file), str(tmp_path / 'missing.txt'), str(tmp_path / 'out.txt'), '--profile'],
+        capture_output=True, text=True)
+    assert result.returncode == 1
+    assert 'No se pudo leer la configuracion' in result.stderr
+    assert 'Perfil: ' in result.stderr
+
+
+def test_profile_stages_of_a_run(tmp_path):
+    ass_file = tmp_path / 'in.ass'
+    ass_file.write_text("[Events]\nFormat: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+                        + '\n'.join(LINES) + '\n', encoding='utf-8')
+    config_file = tmp_path / 'config.txt'
+    config_file.write_text("SELECTED_STYLE:Default\n", encoding='utf-8')
+    result = subprocess.run(
+        [sys.executable, SCRIPT, str(ass_file), str(config_file), '-', '--profile', '--no-font-metrics'],
+        capture_output=True, text=True, check=True)
+    summary = result.stderr[result.stderr.index('Perfil: '):]
+    for name in ('read', 'layout', 'format', 'write', 'lines_parsed', 'syllables', 'bytes_written'):
+        assert name in summary
+    assert result.stdout.count('Dialogue:') == 6
@@ -0,0 +1,37 @@
+from override_tokens import OverrideBlock, karaoke_segments, tokenize
+
+
+def segments(text):
+    return [(segment.kind, segment.duration, segment.text, segment.markup, segment.index)
+            for segment in karaoke_segments(text)]
+
+
+def test_one_syllable_per_k_tag():
+    assert segments("{\\k20}ka{\\kf30}ra{\\K10}o{\\ko5}ke") == [
+        ('k', 20, 'ka', 'ka', 0), ('kf', 30, 'ra', 'ra', 1), ('K', 10, 'o', 'o', 2), ('ko', 5, 'ke', 'ke', 3)]
+
+
+def test_several_k_tags_in_one_block():
+    # El \bord2 sigue al primer \k: queda en esa sílaba, que no tiene texto
+    assert segments("{\\k10\\bord2\\k20}ab{\\k30}c") == [
+        ('k', 10, '', '{\\bord2}', 0), ('k', 20, 'ab', 'ab', 1), ('k', 30, 'c', 'c', 2)]
+    # Los tags antes del \k quedan en la sílaba anterior
+    assert segments("{\\k10}a{\\i1\\k20\\b1}b") == [
+        ('k', 10, 'a', 'a{\\i1}', 0), ('k', 20, 'b', '{\\b1}b', 1)]
+
+
+def test_text_before_first_k_and_inner_blocks():
+    assert segments("pre{\\k10}a{\\i1}b{comentario}c") == [('k', 10, 'abc', 'a{\\i1}bc', 0)]
+    assert segments("sin karaoke") == []
+
+
+def test_unclosed_brace_is_text():
+    assert tokenize("{\\k10}a{\\k20 b") == (tokenize("{\\k10}")[0], "a{\\k20 b")
+    assert segments("{\\k10}a{\\k20 b") == [('k', 10, 'a{\\k20 b', 'a{\\k20 b', 0)]
+    assert tokenize("abc{") == ("abc{",)
+
+
+def test_block_ends_at_first_closing_brace():
+    tokens = tokenize("{\\k10}a{{\\k5}b}c")
+    assert isinstance(tokens[2], OverrideBlock) and tokens[2].tags is None
+    assert segments("{\\k10}a{{\\k5}b}c") == [('k', 10, 'ab}c', 'ab}c', 0)]
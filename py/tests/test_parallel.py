@@ -0,0 +1,33 @@
+from effects import EffectConfig, MultiLayerEffectGenerator
+from parallel import generate_multi_layer_parallel, iter_generated_lines_parallel
+from process_effect import process_dialogue_lines
+
+
+LINE = "Dialogue: 0,0:00:{start:02d}.00,0:00:{end:02d}.00,Default,,0,0,0,,{{\\k20}}ka{{\\k30}}ra{{\\k25}}o{{\\k40}}ke{n}"
+LINES = [LINE.format(start=2 * n, end=2 * n + 2, n=n) for n in range(8)]
+
+
+def generate(lines, config=None, seed=None, start_index=0):
+    generator = MultiLayerEffectGenerator(config or EffectConfig())
+    return list(generator.generate_lines(lines, seed=seed, start_index=start_index))
+
+
+def test_seeded_output_is_reproducible():
+    first = generate(LINES, seed=5)
+    assert generate(LINES, seed=5) == first
+    assert generate(LINES, seed=6) != first
+    assert list(generate_multi_layer_parallel(LINES, EffectConfig(), seed=5, workers=2, chunk_size=3)) == first
+
+
+def test_seed_depends_on_line_index_only():
+    everything = generate(LINES, seed=5)
+    per_line = len(everything) // len(LINES)
+    assert generate(LINES[3:], seed=5, start_index=3) == everything[3 * per_line:]
+
+
+def test_lead_in_parallel_matches_serial_order():
+    config = {'FONT_METRICS': '0', 'FPS': '23.976'}
+    serial = process_dialogue_lines(LINES, config, {})
+    parallel = list(iter_generated_lines_parallel(LINES, config, {}, workers=2, chunk_size=3))
+    assert parallel == serial
+    assert len(serial) == 4 * len(LINES)
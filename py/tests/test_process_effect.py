@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from fx_binary import read_records
+
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'process_effect.py')
+
+ASS = """[Script Info]
+PlayResX: 1280
+PlayResY: 720
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,40,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,8,10,10,30,1
+Style: Other,Arial,30,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,2,10,10,10,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+Dialogue: 0,0:00:01.00,0:00:03.00,Default,,0,0,0,,{\\k20}ka{\\k30}ra{\\k25}o{\\k40}ke
+Comment: 0,0:00:03.00,0:00:04.00,Default,,0,0,0,,{\\k20}no
+Dialogue: 0,0:00:04.00,0:00:06.00,Other,,0,0,0,,{\\k20}o{\\k30}tro
+Dialogue: 0,0:00:06.00,0:00:08.00,Default,,0,0,0,,{\\k15}a{\\k40}ri{\\k20}ga{\\k30}to
+"""
+
+
+@pytest.fixture
+def files(tmp_path):
+    ass_file = tmp_path / 'in.ass'
+    ass_file.write_text(ASS, encoding='utf-8')
+    config_file = tmp_path / 'config.txt'
+    config_file.write_text("SELECTED_STYLE:Default\nFPS:23.976\n", encoding='utf-8')
+    return ass_file, config_file
+
+
+def run(*args, stdin=None):
+    result = subprocess.run([sys.executable, SCRIPT, *map(str, args), '--no-font-metrics'],
+                            input=stdin, capture_output=True, check=True)
+    return result.stdout
+
+
+def test_stdin_stdout_matches_files(files, tmp_path):
+    ass_file, config_file = files
+    out_file = tmp_path / 'out.txt'
+    run(ass_file, config_file, out_file)
+    expected = out_file.read_bytes()
+    assert expected.count(b'Dialogue:') == 8
+
+    assert run('-', config_file, '-', stdin=ass_file.read_bytes()) == expected
+    assert run(ass_file, config_file, '-') == expected
+    run('-', config_file, out_file, stdin=ass_file.read_bytes())
+    assert out_file.read_bytes() == expected
+
+
+def test_binary_stdout_matches_text(files, tmp_path):
+    ass_file, config_file = files
+    out_file = tmp_path / 'out.txt'
+    run(ass_file, config_file, out_file)
+    binary = run('-', config_file, '-', '--format', 'binary', stdin=ass_file.read_bytes())
+    assert [record.to_line() for record in read_records(binary)] == \
+        out_file.read_text(encoding='utf-8').splitlines()
+
+
+def test_bom_and_crlf_on_stdin(files):
+    ass_file, config_file = files
+    expected = run(ass_file, config_file, '-')
+    crlf = b'\xef\xbb\xbf' + ass_file.read_bytes().replace(b'\n', b'\r\n')
+    assert run('-', config_file, '-', stdin=crlf) == expected
@@ -0,0 +1,157 @@
+import os
+
+import pytest
+
+lupa = pytest.importorskip('lupa')
+
+from effector_server import EffectorServer
+
+
+MACRO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'run_gui.lua')
+
+# Script de Aegisub: líneas como las de subs[i]; subs.delete/append como en la API
+SUBS = r"""
+local function style(name, align)
+    return {class = "style", name = name, fontname = "Arial", fontsize = 40,
+        color1 = "&H00FFFFFF&", color2 = "&H000000FF&", color3 = "&H00000000&", color4 = "&H00000000&",
+        bold = false, italic = false, underline = false, strikeout = false,
+        scale_x = 100, scale_y = 100, spacing = 0, angle = 0, borderstyle = 1,
+        outline = 2, shadow = 0, align = align, margin_l = 10, margin_r = 10, margin_t = 30, encoding = 1}
+end
+
+local function dialogue(start_time, style, text)
+    return {class = "dialogue", comment = false, layer = 0, start_time = start_time,
+        end_time = start_time + 2000, style = style, actor = "", margin_l = 0, margin_r = 0,
+        margin_t = 0, effect = "", text = text, extra = {}}
+end
+
+local subs = {
+    {class = "info", key = "PlayResX", value = "1280"},
+    {class = "info", key = "PlayResY", value = "720"},
+    style("Romaji", 8),
+    style("Kanji", 2),
+    dialogue(1000, "Romaji", "{\\k20}ka{\\k30}ra"),
+    dialogue(1000, "Kanji", "{\\k20}空{\\k30}手"),
+    dialogue(3000, "Romaji", "{\\k25}o{\\k40}ke"),
+    dialogue(5000, "Romaji", "{\\k20}ha{\\k20}na"),
+}
+function subs.delete(...)
+    local indices = {...}
+    table.sort(indices, function(a, b) return a > b end)
+    for _, i in ipairs(indices) do table.remove(subs, i) end
+end
+function subs.append(...)
+    for _, line in ipairs({...}) do subs[#subs + 1] = line end
+end
+return subs
+"""
+
+FIRST_ROMAJI, KANJI, SECOND_ROMAJI, THIRD_ROMAJI = 5, 6, 7, 8
+
+
+class Macro:
+    """run_gui.lua con los archivos en tmp_path y el servidor llamado en el mismo proceso"""
+
+    def __init__(self, tmp_path):
+        self.tmp_path = tmp_path
+        self.lua = lupa.LuaRuntime()
+        self.undo_points = 0
+        self.requests = []
+        with open(MACRO, encoding='utf-8') as f:
+            source = f.read().replace('"/tmp/', f'"{tmp_path}/')
+
+        aegisub = self.lua.table(register_macro=lambda *args: None, set_undo_point=self.set_undo_point)
+        self.lua.globals().aegisub = aegisub
+        self.lua.execute(source)
+        lua_globals = self.lua.globals()
+        lua_globals.ensure_daemon = lambda: True
+        lua_globals.daemon_gui = self.gui
+        lua_globals.daemon_request = self.request
+        self.subs = self.lua.execute(SUBS)
+
+    def set_undo_point(self, name):
+        self.undo_points += 1
+
+    def gui(self, ass_file):
+        # Lo que la GUI guardaría después de elegir el estilo
+        (self.tmp_path / 'aegisub_effect_result.txt').write_text(
+            "SELECTED_STYLE:Romaji\nFONT_METRICS:0\n", encoding='utf-8')
+        return True
+
+    def request(self, fields):
+        request = dict(fields.items())
+        request['cache_dir'] = str(self.tmp_path / 'cache')
+        self.requests.append(request)
+        with open(request['ass_file'], encoding='utf-8') as f:
+            self.exported = [line for line in f.read().splitlines() if line.startswith('Dialogue:')]
+        response = EffectorServer().handle(request)
+        return 'ok' if response['ok'] else None
+
+    def run(self, sel=None):
+        if sel is None:
+            self.lua.globals().run_effector(self.subs, self.lua.table(), 0)
+        else:
+            self.lua.globals().run_effector_selection(self.subs, self.lua.table(*sel), 0)
+
+    def lines(self):
+        return [self.subs[i] for i in range(1, len(self.subs) + 1)]
+
+    def blocks(self):
+        """id -> textos de las líneas fx de cada bloque"""
+        blocks = {}
+        for line in self.lines():
+            if line['class'] == 'dialogue' and line.effect.startswith('fx:'):
+                blocks.setdefault(line.effect[3:], []).append(line.text)
+        return blocks
+
+
+@pytest.fixture
+def macro(tmp_path):
+    return Macro(tmp_path)
+
+
+def test_full_run_exports_and_comments_only_the_selected_style(macro):
+    macro.run()
+    assert [line.split(',', 9)[9] for line in macro.exported] == [
+        '{\\k20}ka{\\k30}ra', '{\\k25}o{\\k40}ke', '{\\k20}ha{\\k20}na']
+    assert macro.requests[0]['format'] == 'binary'
+
+    lines = macro.lines()
+    assert [lines[i - 1].comment for i in (FIRST_ROMAJI, KANJI, SECOND_ROMAJI, THIRD_ROMAJI)] == [
+        True, False, True, True]
+    blocks = macro.blocks()
+    assert len(blocks) == 3 and all(len(texts) == 2 for texts in blocks.values())
+    assert all(line.style == 'Romaji' for line in lines[8:])
+    assert macro.undo_points == 1
+
+
+def test_selection_run_regenerates_only_selected_lines(macro):
+    macro.run()
+    before = macro.blocks()
+    old_id = macro.subs[SECOND_ROMAJI].extra.pyfx
+    assert old_id in before
+
+    # Otra sílaba en la segunda línea; en la selección también hay una línea de
+    # otro estilo y una fx, que no se exportan
+    line = macro.subs[SECOND_ROMAJI]
+    line.text = '{\\k25}o{\\k40}ke{\\k10}!'
+    macro.subs[SECOND_ROMAJI] = line
+    first_fx = len(macro.subs)
+    macro.run([KANJI, SECOND_ROMAJI, first_fx])
+
+    assert [line.split(',', 9)[9] for line in macro.exported] == ['{\\k25}o{\\k40}ke{\\k10}!']
+    after = macro.blocks()
+    new_id = macro.subs[SECOND_ROMAJI].extra.pyfx
+    assert new_id != old_id and old_id not in after
+    assert len(after[new_id]) == 3
+    # Los bloques de las líneas no seleccionadas quedan igual
+    assert {k: v for k, v in after.items() if k != new_id} == {k: v for k, v in before.items() if k != old_id}
+    assert not macro.subs[KANJI].comment
+    assert macro.undo_points == 2
+
+
+def test_selection_without_lines_of_the_style_does_nothing(macro):
+    macro.run([KANJI])
+    assert macro.requests == []
+    assert len(macro.subs) == THIRD_ROMAJI
+    assert macro.undo_points == 0
@@ -0,0 +1,82 @@
+import pytest
+
+from ass_document import ASSDocument, EventRecord
+from effects import MultiLayerEffectGenerator
+from karaoke_processor import KaraokeProcessor
+from process_effect import process_dialogue_lines
+from style_layout import LEGACY_ANCHOR, event_anchor, line_anchor, parse_play_res, resolve_play_res
+
+
+HEADER = """[Script Info]
+PlayResX: 1280
+PlayResY: 720
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Top,Arial,40,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,8,10,10,30,1
+Style: Right,Arial,40,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,3,10,20,30,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+LINE = "Dialogue: 0,0:00:01.00,0:00:03.00,{style},,0,0,{margin_v},,{{\\k20}}ka{{\\k30}}ra"
+
+
+def document():
+    doc = ASSDocument()
+    list(doc.feed(HEADER.splitlines()))
+    return doc
+
+
+@pytest.mark.parametrize('alignment, origin, y', [
+    (1, 10, 670.0), (2, 585.0, 670.0), (3, 1160, 670.0),
+    (5, 585.0, 360.0), (7, 10, 50.0), (9, 1160, 50.0),
+])
+def test_line_anchor(alignment, origin, y):
+    anchor = line_anchor(alignment, 10, 20, 30, 40, (1280, 720))
+    assert anchor.origin(100) == origin
+    assert anchor.y == y
+
+
+def test_play_res():
+    assert parse_play_res('1920x1080') == (1920, 1080)
+    assert parse_play_res('') == (0, 0)
+    assert resolve_play_res((1280, 0)) == (1280, 1024)
+    assert resolve_play_res((0, 480)) == (640, 480)
+
+
+def test_without_play_res_or_style_keeps_fixed_position():
+    style = document().styles['Top']
+    event = EventRecord.from_line(LINE.format(style='Top', margin_v=0))
+    assert event_anchor(event, style, (0, 0)) is LEGACY_ANCHOR
+    assert event_anchor(event, None, (1280, 720)) is LEGACY_ANCHOR
+
+    lines = MultiLayerEffectGenerator().process_line(LINE.format(style='Default', margin_v=0))
+    assert '\\pos(36,29)' in lines[0]
+
+
+def test_style_alignment_and_line_margins():
+    doc = document()
+    processor = KaraokeProcessor(styles=doc.styles, play_res=doc.play_res, use_font_metrics=False)
+
+    top = processor.parse_dialogue_line(LINE.format(style='Top', margin_v=0))
+    assert {syllable.y for syllable in top.syllables} == {50.0}
+    # MarginV de la línea en lugar del del estilo
+    moved = processor.parse_dialogue_line(LINE.format(style='Top', margin_v=100))
+    assert {syllable.y for syllable in moved.syllables} == {120.0}
+
+    right = processor.parse_dialogue_line(LINE.format(style='Right', margin_v=0))
+    last = right.syllables[-1]
+    width = processor.estimate_text_width('ra')
+    assert last.x + width / 2 == pytest.approx(1280 - 20)
+
+
+def test_lead_in_uses_config_play_res():
+    doc = document()
+    events = [EventRecord.from_line(LINE.format(style='Top', margin_v=0))]
+    config = {'FONT_METRICS': '0', 'PLAY_RES': '1280x720'}
+    lines = process_dialogue_lines(events, config, doc.styles)
+    assert all(',50)' in line for line in lines)
+    fixed = process_dialogue_lines(events, {'FONT_METRICS': '0'}, doc.styles)
+    assert all(',29)' in line for line in fixed)
@@ -0,0 +1,144 @@
+import pytest
+
+from ass_document import ASSDocument
+from effects import EffectConfig, MultiLayerEffectGenerator
+from override_tokens import tokenize_block
+from process_effect import process_dialogue_lines
+from tag_optimizer import FIRST_WINS, PROPERTIES, TagOptimizer, _first_tag_is_noop, _static_moves, style_state
+
+
+HEADER = """[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,40,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,5,10,10,30,1
+"""
+
+LINE = "Dialogue: 0,0:00:01.00,0:00:03.00,Default,,0,0,0,fx,"
+
+
+def styles():
+    document = ASSDocument()
+    list(document.feed(HEADER.splitlines()))
+    return document.styles
+
+
+def _number(value):
+    if value.startswith('&'):
+        return int(value.strip('&Hh') or '0', 16)
+    return float(value)
+
+
+def _args(args):
+    return tuple(_number(v.strip()) for v in args.split(','))
+
+
+def render_state(text, style):
+    """Lo que determina el render de cada caracter, evaluado tag por tag
+
+    Independiente del optimizador: propiedades vigentes, \\t que cambian algo,
+    tags de primera aparición (sin los que no tienen efecto) y el resto.
+    """
+    state = style_state(style)
+    first, seen, transforms, others, runs = {}, set(), [], [], []
+    pos = 0
+    while pos < len(text):
+        start = text.find('{', pos)
+        end = text.find('}', start) if start != -1 else -1
+        if start == -1 or end == -1:
+            start = end = len(text)
+        if start > pos:
+            snapshot = (dict(state), tuple(transforms), dict(first), tuple(others))
+            runs.extend((char, snapshot) for char in text[pos:start])
+        if end == len(text):
+            break
+        tags = tokenize_block(text[start + 1:end])
+        for tag in tags or ():
+            group = FIRST_WINS.get(tag.name)
+            if group is not None:
+                if group in seen:
+                    continue
+                seen.add(group)
+                if tag.name == 'an' and _number(tag.value) == style.alignment:
+                    value = None
+                elif tag.name == 'fad' and _args(tag.args) == (0, 0):
+                    value = None
+                elif tag.name == 'move' and _args(tag.args)[:2] == _args(tag.args)[2:4]:
+                    value = ('pos', _args(tag.args)[:2])
+                else:
+                    value = (tag.name, _args(tag.args) if tag.args is not None else _number(tag.value))
+                if value is not None:
+                    first[group] = value
+            elif tag.name == 't':
+                prefix = tag.args[:tag.args.find('\\')]
+                for inner in tag.body:
+                    value = _number(inner.value)
+                    props = PROPERTIES[inner.name]
+                    if all(state.get(prop) == value for prop in props):
+                        continue
+                    transforms.append((_args(prefix.rstrip(',')) if prefix else (), props, value))
+                    for prop in props:
+                        state[prop] = None
+            elif tag.name == 'r':
+                state = style_state(style)
+                others.append('r')
+            elif tag.name in PROPERTIES:
+                for prop in PROPERTIES[tag.name]:
+                    state[prop] = _number(tag.value)
+            else:
+                others.append(str(tag))
+        if tags is None:
+            others.append(text[start:end + 1])
+        pos = end + 1
+    return runs
+
+
+@pytest.mark.parametrize('text, optimized', [
+    ("{\\bord2\\bord3}a", "{\\bord3}a"),
+    ("{\\an5\\pos(1,2)}a{\\an7\\pos(3,4)}b", "{\\pos(1,2)}ab"),
+    ("{\\fad(0,0)\\c&H00FFFFFF&\\3c&H00F276FC&}a", "{\\3c&HF276FC&}a"),
+    ("{\\move(1,2,1,2)}a", "{\\pos(1,2)}a"),
+    ("{\\move(1,2,1,2,0,300)\\move(3,4,5,6)}a", "{\\pos(1,2)}a"),
+    ("{\\pos(5,6)}a{\\move(1,2,1,2)}b", "{\\pos(5,6)}ab"),
+    ("{\\t(0,100,\\frz0\\fscx120)}a", "{\\t(0,100,\\fscx120)}a"),
+    ("{\\bord4}a{\\r}b{\\bord2.0}c", "{\\bord4}a{\\r}b{\\bord2}c"),
+    ("{\\blur0}a{\\blur2}b{\\blur2.00}c", "a{\\blur2}bc"),
+    ("{nota}a{\\k20}{\\bord1}b", "{nota}a{\\k20\\bord1}b"),
+])
+def test_optimized_text(text, optimized):
+    style = styles()['Default']
+    result = TagOptimizer().optimize_text(text, style)
+    assert result == optimized
+    assert render_state(result, style) == render_state(text, style)
+
+
+def test_first_tag_predicate_does_not_change_the_tag():
+    for block in ("\\move(1,2,1,2)", "\\move(1,2,3,4)", "\\an5", "\\fad(0,0)", "\\pos(1,2)"):
+        tag = tokenize_block(block)[0]
+        _first_tag_is_noop(tag, 5)
+        assert str(tag) == block
+    assert _first_tag_is_noop(tokenize_block("\\an5")[0], 5)
+    assert _first_tag_is_noop(tokenize_block("\\fad(0,0)")[0], None)
+    assert not _first_tag_is_noop(tokenize_block("\\move(1,2,1,2)")[0], 5)
+
+
+def test_static_moves_become_pos():
+    tags = tokenize_block("\\move(1,2,1,2,0,300)\\move(1,2,3,4)\\bord2")
+    original = tags[0]
+    assert ''.join(map(str, _static_moves(tags))) == "\\pos(1,2)\\move(1,2,3,4)\\bord2"
+    assert str(original) == "\\move(1,2,1,2,0,300)"
+
+
+def test_generated_lines_render_the_same():
+    style_map = styles()
+    source = [LINE + "{\\k20}ka{\\k30}ra{\\k25}o{\\k40}ke", LINE + "{\\k15}a{\\kf40}ri{\\k20}ga{\\k30}to"]
+    generated = list(MultiLayerEffectGenerator(EffectConfig(seed=3)).generate_lines(source))
+    generated += process_dialogue_lines(source, {'FONT_METRICS': '0', 'FPS': '23.976'}, style_map)
+
+    optimizer = TagOptimizer(style_map)
+    optimized = list(optimizer.optimize_lines(generated))
+    assert optimizer.stats.bytes_after < optimizer.stats.bytes_before
+    for before, after in zip(generated, optimized):
+        assert before.split(',', 9)[:9] == after.split(',', 9)[:9]
+        assert render_state(after.split(',', 9)[9], style_map['Default']) == \
+            render_state(before.split(',', 9)[9], style_map['Default'])
+    # Una segunda pasada no encuentra nada más que quitar
+    assert list(TagOptimizer(style_map).optimize_lines(optimized)) == optimized
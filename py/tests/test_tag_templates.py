@@ -0,0 +1,152 @@
+import pytest
+
+from effects import EffectConfig
+from frame_timing import frame_timing
+from tag_templates import LayerTemplates, _literal, compile_lead_in, hex_to_ass, lead_in_template
+
+
+# Cadenas armadas como lo hacían effects.py y process_effect.py antes de las plantillas
+
+def inline_base_tags(c):
+    return (
+        f"\\blur{c.blur}"
+        f"\\bord{c.border_size}"
+        f"\\shad{c.shadow_size}"
+        f"\\3c{hex_to_ass(c.border_color)}"
+        f"\\c{hex_to_ass(c.primary_color)}"
+    )
+
+
+def inline_layer1(c, start, end, style, x, y, text):
+    tags = (
+        f"{{\\an5\\pos({x:.0f},{y:.0f})"
+        f"\\fad(0,{c.fade_out_duration})"
+        f"{inline_base_tags(c)}}}"
+    )
+    return f"Dialogue: 1,{start},{end},{style},,0,0,0,fx,{tags}{text}"
+
+
+def inline_layer2(c, start, end, style, entry_x, entry_y, x, y, rotation, char):
+    tags = (
+        f"{{{inline_base_tags(c)}"
+        f"\\an5\\move({entry_x:.0f},{entry_y:.0f},{x:.0f},{y:.0f},0,{c.entry_duration})"
+        f"\\fad({c.entry_duration},0)"
+        f"\\frz{rotation}"
+        f"\\t(0,{c.entry_duration},\\frz0)}}"
+    )
+    return f"Dialogue: 2,{start},{end},{style},,0,0,0,fx,{tags}{char}"
+
+
+def inline_layer3(c, start, end, style, x, y, text):
+    half_dur = c.highlight_duration // 2
+    tags = (
+        f"{{\\an5\\move({x:.0f},{y - 10:.0f},{x:.0f},{y:.0f})"
+        f"\\fscx{c.highlight_scale_x}\\fscy{c.highlight_scale_y}"
+        f"\\bord3\\blur4"
+        f"\\3c{hex_to_ass(c.highlight_border_color)}"
+        f"\\xshad0\\yshad-4"
+        f"\\4c{hex_to_ass(c.highlight_shadow_color)}"
+        f"\\t(0,{half_dur},\\frz{c.highlight_rotation}"
+        f"\\fry{c.highlight_perspective_y}\\frx{c.highlight_perspective_x})"
+        f"\\t({half_dur},{c.highlight_duration},\\c{hex_to_ass(c.primary_color)})"
+        f"\\t(100,{c.highlight_duration},\\fscx100\\fscy100\\fry0\\frz0\\frx0)}}"
+    )
+    return f"Dialogue: 3,{start},{end},{style},,0,0,0,fx,{tags}{text}"
+
+
+def inline_lead_in(config, layer, start, end, style, x, y, text):
+    tags = (
+        f"\\an5\\pos({x:.0f},{y:.0f})"
+        f"\\fad({int(config.get('ENTRY_DURATION', 300))},{int(config.get('FADEOUT_DURATION', 300))})"
+        f"\\blur{config.get('BLUR', '3')}"
+        f"\\bord{config.get('BORDER_SIZE', '2')}"
+        f"\\shad{config.get('SHADOW_SIZE', '0')}"
+        f"\\c{hex_to_ass(config.get('PRIMARY_COLOR', '#FFFFFF'))}"
+        f"\\3c{hex_to_ass(config.get('BORDER_COLOR', '#FC76F2'))}"
+        f"\\4c{hex_to_ass(config.get('SHADOW_COLOR', '#000000'))}"
+    )
+    return f"Dialogue: {layer},{start},{end},{style},,0,0,0,fx,{{{tags}}}{text}"
+
+
+CONFIGS = [
+    EffectConfig(),
+    EffectConfig(primary_color="#102030", border_color="#ABCDEF", blur=1.5, border_size=0,
+                 shadow_size=4, entry_duration=250, highlight_duration=333, fade_out_duration=0,
+                 highlight_rotation=-5, highlight_scale_x=100, highlight_perspective_y=30),
+]
+
+# Texto con llaves y campos de formato: se copia tal cual
+TEXTS = ['ka', 'す', '{x}', '}{0}{', '']
+
+
+@pytest.mark.parametrize('config', CONFIGS)
+def test_layer_templates_match_inline_strings(config):
+    templates = LayerTemplates(config)
+    assert templates.base_tags == inline_base_tags(config)
+    for text in TEXTS:
+        for x, y in ((36, 29), (35.5, 28.49), (-12.7, 1080.5)):
+            args = ('0:00:01.00', '0:00:03.25', 'Default', x, y)
+            assert templates.layer1(*args, text) == inline_layer1(config, *args, text)
+            assert templates.layer3(*args[:3], x, y - 10, y, text) == inline_layer3(config, *args, text)
+            move = ('0:00:00.60', '0:00:01.00', 'Romaji', x + 40.4, y - 30, x, y, -271)
+            assert templates.layer2(*move, text) == inline_layer2(config, *move, text)
+
+
+def test_layer_templates_expected_output():
+    templates = LayerTemplates(EffectConfig())
+    assert templates.layer1('0:00:01.00', '0:00:02.00', 'Default', 36, 29, 'ka') == (
+        "Dialogue: 1,0:00:01.00,0:00:02.00,Default,,0,0,0,fx,"
+        "{\\an5\\pos(36,29)\\fad(0,300)\\blur3\\bord2\\shad0\\3c&H00F276FC&\\c&H00FFFFFF&}ka"
+    )
+
+
+def test_layer_templates_snap_durations_to_frames():
+    config = EffectConfig()
+    timing = frame_timing(23.976)
+    templates = LayerTemplates(config, timing)
+    snapped = EffectConfig(
+        entry_duration=timing.snap_duration(config.entry_duration),
+        fade_out_duration=timing.snap_duration(config.fade_out_duration),
+        highlight_duration=timing.snap_duration(config.highlight_duration),
+    )
+    args = ('0:00:01.00', '0:00:02.00', 'Default', 10, 20)
+    assert templates.layer1(*args, 'a') == inline_layer1(snapped, *args, 'a')
+    move = ('0:00:00.60', '0:00:01.00', 'Default', 50, 60, 10, 20, 90)
+    assert templates.layer2(*move, 'a') == inline_layer2(snapped, *move, 'a')
+    # La mitad y el asentamiento de \t también se redondean a cuadros
+    layer3 = templates.layer3(*args[:3], 10, 10, 20, 'a')
+    half = timing.snap_duration(config.highlight_duration // 2)
+    assert f"\\t(0,{half}," in layer3
+    assert f"\\t({timing.snap_duration(100)},{snapped.highlight_duration}," in layer3
+
+
+@pytest.mark.parametrize('config', [
+    {},
+    {'ENTRY_DURATION': '250', 'FADEOUT_DURATION': '125', 'BLUR': '0.5', 'BORDER_SIZE': '3',
+     'SHADOW_SIZE': '1', 'PRIMARY_COLOR': '#112233', 'BORDER_COLOR': '#445566', 'SHADOW_COLOR': '#778899'},
+])
+def test_lead_in_matches_inline_string(config):
+    template = compile_lead_in(config)
+    for text in TEXTS:
+        args = (0, '0:00:01.00', '0:00:02.00', 'Default', 120.5, 33.49)
+        assert template(*args, text) == inline_lead_in(config, *args, text)
+
+
+def test_lead_in_snaps_fade_with_fps():
+    config = {'ENTRY_DURATION': '400', 'FADEOUT_DURATION': '300', 'FPS': '23.976'}
+    timing = frame_timing(23.976)
+    line = compile_lead_in(config)(0, '0:00:01.00', '0:00:02.00', 'Default', 1, 2, 'a')
+    assert f"\\fad({timing.snap_duration(400)},{timing.snap_duration(300)})" in line
+
+
+def test_lead_in_template_is_memoized_by_content():
+    config = {'BLUR': '2', 'BORDER_SIZE': '1'}
+    template = lead_in_template(config)
+    assert lead_in_template(dict(reversed(list(config.items())))) is template
+    assert lead_in_template({'BLUR': '2', 'BORDER_SIZE': '4'}) is not template
+
+
+def test_literal_escapes_braces():
+    assert _literal('\\t(0,1,\\frz0)') == '\\t(0,1,\\frz0)'
+    assert _literal('{a}') == '{{a}}'
+    assert _literal('{a}').format() == '{a}'